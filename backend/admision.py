@@ -0,0 +1,145 @@
+# ==================== CONTROL DE ADMISIÓN ====================
+# Ante una ráfaga, los handlers síncronos llenan el threadpool de Starlette
+# y las escrituras se apilan detrás del bloqueo de escritura de SQLite hasta
+# que vencen: todas las peticiones se vuelven lentas a la vez. Este
+# middleware ASGI limita cuántas peticiones de cada clase se atienden al
+# mismo tiempo y rechaza rápido el excedente.
+#
+# Hay dos compuertas, lecturas (GET y HEAD) y escrituras (el resto), para
+# que una avalancha de préstamos no deje sin lugar a los listados ni al
+# revés. Cada una admite hasta `limite` peticiones en curso. Las siguientes
+# esperan en una cola FIFO de a lo sumo `cola` lugares y, si en `espera`
+# segundos no se libera un lugar, se van. Con la cola llena o la espera
+# vencida se responde 503 con Retry-After sin tocar la base, así la latencia
+# de las peticiones aceptadas queda acotada por la espera más su propio
+# tiempo de servicio.
+#
+# Al terminar una petición su lugar pasa directo a la primera de la cola, sin
+# volver a competir. Las rutas de EXENTAS no pasan por las compuertas: los
+# archivos estáticos, /metrics (que tiene que responder justamente durante
+# una sobrecarga) y /eventos, cuyas conexiones duran horas. Los límites son
+# por proceso.
+
+import asyncio
+import os
+import time
+from collections import deque
+
+from database import ESCRITURA_AGRUPADA
+from metricas import registro
+
+LIMITE_LECTURAS = int(os.environ.get("BIBLIOTECA_LIMITE_LECTURAS", 8))
+# Las escrituras se serializan en el bloqueo de SQLite: más en curso solo
+# esperan ahí ocupando un hilo. Agrupadas, en cambio, conviene que lleguen
+# muchas juntas al hilo escritor (ver database.EscritorAgrupado).
+LIMITE_ESCRITURAS = int(os.environ.get("BIBLIOTECA_LIMITE_ESCRITURAS", 64 if ESCRITURA_AGRUPADA else 4))
+COLA_ADMISION = int(os.environ.get("BIBLIOTECA_COLA_ADMISION", 64))
+ESPERA_ADMISION = int(os.environ.get("BIBLIOTECA_ESPERA_ADMISION_MS", 500)) / 1000
+REINTENTAR_EN = 1
+
+METODOS_LECTURA = {"GET", "HEAD"}
+EXENTAS = ("/static", "/app", "/docs", "/redoc", "/openapi.json", "/metrics", "/eventos")
+
+
+class Compuerta:
+    """Hasta `limite` peticiones en curso y una cola acotada con espera
+    máxima. Con limite 0 admite todo."""
+
+    def __init__(self, limite, cola, espera):
+        self.limite = limite
+        self.max_cola = cola
+        self.espera = espera
+        self.activas = 0
+        self._cola = deque()
+
+    @property
+    def en_cola(self):
+        return len(self._cola)
+
+    async def entrar(self):
+        """None si la petición puede seguir; si no, el motivo del rechazo."""
+        if not self.limite:
+            return None
+        if self.activas < self.limite and not self._cola:
+            self.activas += 1
+            return None
+        if len(self._cola) >= self.max_cola:
+            return "cola_llena"
+        lugar = asyncio.get_running_loop().create_future()
+        self._cola.append(lugar)
+        vencimiento = asyncio.get_running_loop().call_later(self.espera, self._vencer, lugar)
+        try:
+            return None if await lugar else "espera_vencida"
+        except asyncio.CancelledError:
+            # El cliente se fue mientras esperaba
+            if lugar.done() and not lugar.cancelled() and lugar.result():
+                self.salir()
+            elif lugar in self._cola:
+                self._cola.remove(lugar)
+            raise
+        finally:
+            vencimiento.cancel()
+
+    def _vencer(self, lugar):
+        if not lugar.done():
+            self._cola.remove(lugar)
+            lugar.set_result(False)
+
+    def salir(self):
+        if not self.limite:
+            return
+        while self._cola:
+            lugar = self._cola.popleft()
+            if not lugar.done():
+                lugar.set_result(True)  # el lugar pasa a la primera de la cola
+                return
+        self.activas -= 1
+
+
+class MiddlewareAdmision:
+    def __init__(self, app, limite_lecturas=LIMITE_LECTURAS, limite_escrituras=LIMITE_ESCRITURAS,
+                 cola=COLA_ADMISION, espera=ESPERA_ADMISION):
+        self.app = app
+        self.compuertas = {
+            "lectura": Compuerta(limite_lecturas, cola, espera),
+            "escritura": Compuerta(limite_escrituras, cola, espera),
+        }
+        registro.medidor("biblioteca_admision_limite",
+                         lambda: [((clase,), c.limite) for clase, c in self.compuertas.items()])
+        registro.medidor("biblioteca_admision_activas",
+                         lambda: [((clase,), c.activas) for clase, c in self.compuertas.items()])
+        registro.medidor("biblioteca_admision_en_cola",
+                         lambda: [((clase,), c.en_cola) for clase, c in self.compuertas.items()])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXENTAS):
+            await self.app(scope, receive, send)
+            return
+
+        clase = "lectura" if scope["method"] in METODOS_LECTURA else "escritura"
+        compuerta = self.compuertas[clase]
+        inicio = time.perf_counter()
+        motivo = await compuerta.entrar()
+        if motivo is not None:
+            registro.incrementar("biblioteca_admision_rechazos_total", (clase, motivo))
+            await rechazar(send)
+            return
+        registro.observar("biblioteca_admision_espera_segundos", (clase,), time.perf_counter() - inicio)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            compuerta.salir()
+
+
+async def rechazar(send):
+    cuerpo = b'{"detail":"Servidor sobrecargado, reintentar en unos segundos"}'
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(cuerpo)).encode()),
+            (b"retry-after", str(REINTENTAR_EN).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,224 @@
+# ==================== AUTOCOMPLETADO ====================
+# GET /autocompletar?q=&tipo=: sugerencias de títulos, autores y usuarios
+# (nombre o email) mientras se escribe, sin un LIKE '%x%' por tecla ni
+# descargar los listados completos.
+#
+# Cada tipo tiene en memoria un índice de prefijos: un array ordenado de
+# enteros, cada uno un (id, posición) que apunta al comienzo de una palabra
+# del texto normalizado de esa fila (sin acentos ni mayúsculas). El orden es
+# el del texto desde esa posición, así que bisect encuentra el primer
+# sufijo que empieza con la consulta y los siguientes son las demás
+# coincidencias. "garc" encuentra "Gabriel García Márquez" aunque no sea el
+# comienzo del nombre. Cada entrada ocupa 8 bytes en el array; el resto es
+# el texto normalizado y los datos de la respuesta, uno por fila.
+#
+# Se carga al arrancar (cada worker el suyo) y, antes de cada búsqueda,
+# compara el último seq del registro de cambios (ver cambios.py) con el que
+# ya aplicó. Solo si hay entradas nuevas toma el lock y las aplica: así
+# incluye las altas, modificaciones y bajas de todos los handlers, de otros
+# workers y de las importaciones.
+#
+# Las búsquedas no toman el lock. Quien aplica cambios incrementa un contador
+# de versión antes y después de modificar los índices (un seqlock): una
+# búsqueda que empezó o terminó con otro valor, o que falló por ver el
+# índice a medio modificar, se repite bajo el lock.
+
+import bisect
+import json
+import threading
+import unicodedata
+from array import array
+
+from cambios import horizonte, ultimo_seq
+from database import get_db, transaccion_lectura
+
+LIMITE_AUTOCOMPLETADO = 10
+LIMITE_MAXIMO_AUTOCOMPLETADO = 50
+
+# La posición ocupa los 16 bits bajos de cada entrada
+BITS_POSICION = 16
+MASCARA_POSICION = (1 << BITS_POSICION) - 1
+# Con más cambios pendientes que esto (una importación) se recarga todo:
+# cada inserción en el array mueve las entradas que le siguen
+MAXIMO_INCREMENTAL = 2000
+# Separa los textos de una fila (nombre y email): ninguna consulta lo contiene
+SEPARADOR = "\x1f"
+
+# tipo: (SELECT de la fila, con el id primero; columnas con texto indexado)
+FUENTES = {
+    "libros": ("SELECT id, titulo, disponible FROM libros", ("titulo",)),
+    "autores": ("SELECT id, nombre FROM autores", ("nombre",)),
+    "usuarios": ("SELECT id, nombre, email FROM usuarios", ("nombre", "email")),
+}
+
+
+def normalizar(texto):
+    sin_acentos = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(c for c in sin_acentos if not unicodedata.combining(c))
+    return " ".join(sin_acentos.casefold().split())
+
+
+def comienzos_de_palabra(texto):
+    posiciones = [0]
+    for i in range(1, min(len(texto), MASCARA_POSICION + 1)):
+        if texto[i - 1] in (" ", SEPARADOR):
+            posiciones.append(i)
+    return posiciones
+
+
+class IndicePrefijos:
+    def __init__(self, columnas):
+        self.columnas = columnas
+        self.nombres = ()
+        self.textos = {}  # id -> texto normalizado
+        self.filas = {}   # id -> tupla con las columnas del SELECT
+        self.entradas = array("q")
+
+    def _sufijo(self, entrada):
+        return self.textos[entrada >> BITS_POSICION][entrada & MASCARA_POSICION:]
+
+    def _texto_de(self, fila):
+        return SEPARADOR.join(normalizar(fila[i] or "") for i in self._indices_texto)
+
+    def cargar(self, nombres, filas):
+        self.nombres = tuple(nombres)
+        self._indices_texto = [self.nombres.index(columna) for columna in self.columnas]
+        self.textos = {}
+        self.filas = {}
+        entradas = []
+        for fila in filas:
+            texto = self.textos[fila[0]] = self._texto_de(fila)
+            self.filas[fila[0]] = fila
+            entradas.extend((fila[0] << BITS_POSICION) | p for p in comienzos_de_palabra(texto))
+        entradas.sort(key=self._sufijo)
+        self.entradas = array("q", entradas)
+
+    def poner(self, fila):
+        fila_id = fila[0]
+        self.quitar(fila_id)
+        texto = self.textos[fila_id] = self._texto_de(fila)
+        self.filas[fila_id] = fila
+        for posicion in comienzos_de_palabra(texto):
+            entrada = (fila_id << BITS_POSICION) | posicion
+            i = bisect.bisect_right(self.entradas, texto[posicion:], key=self._sufijo)
+            self.entradas.insert(i, entrada)
+
+    def quitar(self, fila_id):
+        texto = self.textos.get(fila_id)
+        if texto is None:
+            return
+        for posicion in comienzos_de_palabra(texto):
+            entrada = (fila_id << BITS_POSICION) | posicion
+            i = bisect.bisect_left(self.entradas, texto[posicion:], key=self._sufijo)
+            while self.entradas[i] != entrada:
+                i += 1
+            del self.entradas[i]
+        del self.textos[fila_id]
+        del self.filas[fila_id]
+
+    def buscar(self, consulta, limite):
+        prefijo = normalizar(consulta)
+        if not prefijo:
+            return []
+        resultado = {}
+        i = bisect.bisect_left(self.entradas, prefijo, key=self._sufijo)
+        while i < len(self.entradas) and len(resultado) < limite:
+            entrada = self.entradas[i]
+            if not self._sufijo(entrada).startswith(prefijo):
+                break
+            fila_id = entrada >> BITS_POSICION
+            resultado.setdefault(fila_id, self.filas[fila_id])
+            i += 1
+        return [dict(zip(self.nombres, fila)) for fila in resultado.values()]
+
+
+class Autocompletado:
+    def __init__(self):
+        self.indices = {tipo: IndicePrefijos(columnas) for tipo, (_, columnas) in FUENTES.items()}
+        self.seq = None
+        # Impar mientras se modifican los índices
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def cargar(self):
+        conn = get_db()
+        try:
+            with self._lock, transaccion_lectura(conn) as cursor:
+                self._cargar(cursor)
+        finally:
+            conn.close()
+
+    def _cargar(self, cursor):
+        cursor.row_factory = None
+        seq = ultimo_seq(cursor)
+        indices = {}
+        for tipo, (select, columnas) in FUENTES.items():
+            cursor.execute(select)
+            indices[tipo] = IndicePrefijos(columnas)
+            indices[tipo].cargar([columna[0] for columna in cursor.description], cursor.fetchall())
+        # Primero los índices y después seq: quien ve el seq nuevo ya ve sus datos
+        self.indices = indices
+        self.seq = seq
+
+    def _sincronizar(self, cursor):
+        cursor.row_factory = None
+        ultimo = ultimo_seq(cursor)
+        if ultimo == self.seq:
+            return
+        if self.seq is None or self.seq < horizonte(cursor) or self.seq > ultimo:
+            self._cargar(cursor)
+            return
+        cursor.execute("""
+            SELECT tabla, fila_id, operacion FROM cambios
+            WHERE seq > ? AND tabla IN ('libros', 'autores', 'usuarios')
+            ORDER BY seq
+            LIMIT ?
+        """, (self.seq, MAXIMO_INCREMENTAL + 1))
+        entradas = cursor.fetchall()
+        if len(entradas) > MAXIMO_INCREMENTAL:
+            self._cargar(cursor)
+            return
+        ultimas = {(tabla, fila_id): operacion for tabla, fila_id, operacion in entradas}
+        borrados, filas = {}, {}
+        for tipo, (select, _) in FUENTES.items():
+            borrados[tipo] = [fila_id for (tabla, fila_id), op in ultimas.items() if tabla == tipo and op == "delete"]
+            modificados = [fila_id for (tabla, fila_id), op in ultimas.items() if tabla == tipo and op != "delete"]
+            filas[tipo] = []
+            if modificados:
+                cursor.execute(f"{select} WHERE id IN (SELECT value FROM json_each(?))",
+                               (json.dumps(modificados),))
+                filas[tipo] = cursor.fetchall()
+        self.version += 1
+        try:
+            for tipo, indice in self.indices.items():
+                for fila_id in borrados[tipo]:
+                    indice.quitar(fila_id)
+                for fila in filas[tipo]:
+                    indice.poner(fila)
+            self.seq = ultimo
+        finally:
+            self.version += 1
+
+    def buscar(self, tipo, consulta, limite=LIMITE_AUTOCOMPLETADO):
+        conn = get_db()
+        try:
+            # Sin cambios nuevos, que es lo habitual, no hace falta el lock
+            if ultimo_seq(conn.cursor()) != self.seq:
+                with self._lock, transaccion_lectura(conn) as cursor:
+                    self._sincronizar(cursor)
+        finally:
+            conn.close()
+
+        version = self.version
+        if version % 2 == 0:
+            try:
+                resultado = self.indices[tipo].buscar(consulta, limite)
+            except (KeyError, IndexError):
+                resultado = None
+            if resultado is not None and self.version == version:
+                return resultado
+        with self._lock:
+            return self.indices[tipo].buscar(consulta, limite)
+
+
+autocompletado = Autocompletado()
@@ -0,0 +1,962 @@
+# ==================== BENCHMARKS ====================
+# Mide la API bajo carga concurrente levantando un servidor uvicorn propio
+# sobre una copia temporal de biblioteca.db, para no tocar los datos reales.
+#
+# Uso:
+#   python benchmark.py --hilos 8 --duracion 10 crud
+#
+# El comando "crud" compara el acceso a la base sin pool (una conexión nueva
+# por petición, como antes) contra el pool de conexiones de database.py.
+#
+#   python benchmark.py --duracion 5 checkout --hilos-max 32
+#
+# El comando "checkout" somete POST /prestamos a préstamos concurrentes sobre
+# los mismos libros con cantidades crecientes de hilos, informa préstamos por
+# segundo y verifica que ningún libro haya quedado prestado dos veces.
+#
+#   python benchmark.py --hilos 32 --duracion 10 escritura
+#
+# El comando "escritura" compara una transacción por petición contra el modo
+# de escritura agrupada (BIBLIOTECA_ESCRITURA_AGRUPADA=1) con carga de reseñas.
+#
+#   python benchmark.py --db grande.db --hilos 16 suite --salida antes.json
+#   python benchmark.py comparar antes.json despues.json
+#
+# El comando "suite" recorre todas las rutas de la API con clientes
+# concurrentes e informa p50/p95/p99 y peticiones por segundo de cada una;
+# "comparar" muestra la diferencia entre dos corridas (por ejemplo, dos
+# commits) y termina con error si el p95 de alguna ruta empeoró más que la
+# tolerancia.
+#
+#   python benchmark.py json --filas 10000 100000
+#
+# El comando "json" compara, sin servidor, la CPU y la memoria pico de armar
+# el cuerpo de /libros y /prestamos completos con el camino anterior
+# (sqlite3.Row + jsonable_encoder) y con el de serializacion.py.
+#
+#   python benchmark.py inicio --repeticiones 50
+#
+# El comando "inicio" compara la carga inicial de la interfaz con las siete
+# peticiones de antes contra GET /bootstrap, y un listado completo contra el
+# mismo listado con ?fields=.
+#
+#   python benchmark.py --db grande.db --hilos 4 lectura --workers-max 8
+#
+# El comando "lectura" levanta el servidor con 1, 2, 4... workers de uvicorn
+# y lo carga con rutas de lectura que no pasan por la caché de respuestas,
+# desde varios procesos cliente para que el GIL del cliente no sea el límite.
+# Informa peticiones por segundo y el escalado respecto de un worker; solo
+# puede escalar hasta la cantidad de núcleos de la máquina.
+#
+#   python benchmark.py --db grande.db autocompletar --consultas 5000
+#
+# El comando "autocompletar" carga, sin servidor, los índices de prefijos de
+# autocompletado.py e informa la memoria por fila y por entrada, y la latencia
+# de búsqueda contra un LIKE '%x%' sobre la tabla.
+#
+#   python benchmark.py --hilos 128 --duracion 20 sobrecarga
+#
+# El comando "sobrecarga" lanza más clientes concurrentes de los que el
+# servidor puede atender, mitad lecturas y mitad escrituras, sin control de
+# admisión y con él (admision.py). Informa, por clase, las peticiones
+# aceptadas y rechazadas por segundo y la latencia de cada grupo. Un cliente
+# rechazado espera Retry-After antes de volver a intentar.
+
+import argparse
+import datetime
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+# ==================== SERVIDOR ====================
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def copiar_db(origen, destino_dir):
+    destino = os.path.join(destino_dir, "biblioteca.db")
+    if origen and os.path.exists(origen):
+        shutil.copyfile(origen, destino)
+    return destino
+
+
+def iniciar_servidor(db, env_extra=None, workers=1):
+    puerto = puerto_libre()
+    env = dict(os.environ, BIBLIOTECA_DB=db, **(env_extra or {}))
+    proceso = subprocess.Popen(
+        [sys.executable, "servidor.py", "--host", "127.0.0.1",
+         "--port", str(puerto), "--workers", str(workers), "--log-level", "warning"],
+        cwd=DIRECTORIO, env=env,
+    )
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            conn.close()
+            return proceso, puerto
+        except OSError:
+            time.sleep(0.1)
+    proceso.terminate()
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+def detener_servidor(proceso):
+    proceso.terminate()
+    try:
+        proceso.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+
+
+# ==================== CARGA ====================
+
+class Cliente:
+    """Conexión HTTP keep-alive de un hilo de carga."""
+
+    def __init__(self, puerto):
+        self.conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        headers = {}
+        if isinstance(cuerpo, bytes):
+            headers["Content-Type"] = "application/x-ndjson"
+        elif cuerpo is not None:
+            cuerpo = json.dumps(cuerpo)
+            headers["Content-Type"] = "application/json"
+        self.conn.request(metodo, ruta, body=cuerpo, headers=headers)
+        respuesta = self.conn.getresponse()
+        datos = respuesta.read()
+        return respuesta.status, datos
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def resumir(latencias, errores, duracion):
+    return {
+        "peticiones": len(latencias),
+        "errores": errores,
+        "req_por_seg": round(len(latencias) / duracion, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+    }
+
+
+def recolectar_latencias(puerto, hilos, duracion, operacion, por_ruta=False):
+    """Ejecuta `operacion(cliente, n)` en bucle desde varios hilos.
+
+    `operacion` devuelve una lista de (segundos, ok) por cada petición hecha,
+    o de (ruta, segundos, ok) si se pide `por_ruta`. Devuelve las latencias y
+    los errores por ruta (None sin `por_ruta`) y el tiempo transcurrido.
+    """
+    latencias, errores = {}, {}
+    candado = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def trabajador(numero):
+        cliente = Cliente(puerto)
+        propias, fallidas, n = {}, {}, 0
+        while time.perf_counter() < fin:
+            for resultado in operacion(cliente, numero * 1_000_000 + n):
+                ruta, segundos, ok = resultado if por_ruta else (None, *resultado)
+                propias.setdefault(ruta, []).append(segundos)
+                fallidas[ruta] = fallidas.get(ruta, 0) + (not ok)
+            n += 1
+        with candado:
+            for ruta, valores in propias.items():
+                latencias.setdefault(ruta, []).extend(valores)
+                errores[ruta] = errores.get(ruta, 0) + fallidas[ruta]
+
+    hilos_carga = [threading.Thread(target=trabajador, args=(i,)) for i in range(hilos)]
+    inicio = time.perf_counter()
+    for h in hilos_carga:
+        h.start()
+    for h in hilos_carga:
+        h.join()
+    return latencias, errores, time.perf_counter() - inicio
+
+
+def ejecutar_carga(puerto, hilos, duracion, operacion, por_ruta=False):
+    """Como recolectar_latencias(), pero resumido: el total y, si se pide
+    `por_ruta`, además un resumen por ruta."""
+    latencias, errores, transcurrido = recolectar_latencias(puerto, hilos, duracion, operacion, por_ruta)
+    total = resumir([s for valores in latencias.values() for s in valores],
+                    sum(errores.values()), transcurrido)
+    if not por_ruta:
+        return total
+    return total, {ruta: resumir(latencias[ruta], errores[ruta], transcurrido)
+                   for ruta in sorted(latencias)}
+
+
+def medir(cliente, metodo, ruta, cuerpo=None, esperados=(200,)):
+    inicio = time.perf_counter()
+    status, datos = cliente.pedir(metodo, ruta, cuerpo)
+    return time.perf_counter() - inicio, status in esperados, datos
+
+
+# ==================== ESCENARIOS ====================
+
+def operacion_crud(cliente, n):
+    resultados = []
+    segundos, ok, datos = medir(cliente, "POST", "/autores", {
+        "nombre": f"Autor {n}", "nacionalidad": "Argentina",
+        "fecha_nacimiento": "1970-01-01", "biografia": "Benchmark",
+    })
+    resultados.append((segundos, ok))
+    if not ok:
+        return resultados
+    autor_id = json.loads(datos)["id"]
+    for metodo, ruta, cuerpo in (
+        ("GET", "/autores", None),
+        ("PUT", f"/autores/{autor_id}", {
+            "nombre": f"Autor {n} (editado)", "nacionalidad": "Argentina",
+            "fecha_nacimiento": "1970-01-01",
+        }),
+        ("GET", "/libros", None),
+        ("GET", "/estadisticas", None),
+        ("DELETE", f"/autores/{autor_id}", None),
+    ):
+        segundos, ok, _ = medir(cliente, metodo, ruta, cuerpo)
+        resultados.append((segundos, ok))
+    return resultados
+
+
+def comparar(escenarios, args, operacion, workers=1):
+    resultados = {}
+    for nombre, env in escenarios:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = copiar_db(args.db, tmp)
+            proceso, puerto = iniciar_servidor(db, env, workers=workers)
+            try:
+                resultados[nombre] = ejecutar_carga(puerto, args.hilos, args.duracion, operacion)
+            finally:
+                detener_servidor(proceso)
+    return resultados
+
+
+def imprimir_tabla(resultados, columnas=("req_por_seg", "p50_ms", "p95_ms", "p99_ms", "errores")):
+    print(f"{'escenario':<32}" + "".join(f"{c:>14}" for c in columnas))
+    for nombre, datos in resultados.items():
+        print(f"{nombre:<32}" + "".join(f"{datos[c]:>14}" for c in columnas))
+
+
+LIBROS_STRESS = 2000
+# Libros que todos los hilos se disputan en la mitad de los intentos
+LIBROS_DISPUTADOS = 10
+
+
+def cargar_libros_stress(puerto, cantidad):
+    cuerpo = "\n".join(json.dumps({
+        "titulo": f"Stress {i}", "autor_id": 1, "categoria_id": 1,
+        "isbn": f"STRESS-{i}", "año_publicacion": 2000, "paginas": 100,
+    }) for i in range(cantidad))
+    conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+    conn.request("POST", "/libros/bulk", body=cuerpo.encode(),
+                 headers={"Content-Type": "application/x-ndjson"})
+    conn.getresponse().read()
+    conn.close()
+
+
+def ids_de(db, sql):
+    conn = sqlite3.connect(db)
+    try:
+        return [fila[0] for fila in conn.execute(sql)]
+    finally:
+        conn.close()
+
+
+def operacion_checkout(libros, usuarios, exitosos):
+    disputados = libros[:LIBROS_DISPUTADOS]
+
+    def operacion(cliente, n):
+        libro_id = random.choice(disputados if n % 2 else libros)
+        inicio = time.perf_counter()
+        status, _ = cliente.pedir("POST", "/prestamos", {
+            "libro_id": libro_id, "usuario_id": random.choice(usuarios),
+            "fecha_prestamo": "2099-01-01", "fecha_devolucion_esperada": "2099-01-15",
+        })
+        if status == 200:
+            exitosos.append(libro_id)
+        # 400 = libro ya prestado: es una respuesta correcta, no un error
+        return [(time.perf_counter() - inicio, status in (200, 400))]
+
+    return operacion
+
+
+def cmd_checkout(args):
+    filas = []
+    hilos = 1
+    while hilos <= args.hilos_max:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = copiar_db(args.db, tmp)
+            proceso, puerto = iniciar_servidor(db)
+            try:
+                cargar_libros_stress(puerto, LIBROS_STRESS)
+                libros = ids_de(db, "SELECT id FROM libros WHERE disponible = 1 ORDER BY id DESC")
+                usuarios = ids_de(db, "SELECT id FROM usuarios")
+                exitosos = []
+                resumen = ejecutar_carga(puerto, hilos, args.duracion,
+                                         operacion_checkout(libros, usuarios, exitosos))
+            finally:
+                detener_servidor(proceso)
+            dobles = ids_de(db, """
+                SELECT libro_id FROM prestamos
+                WHERE devuelto = 0 AND fecha_prestamo = '2099-01-01'
+                GROUP BY libro_id HAVING COUNT(*) > 1
+            """)
+            repetidos = len(exitosos) - len(set(exitosos))
+        filas.append({
+            "hilos": hilos,
+            "intentos_por_seg": resumen["req_por_seg"],
+            "prestamos_por_seg": round(len(exitosos) / args.duracion, 1),
+            "p99_ms": resumen["p99_ms"],
+            "errores": resumen["errores"],
+            "prestamos_dobles": len(dobles) + repetidos,
+        })
+        hilos *= 2
+
+    columnas = ("intentos_por_seg", "prestamos_por_seg", "p99_ms", "errores", "prestamos_dobles")
+    print(f"{'hilos':<8}" + "".join(f"{c:>20}" for c in columnas))
+    for fila in filas:
+        print(f"{fila['hilos']:<8}" + "".join(f"{fila[c]:>20}" for c in columnas))
+    if any(fila["prestamos_dobles"] for fila in filas):
+        print("ERROR: se registraron préstamos dobles")
+        sys.exit(1)
+    return filas
+
+
+def operacion_escritura(cliente, n):
+    resultados = []
+    segundos, ok, datos = medir(cliente, "POST", "/resenas", {
+        "libro_id": 1 + n % 12, "usuario_id": 1 + n % 12, "calificacion": 1 + n % 5,
+        "comentario": f"Reseña {n}", "fecha": "2099-01-01",
+    })
+    resultados.append((segundos, ok))
+    if ok:
+        resena_id = json.loads(datos)["id"]
+        segundos, ok, _ = medir(cliente, "DELETE", f"/resenas/{resena_id}")
+        resultados.append((segundos, ok))
+    return resultados
+
+
+def cmd_escritura(args):
+    resultados = comparar([
+        ("commit por petición", {}),
+        ("escritura agrupada", {"BIBLIOTECA_ESCRITURA_AGRUPADA": "1"}),
+    ], args, operacion_escritura)
+    imprimir_tabla(resultados)
+    return resultados
+
+
+def cmd_crud(args):
+    resultados = comparar([
+        ("sin pool", {"BIBLIOTECA_POOL_SIZE": "0"}),
+        ("con pool", {}),
+    ], args, operacion_crud)
+    imprimir_tabla(resultados)
+    return resultados
+
+
+# ==================== SUITE COMPLETA ====================
+
+PALABRAS_BUSQUEDA = ["amor", "soledad", "ciudad", "noche", "borges", "tiempo", "casa", "mar"]
+
+
+def muestra_ids(db, tabla, cantidad=5000):
+    return ids_de(db, f"SELECT id FROM {tabla} ORDER BY random() LIMIT {cantidad}") or [1]
+
+
+class FlujosSuite:
+    """Flujos de peticiones que recorren todas las rutas de la API.
+
+    Cada flujo devuelve (ruta, segundos, ok) por petición; la ruta es la
+    plantilla (por ejemplo "PUT /libros/{id}") para agrupar los resultados.
+    Las lecturas pesan más que las escrituras, como en el uso real.
+    """
+
+    def __init__(self, db):
+        self.libros = muestra_ids(db, "libros")
+        self.autores = muestra_ids(db, "autores")
+        self.usuarios = muestra_ids(db, "usuarios")
+        self.categorias = muestra_ids(db, "categorias")
+        self.flujos = [self.lecturas] * 4 + [
+            self.autores_crud, self.libros_crud, self.usuarios_crud, self.categorias_crud,
+            self.prestamos_crud, self.resenas_crud, self.importaciones, self.exportaciones,
+        ]
+
+    def __call__(self, cliente, n):
+        return self.flujos[n % len(self.flujos)](cliente, n)
+
+    @staticmethod
+    def pedir(cliente, plantilla, ruta, cuerpo=None, esperados=(200,)):
+        metodo = plantilla.split()[0]
+        segundos, ok, datos = medir(cliente, metodo, ruta, cuerpo, esperados)
+        return (plantilla, segundos, ok), datos
+
+    def lecturas(self, cliente, n):
+        libro_id = random.choice(self.libros)
+        peticiones = [
+            ("GET /", "/"),
+            ("GET /categorias", "/categorias"),
+            ("GET /autores", "/autores?limite=50"),
+            ("GET /libros", f"/libros?limite=50&categoria_id={random.choice(self.categorias)}"),
+            ("GET /usuarios", "/usuarios?limite=50"),
+            ("GET /prestamos", f"/prestamos?limite=50&usuario_id={random.choice(self.usuarios)}"),
+            ("GET /resenas", f"/resenas?limite=50&libro_id={libro_id}"),
+            ("GET /resenas/libro/{id}", f"/resenas/libro/{libro_id}"),
+            ("GET /buscar", f"/buscar?q={random.choice(PALABRAS_BUSQUEDA)}"),
+            ("GET /estadisticas", "/estadisticas"),
+        ]
+        return [self.pedir(cliente, plantilla, ruta)[0] for plantilla, ruta in peticiones]
+
+    def crud(self, cliente, recurso, cuerpo, cuerpo_editado):
+        resultado, datos = self.pedir(cliente, f"POST /{recurso}", f"/{recurso}", cuerpo)
+        resultados = [resultado]
+        if resultado[2]:
+            id_ = json.loads(datos)["id"]
+            resultados.append(self.pedir(cliente, f"PUT /{recurso}/{{id}}", f"/{recurso}/{id_}", cuerpo_editado)[0])
+            resultados.append(self.pedir(cliente, f"DELETE /{recurso}/{{id}}", f"/{recurso}/{id_}")[0])
+        return resultados
+
+    def autores_crud(self, cliente, n):
+        autor = {"nombre": f"Suite {n}", "nacionalidad": "Argentina", "fecha_nacimiento": "1970-01-01"}
+        return self.crud(cliente, "autores", autor, {**autor, "biografia": "Editado"})
+
+    def libros_crud(self, cliente, n):
+        libro = {"titulo": f"Suite {n}", "autor_id": random.choice(self.autores),
+                 "categoria_id": random.choice(self.categorias), "isbn": f"SUITE-{n}",
+                 "año_publicacion": 2000, "paginas": 100}
+        return self.crud(cliente, "libros", libro, {**libro, "paginas": 120})
+
+    def usuarios_crud(self, cliente, n):
+        usuario = {"nombre": f"Suite {n}", "email": f"suite{n}@ejemplo.com", "telefono": "+54 381 0000000",
+                   "direccion": "San Martín 1", "fecha_registro": "2099-01-01"}
+        return self.crud(cliente, "usuarios", usuario, {**usuario, "direccion": "Belgrano 2"})
+
+    def categorias_crud(self, cliente, n):
+        categoria = {"nombre": f"Suite {n}", "descripcion": "Benchmark"}
+        return self.crud(cliente, "categorias", categoria, {**categoria, "descripcion": "Editada"})
+
+    def prestamos_crud(self, cliente, n):
+        # 400 = libro ya prestado: es una respuesta correcta, no un error
+        resultado, datos = self.pedir(cliente, "POST /prestamos", "/prestamos", {
+            "libro_id": random.choice(self.libros), "usuario_id": random.choice(self.usuarios),
+            "fecha_prestamo": "2099-01-01", "fecha_devolucion_esperada": "2099-01-15",
+        }, esperados=(200, 400))
+        resultados = [resultado]
+        if resultado[2] and b'"id"' in datos:
+            prestamo_id = json.loads(datos)["id"]
+            resultados.append(self.pedir(cliente, "PUT /prestamos/{id}/devolver", f"/prestamos/{prestamo_id}/devolver")[0])
+            resultados.append(self.pedir(cliente, "DELETE /prestamos/{id}", f"/prestamos/{prestamo_id}")[0])
+        return resultados
+
+    def resenas_crud(self, cliente, n):
+        resena = {"libro_id": random.choice(self.libros), "usuario_id": random.choice(self.usuarios),
+                  "calificacion": 1 + n % 5, "comentario": f"Suite {n}", "fecha": "2099-01-01"}
+        return self.crud(cliente, "resenas", resena, {**resena, "calificacion": 5})
+
+    def importaciones(self, cliente, n):
+        lotes = {
+            "autores": [{"nombre": f"Suite bulk {n}-{i}", "nacionalidad": "Argentina",
+                         "fecha_nacimiento": "1970-01-01"} for i in range(10)],
+            "libros": [{"titulo": f"Suite bulk {n}-{i}", "autor_id": random.choice(self.autores),
+                        "categoria_id": random.choice(self.categorias), "isbn": f"SUITE-B-{n}-{i}",
+                        "año_publicacion": 2000, "paginas": 100}
+                       for i in range(10)],
+            "usuarios": [{"nombre": f"Suite bulk {n}-{i}", "email": f"suite.bulk{n}.{i}@ejemplo.com",
+                          "telefono": "+54 381 0000000", "direccion": "San Martín 1",
+                          "fecha_registro": "2099-01-01"} for i in range(10)],
+        }
+        resultados = []
+        for recurso, filas in lotes.items():
+            (plantilla, segundos, ok), datos = self.pedir(
+                cliente, f"POST /{recurso}/bulk", f"/{recurso}/bulk",
+                "\n".join(json.dumps(fila) for fila in filas).encode())
+            # La importación responde 200 aunque rechace filas
+            resultados.append((plantilla, segundos, ok and json.loads(datos)["total_errores"] == 0))
+        return resultados
+
+    def exportaciones(self, cliente, n):
+        dia = (datetime.date.today() - datetime.timedelta(days=random.randrange(365))).isoformat()
+        return [
+            self.pedir(cliente, "GET /prestamos/export", f"/prestamos/export?formato=ndjson&desde={dia}&hasta={dia}")[0],
+            self.pedir(cliente, "GET /resenas/export", f"/resenas/export?formato=csv&desde={dia}&hasta={dia}")[0],
+        ]
+
+
+# ==================== SERIALIZACIÓN ====================
+
+CONSULTAS_LISTADO = {
+    "/libros": """
+        SELECT l.*, a.nombre as autor_nombre, c.nombre as categoria_nombre
+        FROM libros l
+        JOIN autores a ON l.autor_id = a.id
+        JOIN categorias c ON l.categoria_id = c.id
+        ORDER BY l.titulo, l.id
+    """,
+    "/prestamos": """
+        SELECT p.*, l.titulo as libro_titulo, u.nombre as usuario_nombre, a.nombre as autor_nombre
+        FROM prestamos p
+        JOIN libros l ON p.libro_id = l.id
+        JOIN usuarios u ON p.usuario_id = u.id
+        JOIN autores a ON l.autor_id = a.id
+        ORDER BY p.fecha_prestamo DESC, p.id DESC
+    """,
+}
+
+
+def cuerpo_anterior(conn, sql):
+    """Camino anterior: sqlite3.Row -> dict -> jsonable_encoder -> JSONResponse."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    cursor = conn.cursor()
+    cursor.execute(sql)
+    filas = [dict(row) for row in cursor.fetchall()]
+    return JSONResponse(jsonable_encoder(filas)).body
+
+
+def cuerpo_rapido(conn, sql):
+    """Camino nuevo: tuplas -> dicts -> a_json (orjson si está instalado)."""
+    from serializacion import a_json, filas_como_dicts
+
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql)
+    return a_json(filas_como_dicts(cursor, cursor.fetchall()))
+
+
+def medir_serializacion(conn, sql, funcion, repeticiones):
+    import tracemalloc
+
+    cpu = []
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        cuerpo = funcion(conn, sql)
+        cpu.append(time.process_time() - inicio)
+    # La memoria se mide en una corrida aparte: tracemalloc agrega su propio costo
+    tracemalloc.start()
+    funcion(conn, sql)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cpu_ms": round(min(cpu) * 1000, 1), "pico_mb": round(pico / 2**20, 1), "bytes": len(cuerpo)}
+
+
+def cmd_json(args):
+    import generar_datos
+    import serializacion
+    from database import conectar
+
+    resultados = {}
+    for filas in args.filas:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "biblioteca.db")
+            print(f"Generando base con {filas:,} libros y préstamos...")
+            generar_datos.main(["--db", db, "--libros", str(filas), "--prestamos", str(filas),
+                                "--autores", str(max(filas // 50, 1)), "--usuarios", str(max(filas // 10, 1)),
+                                "--resenas", "0"])
+            conn = conectar(db)
+            try:
+                for ruta, sql in CONSULTAS_LISTADO.items():
+                    nombre = f"{ruta} ({filas:,} filas)"
+                    orjson = serializacion.orjson
+                    resultados[f"{nombre} anterior"] = medir_serializacion(conn, sql, cuerpo_anterior, args.repeticiones)
+                    serializacion.orjson = None
+                    resultados[f"{nombre} rápido, json"] = medir_serializacion(conn, sql, cuerpo_rapido, args.repeticiones)
+                    serializacion.orjson = orjson
+                    if orjson is not None:
+                        resultados[f"{nombre} rápido, orjson"] = medir_serializacion(conn, sql, cuerpo_rapido, args.repeticiones)
+            finally:
+                conn.cerrar_definitivamente()
+
+    columnas = ("cpu_ms", "pico_mb", "bytes")
+    print(f"{'camino':<44}" + "".join(f"{c:>12}" for c in columnas))
+    for nombre, datos in resultados.items():
+        print(f"{nombre:<44}" + "".join(f"{datos[c]:>12}" for c in columnas))
+    return resultados
+
+
+# ==================== CARGA INICIAL ====================
+
+# Las mismas primeras páginas que devuelve /bootstrap (LIMITE_BOOTSTRAP)
+ESCENARIOS_INICIO = {
+    "7 peticiones": ["/categorias", "/autores?limite=100", "/libros?limite=100", "/usuarios?limite=100",
+                     "/prestamos?limite=100", "/resenas?limite=100", "/estadisticas"],
+    "GET /bootstrap": ["/bootstrap"],
+    "GET /libros": ["/libros"],
+    "GET /libros con 3 campos": ["/libros?fields=id,titulo,disponible"],
+}
+
+
+def cmd_inicio(args):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = copiar_db(args.db, tmp)
+        proceso, puerto = iniciar_servidor(db)
+        try:
+            for nombre, rutas in ESCENARIOS_INICIO.items():
+                tiempos, total_bytes = [], 0
+                for _ in range(args.repeticiones):
+                    # Una conexión nueva por carga, como un navegador que abre la página
+                    cliente = Cliente(puerto)
+                    inicio = time.perf_counter()
+                    total_bytes = sum(len(cliente.pedir("GET", ruta)[1]) for ruta in rutas)
+                    tiempos.append(time.perf_counter() - inicio)
+                    cliente.conn.close()
+                resultados[nombre] = {"peticiones": len(rutas), "p50_ms": round(percentil(tiempos, 50) * 1000, 2),
+                                      "bytes": total_bytes}
+        finally:
+            detener_servidor(proceso)
+    imprimir_tabla(resultados, ("peticiones", "p50_ms", "bytes"))
+    return resultados
+
+
+# ==================== VARIOS WORKERS ====================
+
+BUSQUEDAS = ("sombra", "tiempo", "mar", "amor", "casa", "soledad", "noche")
+
+
+class OperacionLectura:
+    """Lecturas que no usan la caché de respuestas: cada una consulta la base."""
+
+    def __init__(self, db):
+        self.libros = muestra_ids(db, "libros")
+        self.usuarios = muestra_ids(db, "usuarios")
+
+    def ruta(self):
+        return random.choice((
+            lambda: f"/prestamos?usuario_id={random.choice(self.usuarios)}&limite=20",
+            lambda: f"/resenas/libro/{random.choice(self.libros)}",
+            lambda: f"/libros/{random.choice(self.libros)}/rating",
+            lambda: f"/buscar?q={random.choice(BUSQUEDAS)}",
+            lambda: "/prestamos/vencidos?limite=20",
+            lambda: "/estadisticas",
+        ))()
+
+    def __call__(self, cliente, n):
+        segundos, ok, _ = medir(cliente, "GET", self.ruta())
+        return [(segundos, ok)]
+
+
+def carga_en_procesos(puerto, procesos, hilos, duracion, operacion):
+    """ejecutar_carga() repartida en varios procesos cliente (fork)."""
+    contexto = multiprocessing.get_context("fork")
+    cola = contexto.Queue()
+
+    def cliente():
+        random.seed(os.getpid())
+        latencias, errores, transcurrido = recolectar_latencias(puerto, hilos, duracion, operacion)
+        cola.put((latencias.get(None, []), sum(errores.values()), transcurrido))
+
+    hijos = [contexto.Process(target=cliente) for _ in range(procesos)]
+    for hijo in hijos:
+        hijo.start()
+    partes = [cola.get() for _ in hijos]
+    for hijo in hijos:
+        hijo.join()
+    return resumir([s for latencias, _, _ in partes for s in latencias],
+                   sum(errores for _, errores, _ in partes),
+                   max(transcurrido for _, _, transcurrido in partes))
+
+
+def cmd_lectura(args):
+    nucleos = os.cpu_count() or 1
+    maximo = args.workers_max or nucleos
+    cantidades = sorted({1, maximo, *(2 ** i for i in range(maximo.bit_length()) if 2 ** i <= maximo)})
+    procesos = args.procesos or nucleos
+    print(f"{nucleos} núcleos; {procesos} procesos cliente x {args.hilos} hilos")
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = copiar_db(args.db, tmp)
+        operacion = None
+        for workers in cantidades:
+            proceso, puerto = iniciar_servidor(db, workers=workers)
+            try:
+                # Con la base ya inicializada por el primer servidor
+                operacion = operacion or OperacionLectura(db)
+                resultados[f"{workers} worker(s)"] = carga_en_procesos(
+                    puerto, procesos, args.hilos, args.duracion, operacion)
+            finally:
+                detener_servidor(proceso)
+
+    base = next(iter(resultados.values()))["req_por_seg"]
+    for datos in resultados.values():
+        datos["escalado"] = round(datos["req_por_seg"] / base, 2) if base else 0.0
+    imprimir_tabla(resultados, ("req_por_seg", "escalado", "p50_ms", "p99_ms", "errores"))
+    return resultados
+
+
+# ==================== SOBRECARGA ====================
+
+# Segundos que espera un cliente rechazado (el Retry-After de admision.py)
+ESPERA_RECHAZO = 1
+
+
+class OperacionSobrecarga:
+    def __init__(self, db):
+        self.libros = muestra_ids(db, "libros")
+        self.usuarios = muestra_ids(db, "usuarios")
+
+    def __call__(self, cliente, n):
+        if n % 2:
+            clase, metodo, ruta, cuerpo = "escritura", "POST", "/resenas", {
+                "libro_id": random.choice(self.libros), "usuario_id": random.choice(self.usuarios),
+                "calificacion": 1 + n % 5, "comentario": f"Reseña {n}", "fecha": "2099-01-01",
+            }
+        else:
+            clase, metodo, cuerpo = "lectura", "GET", None
+            ruta = f"/prestamos?usuario_id={random.choice(self.usuarios)}&limite=20"
+        inicio = time.perf_counter()
+        status, _ = cliente.pedir(metodo, ruta, cuerpo)
+        segundos = time.perf_counter() - inicio
+        if status == 503:
+            time.sleep(ESPERA_RECHAZO)
+            return [(f"{clase} rechazada", segundos, True)]
+        return [(f"{clase} aceptada", segundos, status == 200)]
+
+
+def cmd_sobrecarga(args):
+    sin_limites = {"BIBLIOTECA_LIMITE_LECTURAS": "0", "BIBLIOTECA_LIMITE_ESCRITURAS": "0"}
+    resultados = {}
+    for nombre, env in (("sin admisión", sin_limites), ("con admisión", {})):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = copiar_db(args.db, tmp)
+            proceso, puerto = iniciar_servidor(db, env)
+            try:
+                _, por_clase = ejecutar_carga(puerto, args.hilos, args.duracion,
+                                              OperacionSobrecarga(db), por_ruta=True)
+            finally:
+                detener_servidor(proceso)
+        for clase, datos in por_clase.items():
+            resultados[f"{nombre}: {clase}"] = datos
+    imprimir_tabla(resultados, ("req_por_seg", "p50_ms", "p99_ms", "errores"))
+    return resultados
+
+
+# ==================== AUTOCOMPLETADO ====================
+
+CONSULTAS_LIKE = {
+    "libros": "SELECT id, titulo, disponible FROM libros WHERE titulo LIKE ? LIMIT 10",
+    "autores": "SELECT id, nombre FROM autores WHERE nombre LIKE ? LIMIT 10",
+    "usuarios": "SELECT id, nombre, email FROM usuarios WHERE nombre LIKE ? OR email LIKE ? LIMIT 10",
+}
+
+
+def cmd_autocompletar(args):
+    import gc
+    import tracemalloc
+
+    import autocompletado
+    from cambios import ultimo_seq
+    from database import conectar, transaccion_lectura
+
+    random.seed(args.semilla)
+    conn = conectar(args.db)
+    resultados = {}
+    try:
+        for tipo, (select, columnas) in autocompletado.FUENTES.items():
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            # Las filas se leen con tracemalloc activo: el índice las conserva
+            gc.collect()
+            tracemalloc.start()
+            cursor.execute(select)
+            nombres = [columna[0] for columna in cursor.description]
+            filas = cursor.fetchall()
+            indice = autocompletado.IndicePrefijos(columnas)
+            indice.cargar(nombres, filas)
+            del filas
+            gc.collect()
+            memoria = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            # Prefijos de 1 a 5 letras de palabras que existen
+            textos = list(indice.textos.values())
+            consultas = []
+            for _ in range(args.consultas):
+                palabras = random.choice(textos).replace(autocompletado.SEPARADOR, " ").split() or ["a"]
+                consultas.append(random.choice(palabras)[:random.randint(1, 5)])
+
+            tiempos_indice, tiempos_like = [], []
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                indice.buscar(consulta, autocompletado.LIMITE_AUTOCOMPLETADO)
+                tiempos_indice.append(time.perf_counter() - inicio)
+            # Lo que agrega cada petición: ver si el registro de cambios avanzó
+            with transaccion_lectura(conn) as cursor:
+                seq = ultimo_seq(cursor)
+            tiempos_sincronizacion = []
+            for _ in range(min(args.consultas, 1000)):
+                inicio = time.perf_counter()
+                assert ultimo_seq(conn.cursor()) == seq
+                tiempos_sincronizacion.append(time.perf_counter() - inicio)
+            like = CONSULTAS_LIKE[tipo]
+            for consulta in consultas[:args.consultas_like]:
+                inicio = time.perf_counter()
+                conn.execute(like, (f"%{consulta}%",) * like.count("?")).fetchall()
+                tiempos_like.append(time.perf_counter() - inicio)
+
+            resultados[tipo] = {
+                "filas": len(indice.filas),
+                "entradas": len(indice.entradas),
+                "mb": round(memoria / 2**20, 1),
+                "bytes_fila": round(memoria / max(len(indice.filas), 1)),
+                "bytes_entrada": round(memoria / max(len(indice.entradas), 1)),
+                "p50_us": round(percentil(tiempos_indice, 50) * 1e6, 1),
+                "p99_us": round(percentil(tiempos_indice, 99) * 1e6, 1),
+                "sinc_us": round(percentil(tiempos_sincronizacion, 50) * 1e6, 1),
+                "like_p50_us": round(percentil(tiempos_like, 50) * 1e6, 1),
+                "like_p99_us": round(percentil(tiempos_like, 99) * 1e6, 1),
+            }
+    finally:
+        conn.cerrar_definitivamente()
+    imprimir_tabla(resultados, ("filas", "entradas", "mb", "bytes_fila", "bytes_entrada",
+                                "p50_us", "p99_us", "sinc_us", "like_p50_us", "like_p99_us"))
+    return resultados
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def contar_filas(db):
+    conn = sqlite3.connect(db)
+    try:
+        return {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                for tabla in ("libros", "autores", "usuarios", "prestamos", "resenas")}
+    finally:
+        conn.close()
+
+
+def cmd_suite(args):
+    random.seed(args.semilla)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = copiar_db(args.db, tmp)
+        proceso, puerto = iniciar_servidor(db)
+        try:
+            filas = contar_filas(db)
+            total, rutas = ejecutar_carga(puerto, args.hilos, args.duracion, FlujosSuite(db), por_ruta=True)
+        finally:
+            detener_servidor(proceso)
+
+    imprimir_tabla({"TOTAL": total, **rutas})
+    resultado = {
+        "commit": commit_actual(),
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "hilos": args.hilos,
+        "duracion": args.duracion,
+        "filas": filas,
+        "total": total,
+        "rutas": rutas,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.salida}")
+    return resultado
+
+
+def cmd_comparar(args):
+    """Compara dos resultados de la suite, por ejemplo de dos commits."""
+    with open(args.anterior, encoding="utf-8") as f:
+        anterior = json.load(f)
+    with open(args.actual, encoding="utf-8") as f:
+        actual = json.load(f)
+
+    def variacion(antes, despues):
+        return f"{(despues - antes) / antes * 100:+.1f}%" if antes else "-"
+
+    print(f"{anterior.get('commit')} -> {actual.get('commit')}")
+    print(f"{'ruta':<32}{'req/s':>12}{'Δ req/s':>10}{'p95_ms':>12}{'Δ p95':>10}{'p99_ms':>12}{'Δ p99':>10}")
+    filas = [("TOTAL", anterior["total"], actual["total"])] + [
+        (ruta, anterior["rutas"][ruta], datos)
+        for ruta, datos in actual["rutas"].items() if ruta in anterior["rutas"]
+    ]
+    regresiones = []
+    for ruta, antes, despues in filas:
+        print(f"{ruta:<32}{despues['req_por_seg']:>12}{variacion(antes['req_por_seg'], despues['req_por_seg']):>10}"
+              f"{despues['p95_ms']:>12}{variacion(antes['p95_ms'], despues['p95_ms']):>10}"
+              f"{despues['p99_ms']:>12}{variacion(antes['p99_ms'], despues['p99_ms']):>10}")
+        if antes["p95_ms"] and despues["p95_ms"] > antes["p95_ms"] * (1 + args.tolerancia / 100):
+            regresiones.append(ruta)
+    if regresiones:
+        print(f"Regresiones de p95 mayores al {args.tolerancia}%: {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de la API de Biblioteca")
+    parser.add_argument("--db", default=os.path.join(DIRECTORIO, "biblioteca.db"),
+                        help="base de datos a copiar para la prueba")
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--duracion", type=float, default=10.0, help="segundos por escenario")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("crud", help="CRUD concurrente: sin pool vs con pool").set_defaults(func=cmd_crud)
+    checkout = sub.add_parser("checkout", help="préstamos concurrentes sobre los mismos libros")
+    checkout.add_argument("--hilos-max", type=int, default=32)
+    checkout.set_defaults(func=cmd_checkout)
+    sub.add_parser("escritura", help="commit por petición vs escritura agrupada").set_defaults(func=cmd_escritura)
+    suite = sub.add_parser("suite", help="todas las rutas con clientes concurrentes")
+    suite.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    suite.add_argument("--semilla", type=int, default=42)
+    suite.set_defaults(func=cmd_suite)
+    serializacion = sub.add_parser("json", help="CPU y memoria de serializar listados grandes")
+    serializacion.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000])
+    serializacion.add_argument("--repeticiones", type=int, default=3)
+    serializacion.set_defaults(func=cmd_json)
+    inicio = sub.add_parser("inicio", help="carga inicial: siete peticiones vs /bootstrap")
+    inicio.add_argument("--repeticiones", type=int, default=50)
+    inicio.set_defaults(func=cmd_inicio)
+    lectura = sub.add_parser("lectura", help="escalado de lecturas con varios workers de uvicorn")
+    lectura.add_argument("--workers-max", type=int, help="por defecto, la cantidad de núcleos")
+    lectura.add_argument("--procesos", type=int, help="procesos cliente (por defecto, la cantidad de núcleos)")
+    lectura.set_defaults(func=cmd_lectura)
+    autocompletar = sub.add_parser("autocompletar", help="memoria y latencia de los índices de prefijos")
+    autocompletar.add_argument("--consultas", type=int, default=5000)
+    autocompletar.add_argument("--consultas-like", type=int, default=200, help="consultas LIKE de comparación")
+    autocompletar.add_argument("--semilla", type=int, default=42)
+    autocompletar.set_defaults(func=cmd_autocompletar)
+    sobrecarga = sub.add_parser("sobrecarga", help="ráfaga de lecturas y escrituras con y sin control de admisión")
+    sobrecarga.set_defaults(func=cmd_sobrecarga)
+    comparacion = sub.add_parser("comparar", help="compara dos resultados JSON de la suite")
+    comparacion.add_argument("anterior")
+    comparacion.add_argument("actual")
+    comparacion.add_argument("--tolerancia", type=float, default=10.0,
+                             help="aumento de p95 (%%) a partir del cual se marca una regresión")
+    comparacion.set_defaults(func=cmd_comparar)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# ==================== CACHÉ DE RESPUESTAS ====================
+# Caché en memoria para los GET del catálogo (categorías, autores, libros).
+#
+# Guarda el cuerpo JSON ya serializado junto con un ETag fuerte (hash del
+# cuerpo). Un cliente que envía If-None-Match con ese ETag recibe 304 sin
+# cuerpo, y mientras nada cambie el servidor no vuelve a consultar la base.
+#
+# Cada entrada pertenece a un "recurso" y guarda la versión que tenía ese
+# recurso en la tabla versiones_cache al generarse. Los triggers suben la
+# versión en cada escritura, así que con varios workers (cada uno con su
+# propia caché) una entrada escrita por otro proceso se detecta como vieja.
+# La versión se lee antes de consultar los datos: si una escritura termina en
+# el medio, la entrada queda con la versión anterior y se regenera en la
+# próxima petición. Los handlers de escritura además llaman a invalidar() para
+# liberar enseguida las entradas del propio proceso.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from fastapi.responses import Response
+
+from compresion import MINIMO_BYTES, acepta_gzip
+from database import get_db
+from serializacion import a_json
+
+
+def version_en_base(recurso):
+    conn = get_db()
+    try:
+        fila = conn.execute("SELECT version FROM versiones_cache WHERE recurso = ?", (recurso,)).fetchone()
+    finally:
+        conn.close()
+    return fila[0] if fila else 0
+
+
+class CacheRespuestas:
+    def __init__(self, max_entradas=512, leer_version=version_en_base):
+        self.max_entradas = max_entradas
+        self.leer_version = leer_version
+        self._entradas = OrderedDict()  # clave -> (recurso, version, etag, cuerpo, headers)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(request):
+        return request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
+
+    def _respuesta(self, request, etag, cuerpo, headers):
+        headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            # El 304 no tiene cuerpo y MiddlewareCompresion no lo toca: lleva
+            # el mismo ETag débil que tendría el 200 comprimido
+            if len(cuerpo) >= MINIMO_BYTES and acepta_gzip(request.scope):
+                headers.update({"ETag": "W/" + etag, "Vary": "Accept-Encoding"})
+            return Response(status_code=304, headers=headers)
+        return Response(content=cuerpo, media_type="application/json", headers=headers)
+
+    def responder(self, request, recurso, generar):
+        """Devuelve la respuesta cacheada o la genera con `generar()`.
+
+        `generar()` devuelve (datos, headers) con los datos a serializar y los
+        encabezados extra de la respuesta (por ejemplo el cursor de paginación).
+        """
+        clave = self.clave(request)
+        version = self.leer_version(recurso)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+        if entrada is not None and entrada[1] == version:
+            _, _, etag, cuerpo, headers = entrada
+            return self._respuesta(request, etag, cuerpo, headers)
+
+        datos, headers = generar()
+        cuerpo = a_json(datos)
+        etag = '"' + hashlib.sha1(cuerpo).hexdigest() + '"'
+        with self._lock:
+            actual = self._entradas.get(clave)
+            # Otro hilo pudo guardar mientras tanto una versión más nueva
+            if actual is None or actual[1] <= version:
+                self._entradas[clave] = (recurso, version, etag, cuerpo, headers)
+                if len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        return self._respuesta(request, etag, cuerpo, headers)
+
+    def invalidar(self, *recursos):
+        with self._lock:
+            for clave in [c for c, e in self._entradas.items() if e[0] in recursos]:
+                del self._entradas[clave]
+
+
+cache_respuestas = CacheRespuestas()
@@ -0,0 +1,99 @@
+# ==================== SINCRONIZACIÓN INCREMENTAL ====================
+# GET /cambios?desde=<seq>: lo que cambió en las seis tablas desde un número
+# de secuencia, para que un cliente cargue todo una vez (GET /bootstrap) y
+# después se mantenga al día con respuestas pequeñas.
+#
+# Los triggers de la migración 10 escriben en la tabla cambios una fila por
+# alta, modificación o baja. Al leer, las entradas de una misma fila se
+# reducen a la última: si una fila se modificó y luego se borró, el cliente
+# solo recibe el borrado. Las filas modificadas se devuelven completas, con
+# la misma forma que en sus listados.
+#
+# compactar() mantiene acotada la tabla:
+# - Borra las entradas reemplazadas por otra posterior de la misma fila. No
+#   se pierde nada, porque al leer solo cuenta la última.
+# - Borra las entradas más viejas que la retención y sube el horizonte. Un
+#   cliente con un cursor anterior al horizonte recibe 410 y debe volver a
+#   cargar todo.
+
+import json
+
+from fastapi import HTTPException
+
+from serializacion import leer_dicts
+
+LIMITE_POR_DEFECTO = 1000
+LIMITE_MAXIMO_CAMBIOS = 10_000
+RETENCION_DIAS = 7
+
+
+def ultimo_seq(cursor):
+    # sqlite_sequence guarda el mayor seq asignado aunque se haya compactado
+    fila = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cambios'").fetchone()
+    return fila[0] if fila else 0
+
+
+def horizonte(cursor):
+    return cursor.execute("SELECT seq FROM cambios_horizonte WHERE id = 1").fetchone()[0]
+
+
+def leer_cambios(cursor, desde, limite, consultas):
+    """Cambios posteriores a `desde`, agrupados por tabla.
+
+    `consultas` indica, para cada tabla, el SELECT de su listado y la columna
+    de id con la que filtrarlo. Debe llamarse dentro de una transacción de
+    lectura, para que el registro y las filas correspondan al mismo instante.
+    """
+    ultimo = ultimo_seq(cursor)
+    if desde < horizonte(cursor) or desde > ultimo:
+        raise HTTPException(status_code=410, detail="Cursor de cambios vencido: volver a cargar con /bootstrap")
+
+    cursor.row_factory = None
+    entradas = cursor.execute(
+        "SELECT seq, tabla, fila_id, operacion FROM cambios WHERE seq > ? ORDER BY seq LIMIT ?",
+        (desde, limite),
+    ).fetchall()
+    hay_mas = len(entradas) == limite
+    hasta = entradas[-1][0] if hay_mas else ultimo
+
+    # La última operación de cada fila es la que vale
+    ultimas = {}
+    for _, tabla, fila_id, operacion in entradas:
+        ultimas[(tabla, fila_id)] = operacion
+
+    resultado = {}
+    for (tabla, fila_id), operacion in ultimas.items():
+        cambios = resultado.setdefault(tabla, {"upsert": [], "delete": []})
+        cambios["delete" if operacion == "delete" else "upsert"].append(fila_id)
+    for tabla, cambios in resultado.items():
+        if cambios["upsert"]:
+            select, columna_id = consultas[tabla]
+            cursor.execute(f"{select} WHERE {columna_id} IN (SELECT value FROM json_each(?))",
+                           (json.dumps(cambios["upsert"]),))
+            cambios["upsert"] = leer_dicts(cursor)
+    return {"desde": desde, "hasta": hasta, "hay_mas": hay_mas, "cambios": resultado}
+
+
+def compactar(conn, retencion_dias=RETENCION_DIAS):
+    """Compacta el registro de cambios y devuelve cuántas entradas borró."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Se borra un prefijo de la secuencia: todo hasta la última entrada vieja
+        corte = conn.execute(
+            "SELECT MAX(seq) FROM cambios WHERE fecha <= datetime('now', ?)",
+            (f"-{retencion_dias} days",),
+        ).fetchone()[0]
+        vencidas = 0
+        if corte is not None:
+            vencidas = conn.execute("DELETE FROM cambios WHERE seq <= ?", (corte,)).rowcount
+            conn.execute("UPDATE cambios_horizonte SET seq = MAX(seq, ?) WHERE id = 1", (corte,))
+        reemplazadas = conn.execute("""
+            DELETE FROM cambios WHERE seq NOT IN (
+                SELECT MAX(seq) FROM cambios GROUP BY tabla, fila_id
+            )
+        """).rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return {"reemplazadas": reemplazadas, "vencidas": vencidas}
@@ -0,0 +1,88 @@
+# ==================== COMPRESIÓN DE RESPUESTAS ====================
+# Middleware ASGI que comprime con gzip las respuestas de la API (JSON,
+# NDJSON, CSV y texto) cuando el cliente lo acepta.
+#
+# A diferencia del GZipMiddleware de Starlette, solo toca tipos de texto:
+# las exportaciones con ?gzip=true (application/gzip) y los archivos
+# estáticos precomprimidos (que ya traen Content-Encoding) pasan intactos.
+# Las respuestas en streaming se comprimen fragmento a fragmento con
+# Z_SYNC_FLUSH, así el cliente sigue recibiendo filas a medida que salen.
+# Un ETag fuerte pasa a débil (W/"..."): el cuerpo comprimido no es idéntico
+# byte a byte, pero If-None-Match sigue coincidiendo con el de la caché.
+
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Debajo de este tamaño la cabecera gzip y el costo de CPU no compensan
+MINIMO_BYTES = 1024
+# 6 es el equilibrio habitual: el 9 cuesta bastante más CPU por pocos bytes
+NIVEL = 6
+TIPOS_COMPRIMIBLES = ("application/json", "application/x-ndjson", "text/")
+# Conexiones largas (GET /eventos): un compresor por cliente costaría cientos
+# de KB de memoria cada uno por eventos de pocos bytes
+TIPOS_EXCLUIDOS = ("text/event-stream",)
+
+
+def acepta_gzip(scope):
+    return "gzip" in Headers(scope=scope).get("accept-encoding", "").lower()
+
+
+def comprimible(headers):
+    tipo = headers.get("content-type", "")
+    return ("content-encoding" not in headers and tipo.startswith(TIPOS_COMPRIMIBLES)
+            and not tipo.startswith(TIPOS_EXCLUIDOS))
+
+
+class MiddlewareCompresion:
+    def __init__(self, app, minimo=MINIMO_BYTES, nivel=NIVEL):
+        self.app = app
+        self.minimo = minimo
+        self.nivel = nivel
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not acepta_gzip(scope):
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        compresor = None
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor
+            if mensaje["type"] == "http.response.start":
+                # Se retiene hasta ver el primer fragmento del cuerpo
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body":
+                await send(mensaje)
+                return
+
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+            if inicio is not None:
+                headers = MutableHeaders(raw=inicio["headers"])
+                if comprimible(headers) and (mas or len(cuerpo) >= self.minimo):
+                    compresor = zlib.compressobj(self.nivel, zlib.DEFLATED, 31)  # wbits=31: gzip
+                    headers["Content-Encoding"] = "gzip"
+                    headers.add_vary_header("Accept-Encoding")
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = "W/" + etag
+                    if not mas:
+                        cuerpo = compresor.compress(cuerpo) + compresor.flush()
+                        headers["Content-Length"] = str(len(cuerpo))
+                        compresor = None
+                        mensaje = {**mensaje, "body": cuerpo}
+                await send(inicio)
+                inicio = None
+
+            if compresor is not None:
+                comprimido = compresor.compress(cuerpo)
+                comprimido += compresor.flush(zlib.Z_SYNC_FLUSH if mas else zlib.Z_FINISH)
+                mensaje = {**mensaje, "body": comprimido}
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
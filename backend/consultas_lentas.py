@@ -0,0 +1,135 @@
+# ==================== CONSULTAS LENTAS ====================
+# Registro de las sentencias que superan un umbral de duración, visible en
+# GET /debug/slow-queries.
+#
+# Las sentencias se agrupan por SQL normalizado (literales reemplazados por
+# "?", espacios colapsados), así una consulta lenta que se repite ocupa una
+# sola entrada con su cantidad, duración total y máxima. La primera vez que
+# aparece se guarda su EXPLAIN QUERY PLAN; las siguientes solo actualizan los
+# números. Los parámetros se guardan redactados: los números se conservan
+# (suelen ser ids) y los textos se reemplazan por su longitud.
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+# Con 0 se registran todas las sentencias (útil en desarrollo)
+UMBRAL_MS = float(os.environ.get("BIBLIOTECA_UMBRAL_CONSULTA_LENTA_MS", 100))
+UMBRAL = UMBRAL_MS / 1000
+# Sentencias distintas que se conservan; al llenarse se descarta la de menor tiempo total
+MAX_CONSULTAS = 200
+
+log = logging.getLogger("biblioteca.consultas_lentas")
+
+PATRON_TEXTO = re.compile(r"'(?:[^']|'')*'")
+PATRON_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+PATRON_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+PATRON_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_sql(sql):
+    sql = PATRON_TEXTO.sub("?", sql)
+    sql = PATRON_NUMERO.sub("?", sql)
+    sql = PATRON_LISTA.sub("(...)", sql)
+    return PATRON_ESPACIOS.sub(" ", sql).strip()
+
+
+def redactar(valor):
+    if valor is None or isinstance(valor, (bool, int, float)):
+        return valor
+    if isinstance(valor, str):
+        return f"<texto de {len(valor)} caracteres>"
+    if isinstance(valor, (bytes, memoryview)):
+        return f"<{len(valor)} bytes>"
+    return f"<{type(valor).__name__}>"
+
+
+def redactar_parametros(parametros):
+    if isinstance(parametros, dict):
+        return {clave: redactar(valor) for clave, valor in parametros.items()}
+    try:
+        return [redactar(valor) for valor in parametros]
+    except TypeError:
+        return redactar(parametros)
+
+
+class RegistroConsultasLentas:
+    def __init__(self, umbral=UMBRAL, max_consultas=MAX_CONSULTAS):
+        self.umbral = umbral
+        self.max_consultas = max_consultas
+        self._consultas = {}
+        self._lock = threading.Lock()
+
+    def plan(self, ruta, sql, parametros):
+        if parametros is None:
+            # executemany: el plan no depende de los valores
+            parametros = [None] * sql.count("?")
+        # database importa este módulo
+        from database import configurar_conexion
+
+        # Conexión propia: la de la petición puede estar en medio de una
+        # transacción o ya devuelta al pool. Es una conexión sqlite3 común,
+        # configurada como las del pool (con el historial adjunto) pero sin
+        # CursorMedido, para que sus propias sentencias no vuelvan a
+        # registrarse aquí.
+        conn = sqlite3.connect(ruta)
+        try:
+            configurar_conexion(conn)
+            return [f"{fila[3]}" for fila in conn.execute("EXPLAIN QUERY PLAN " + sql, parametros)]
+        except sqlite3.Error as e:
+            return [f"(plan no disponible: {e})"]
+        finally:
+            conn.close()
+
+    def registrar(self, ruta, sql, parametros, segundos, filas):
+        clave = normalizar_sql(sql)
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            entrada = self._consultas.get(clave)
+            nueva = entrada is None
+            if nueva:
+                if len(self._consultas) >= self.max_consultas:
+                    menor = min(self._consultas, key=lambda k: self._consultas[k]["total_ms"])
+                    del self._consultas[menor]
+                entrada = self._consultas[clave] = {
+                    "sql": clave,
+                    "cantidad": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "plan": None,
+                }
+            entrada["cantidad"] += 1
+            entrada["total_ms"] = round(entrada["total_ms"] + segundos * 1000, 3)
+            if segundos * 1000 >= entrada["max_ms"]:
+                entrada["max_ms"] = round(segundos * 1000, 3)
+                entrada["parametros"] = None if parametros is None else redactar_parametros(parametros)
+                entrada["filas"] = filas
+            entrada["ultima_vez"] = ahora
+        if nueva:
+            # El EXPLAIN va fuera del lock: no frena el registro de las demás
+            # consultas lentas. Hasta que termine, la entrada tiene plan None.
+            plan = self.plan(ruta, sql, parametros)
+            with self._lock:
+                entrada["plan"] = plan
+            log.warning("Consulta lenta (%.1f ms): %s | plan: %s",
+                        segundos * 1000, clave, "; ".join(plan))
+
+    def listar(self):
+        with self._lock:
+            consultas = [dict(entrada) for entrada in self._consultas.values()]
+        for entrada in consultas:
+            entrada["promedio_ms"] = round(entrada["total_ms"] / entrada["cantidad"], 3)
+        return {
+            "umbral_ms": self.umbral * 1000,
+            "consultas": sorted(consultas, key=lambda e: e["total_ms"], reverse=True),
+        }
+
+    def limpiar(self):
+        with self._lock:
+            self._consultas.clear()
+
+
+consultas_lentas = RegistroConsultasLentas()
@@ -0,0 +1,389 @@
+# ==================== CAPA DE BASE DE DATOS ====================
+# Pool de conexiones SQLite reutilizables y preconfiguradas.
+#
+# Cada conexión se abre una sola vez, se configura con los PRAGMA de
+# rendimiento y luego se presta a una petición por vez. Al llamar a
+# conn.close() la conexión vuelve al pool en lugar de cerrarse, por lo que
+# los endpoints existentes no necesitan cambios.
+
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (se usa un solo worker)
+    fcntl = None
+
+from consultas_lentas import consultas_lentas
+from metricas import observar_consulta, observar_espera_bloqueo
+from migraciones import sql_crear_historial
+
+DB_PATH = os.environ.get("BIBLIOTECA_DB", "biblioteca.db")
+
+# Cantidad máxima de conexiones inactivas que se guardan. Con 0 se desactiva
+# el pool y cada petición abre y cierra su propia conexión (útil para comparar).
+POOL_SIZE = int(os.environ.get("BIBLIOTECA_POOL_SIZE", 16))
+
+# Modo de escritura agrupada: un hilo escritor confirma las escrituras de
+# varias peticiones en una sola transacción (ver EscritorAgrupado).
+ESCRITURA_AGRUPADA = os.environ.get("BIBLIOTECA_ESCRITURA_AGRUPADA", "0") == "1"
+
+# Archivo aparte para el historial de préstamos (ver historial.py). Sin él,
+# la tabla prestamos_historial vive en la base principal.
+HISTORIAL_DB = os.environ.get("BIBLIOTECA_HISTORIAL_DB")
+ESQUEMA_HISTORIAL = "historial" if HISTORIAL_DB else "main"
+
+# Sentencias preparadas que sqlite3 mantiene en caché por conexión
+CACHE_SENTENCIAS = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA cache_size = -65536",  # 64 MiB por conexión
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que mide cada sentencia: tiempo y filas van a las métricas, y
+    las que superan el umbral, al registro de consultas lentas.
+
+    El tiempo de una consulta incluye el de sus fetchone/fetchmany/fetchall
+    y se cierra al agotar las filas, al ejecutar otra sentencia o al liberar
+    el cursor. Las filas leídas iterando el cursor directamente no se cuentan.
+    """
+
+    _sql = None
+
+    def _comenzar(self, sql, parametros):
+        if self._sql is not None:
+            self._terminar()
+        self._sql, self._parametros, self._segundos, self._filas = sql, parametros, 0.0, 0
+
+    def _terminar(self):
+        sql, self._sql = self._sql, None
+        observar_consulta(sql, self._segundos, self._filas)
+        if self._segundos >= consultas_lentas.umbral:
+            consultas_lentas.registrar(self.connection.ruta, sql, self._parametros,
+                                       self._segundos, self._filas)
+
+    def _ejecutar(self, metodo, sql, parametros):
+        self._comenzar(sql, parametros if metodo is sqlite3.Cursor.execute else None)
+        inicio = time.perf_counter()
+        try:
+            return metodo(self, sql, parametros)
+        finally:
+            self._segundos += time.perf_counter() - inicio
+            if self.description is None:
+                self._terminar()
+
+    def execute(self, sql, parametros=()):
+        return self._ejecutar(sqlite3.Cursor.execute, sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self._ejecutar(sqlite3.Cursor.executemany, sql, secuencia)
+
+    def _leido(self, inicio, filas, agotado):
+        if self._sql is not None:
+            self._segundos += time.perf_counter() - inicio
+            self._filas += filas
+            if agotado:
+                self._terminar()
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        self._leido(inicio, fila is not None, fila is None)
+        return fila
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        inicio = time.perf_counter()
+        filas = super().fetchmany(size)
+        self._leido(inicio, len(filas), len(filas) < size)
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = super().fetchall()
+        self._leido(inicio, len(filas), True)
+        return filas
+
+    def __del__(self):
+        if self._sql is not None:
+            self._terminar()
+
+
+class ConexionPool(sqlite3.Connection):
+    """Conexión que al cerrarse vuelve a su pool.
+
+    Sus cursores (también los de conn.execute) son CursorMedido.
+    """
+
+    pool = None
+    ruta = None
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or CursorMedido)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.devolver(self)
+
+    def cerrar_definitivamente(self):
+        self.pool = None
+        super().close()
+
+
+def configurar_conexion(conn):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if HISTORIAL_DB:
+        conn.execute("ATTACH DATABASE ? AS historial", (HISTORIAL_DB,))
+        conn.execute("PRAGMA historial.journal_mode = WAL")
+        for sentencia in sql_crear_historial(ESQUEMA_HISTORIAL):
+            conn.execute(sentencia)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def conectar(ruta=None):
+    """Abre una conexión nueva fuera del pool, ya configurada."""
+    conn = sqlite3.connect(
+        ruta or DB_PATH,
+        cached_statements=CACHE_SENTENCIAS,
+        check_same_thread=False,
+        factory=ConexionPool,
+    )
+    conn.ruta = ruta or DB_PATH
+    return configurar_conexion(conn)
+
+
+class PoolConexiones:
+    def __init__(self, ruta, tamano):
+        self.ruta = ruta
+        self.tamano = tamano
+        self._libres = queue.LifoQueue(maxsize=max(tamano, 1))
+
+    def obtener(self):
+        try:
+            conn = self._libres.get_nowait()
+        except queue.Empty:
+            conn = conectar(self.ruta)
+            conn.pool = self if self.tamano > 0 else None
+        return conn
+
+    def devolver(self, conn):
+        # Una petición que falló a mitad de camino no debe dejar su
+        # transacción abierta para la siguiente.
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._libres.put_nowait(conn)
+        except queue.Full:
+            conn.cerrar_definitivamente()
+
+    def cerrar(self):
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            conn.cerrar_definitivamente()
+
+
+pool = PoolConexiones(DB_PATH, POOL_SIZE)
+
+
+def get_db():
+    return pool.obtener()
+
+
+@contextmanager
+def bloqueo_inicializacion(ruta=None):
+    """Bloqueo exclusivo entre procesos sobre un archivo junto a la base.
+
+    Con varios workers cada proceso importa main.py; el bloqueo hace que las
+    migraciones y los datos de ejemplo los aplique uno solo y que el resto
+    espere y encuentre la base ya inicializada.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open((ruta or DB_PATH) + ".lock", "w") as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+# ==================== TRANSACCIONES DE LECTURA ====================
+
+@contextmanager
+def transaccion_lectura(conn):
+    """Varias consultas sobre una misma instantánea de la base.
+
+    En modo WAL una transacción de lectura no bloquea a los escritores: ve la
+    base tal como estaba en su primera lectura aunque otros confirmen cambios
+    mientras tanto.
+    """
+    conn.execute("BEGIN")
+    try:
+        yield conn.cursor()
+    finally:
+        conn.rollback()
+
+
+# ==================== TRANSACCIONES DE ESCRITURA ====================
+
+REINTENTOS_OCUPADO = 5
+
+
+def base_ocupada(error):
+    codigo = getattr(error, "sqlite_errorcode", None)
+    if codigo is not None:
+        return codigo & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+
+def transaccion_escritura(conn, operacion, intentos=REINTENTOS_OCUPADO):
+    """Ejecuta `operacion(cursor)` en una transacción corta BEGIN IMMEDIATE.
+
+    El bloqueo de escritura se toma al comenzar, así la transacción no puede
+    fallar a mitad de camino al pasar de lectura a escritura. Si la base
+    sigue ocupada después de busy_timeout se reintenta con backoff
+    exponencial y jitter. Cualquier excepción de `operacion` (incluida una
+    HTTPException) deshace la transacción y se propaga.
+    """
+    inicio = time.perf_counter()
+    for intento in range(intentos):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Incluye busy_timeout y los reintentos anteriores
+            observar_espera_bloqueo(time.perf_counter() - inicio)
+            resultado = operacion(conn.cursor())
+            conn.commit()
+            return resultado
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not base_ocupada(e) or intento == intentos - 1:
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** intento))
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+# ==================== ESCRITURA AGRUPADA ====================
+
+class EscritorAgrupado:
+    """Hilo dueño de la única conexión de escritura (group commit).
+
+    Las peticiones encolan su operación y esperan un Future. El hilo toma
+    hasta `max_lote` operaciones, o las que lleguen en `espera_max` segundos
+    desde la primera, y las ejecuta en una sola transacción. Cada operación
+    corre dentro de un SAVEPOINT: si falla (por ejemplo, un email duplicado)
+    solo se deshace la suya y su Future recibe la excepción, mientras el
+    resto del grupo se confirma normalmente.
+    """
+
+    def __init__(self, ruta, max_lote=64, espera_max=0.002):
+        self.ruta = ruta
+        self.max_lote = max_lote
+        self.espera_max = espera_max
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="escritor", daemon=True)
+                self._hilo.start()
+
+    def enviar(self, operacion):
+        if self._hilo is None:
+            self._iniciar()
+        futuro = Future()
+        self._cola.put((operacion, futuro))
+        return futuro
+
+    def ejecutar(self, operacion):
+        return self.enviar(operacion).result()
+
+    def _tomar_lote(self):
+        lote = [self._cola.get()]
+        limite = time.perf_counter() + self.espera_max
+        while len(lote) < self.max_lote:
+            restante = limite - time.perf_counter()
+            try:
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        conn = conectar(self.ruta)
+        while True:
+            lote = self._tomar_lote()
+            try:
+                resultados = transaccion_escritura(conn, lambda cursor: self._ejecutar_lote(cursor, lote))
+            except BaseException as e:
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+                continue
+            for (_, futuro), (resultado, error) in zip(lote, resultados):
+                if error is None:
+                    futuro.set_result(resultado)
+                else:
+                    futuro.set_exception(error)
+
+    @staticmethod
+    def _ejecutar_lote(cursor, lote):
+        resultados = []
+        for operacion, _ in lote:
+            cursor.execute("SAVEPOINT operacion")
+            try:
+                resultados.append((operacion(cursor), None))
+            except Exception as e:
+                cursor.execute("ROLLBACK TO operacion")
+                resultados.append((None, e))
+            cursor.execute("RELEASE operacion")
+        return resultados
+
+
+escritor = EscritorAgrupado(DB_PATH)
+
+
+def ejecutar_escritura(operacion):
+    """Ejecuta `operacion(cursor)` como escritura y devuelve su resultado.
+
+    Con BIBLIOTECA_ESCRITURA_AGRUPADA=1 la operación se envía al hilo
+    escritor; si no, corre en su propia transacción con una conexión del pool.
+    """
+    if ESCRITURA_AGRUPADA:
+        return escritor.ejecutar(operacion)
+    conn = get_db()
+    try:
+        return transaccion_escritura(conn, operacion)
+    finally:
+        conn.close()
@@ -0,0 +1,150 @@
+# ==================== FRONTEND ESTÁTICO ====================
+# Entrega del frontend (index.html, app.js, styles.css) ya comprimido y con
+# nombres versionados.
+#
+# construir() copia los archivos de frontend/ a frontend/dist/: app.js y
+# styles.css con el hash de su contenido en el nombre (app.3f9c2a1b0d.js),
+# index.html reescrito para apuntar a esos nombres, y de cada archivo una
+# versión .gz y, si está instalado el paquete brotli, una .br. Se ejecuta al
+# arrancar y solo rehace lo que cambió.
+#
+# ArchivosEstaticos elige la variante según Accept-Encoding. Los archivos con
+# hash se sirven con Cache-Control inmutable por un año: un cambio en el
+# contenido cambia el nombre. index.html y los nombres sin hash se revalidan
+# en cada carga (no-cache) usando el ETag de StaticFiles.
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional: sin ella solo se genera .gz
+    brotli = None
+
+VERSIONADOS = ("app.js", "styles.css")
+PAGINA = "index.html"
+PREFIJO = "/static/"
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+
+# nombre.<10 hex>.ext
+PATRON_VERSIONADO = re.compile(r"^[\w-]+\.[0-9a-f]{10}\.\w+$")
+# (codificación, extensión) en orden de preferencia
+CODIFICACIONES = (("br", ".br"), ("gzip", ".gz"))
+
+
+def nombre_versionado(nombre, contenido):
+    base, extension = os.path.splitext(nombre)
+    return f"{base}.{hashlib.sha256(contenido).hexdigest()[:10]}{extension}"
+
+
+def escribir(destino, nombre, contenido):
+    """Escribe el archivo y sus variantes comprimidas si el contenido cambió."""
+    ruta = os.path.join(destino, nombre)
+    try:
+        with open(ruta, "rb") as archivo:
+            if archivo.read() == contenido:
+                return
+    except FileNotFoundError:
+        pass
+    # mtime=0: el .gz no cambia si el contenido no cambia
+    variantes = [(ruta + ".gz", gzip.compress(contenido, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variantes.append((ruta + ".br", brotli.compress(contenido, quality=11)))
+    # El original al final: si el proceso se corta, la próxima vez se rehace todo
+    for camino, datos in variantes + [(ruta, contenido)]:
+        temporal = camino + ".tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(datos)
+        os.replace(temporal, camino)
+
+
+def construir(origen, destino):
+    """Genera destino/ a partir de origen/ y devuelve {nombre: nombre versionado}."""
+    os.makedirs(destino, exist_ok=True)
+    manifiesto = {}
+    for nombre in VERSIONADOS:
+        with open(os.path.join(origen, nombre), "rb") as archivo:
+            contenido = archivo.read()
+        manifiesto[nombre] = nombre_versionado(nombre, contenido)
+        escribir(destino, manifiesto[nombre], contenido)
+        # Se conserva también el nombre original para enlaces existentes
+        escribir(destino, nombre, contenido)
+
+    with open(os.path.join(origen, PAGINA), encoding="utf-8") as archivo:
+        pagina = archivo.read()
+    for nombre, versionado in manifiesto.items():
+        pagina = re.sub(rf'(href|src)="(?:\./|{PREFIJO})?{re.escape(nombre)}"',
+                        rf'\1="{PREFIJO}{versionado}"', pagina)
+    escribir(destino, PAGINA, pagina.encode("utf-8"))
+
+    # Versiones anteriores que ya no referencia index.html
+    vigentes = set(manifiesto.values())
+    for nombre in os.listdir(destino):
+        base = nombre.removesuffix(".gz").removesuffix(".br")
+        if PATRON_VERSIONADO.match(base) and base not in vigentes:
+            os.remove(os.path.join(destino, nombre))
+    return manifiesto
+
+
+def codificaciones_aceptadas(scope):
+    aceptadas = set()
+    for parte in Headers(scope=scope).get("accept-encoding", "").split(","):
+        codificacion, *parametros = [p.strip() for p in parte.split(";")]
+        calidad = 1.0
+        for parametro in parametros:
+            if parametro.startswith("q="):
+                try:
+                    calidad = float(parametro[2:])
+                except ValueError:
+                    calidad = 0.0
+        if codificacion and calidad > 0:
+            aceptadas.add(codificacion.lower())
+    return aceptadas
+
+
+class ArchivosEstaticos(StaticFiles):
+    """StaticFiles que sirve la variante .br/.gz precomprimida si el cliente la acepta."""
+
+    async def get_response(self, path, scope):
+        aceptadas = codificaciones_aceptadas(scope)
+        respuesta = None
+        for codificacion, extension in CODIFICACIONES:
+            if codificacion in aceptadas:
+                try:
+                    respuesta = await super().get_response(path + extension, scope)
+                except HTTPException:
+                    continue
+                respuesta.headers["Content-Encoding"] = codificacion
+                respuesta.headers["Content-Type"] = self.tipo(path)
+                break
+        if respuesta is None:
+            respuesta = await super().get_response(path, scope)
+        respuesta.headers["Vary"] = "Accept-Encoding"
+        inmutable = PATRON_VERSIONADO.match(os.path.basename(path))
+        respuesta.headers["Cache-Control"] = CACHE_INMUTABLE if inmutable else CACHE_REVALIDAR
+        return respuesta
+
+    @staticmethod
+    def tipo(path):
+        tipo = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return tipo + "; charset=utf-8" if tipo.startswith("text/") else tipo
+
+
+if __name__ == "__main__":
+    frontend = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend")
+    dist = os.path.join(frontend, "dist")
+    for nombre in [PAGINA, *construir(frontend, dist).values()]:
+        tamanos = [f"{nombre:<28}{os.path.getsize(os.path.join(dist, nombre)):>10,} B"]
+        for codificacion, extension in CODIFICACIONES:
+            ruta = os.path.join(dist, nombre + extension)
+            if os.path.exists(ruta):
+                tamanos.append(f"{codificacion}: {os.path.getsize(ruta):,} B")
+        print("   ".join(tamanos))
@@ -0,0 +1,213 @@
+# ==================== EVENTOS EN VIVO (SSE) ====================
+# GET /eventos: Server-Sent Events con los cambios de disponibilidad,
+# préstamos, devoluciones y reseñas, para que las terminales no tengan que
+# recargar ni consultar periódicamente.
+#
+# La fuente es el registro de cambios (tabla cambios, ver cambios.py). Una
+# sola tarea asyncio por proceso lo lee cada INTERVALO segundos, mientras
+# haya al menos un cliente conectado, y reparte cada evento a las colas de
+# los suscriptores. Así llegan también los cambios hechos por otro worker,
+# por una importación masiva o desde la línea de comandos, y el costo en la
+# base no depende de cuántos clientes haya.
+#
+# Cada cliente tiene una cola acotada (MAX_PENDIENTES). Si se llena porque
+# el cliente no lee a tiempo, se lo desconecta en lugar de acumular memoria
+# o frenar al resto. Al reconectar, EventSource envía Last-Event-ID (el seq
+# del último evento recibido) y se le reenvía lo que se perdió.
+#
+# Un cliente inactivo es solo una cola y una corrutina esperando: el ping
+# periódico lo envía la misma tarea que lee el registro, sin un temporizador
+# por conexión.
+
+import asyncio
+import json
+import logging
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from cambios import horizonte, ultimo_seq
+from database import get_db, transaccion_lectura
+from serializacion import leer_dicts
+
+INTERVALO = 0.25
+MAX_PENDIENTES = 256
+# Comentario SSE para que proxies y balanceadores no cierren conexiones inactivas
+INTERVALO_PING = 15
+# Entradas del registro que se leen por vuelta
+LOTE = 1000
+
+log = logging.getLogger("biblioteca.eventos")
+
+# Columnas que necesita cada tipo de evento, para las filas modificadas
+CONSULTAS_EVENTOS = {
+    "libros": "SELECT id, disponible FROM libros",
+    "prestamos": """SELECT id, libro_id, usuario_id, devuelto, fecha_prestamo,
+                           fecha_devolucion_esperada, fecha_devolucion_real FROM prestamos""",
+    "resenas": "SELECT id, libro_id, usuario_id, calificacion FROM resenas",
+}
+
+DESCARTADO = object()
+
+
+def evento_de(tabla, operacion, fila_id, fila):
+    """(tipo, datos) del evento de una entrada del registro, o None."""
+    if tabla == "libros" and fila is not None:
+        return "disponibilidad", {"libro_id": fila_id, "disponible": bool(fila["disponible"])}
+    if tabla == "prestamos":
+        if operacion == "delete":
+            return "prestamo_eliminado", {"id": fila_id}
+        if fila is not None:
+            return ("devolucion" if fila["devuelto"] else "prestamo"), fila
+    if tabla == "resenas" and operacion == "upsert" and fila is not None:
+        return "resena", fila
+    return None
+
+
+def leer_eventos(desde, limite=LOTE):
+    """Eventos posteriores a `desde`, como (eventos, hasta, hay_mas).
+
+    Cada evento es (seq, tipo, datos). Si `desde` quedó antes del horizonte
+    de compactación se devuelve un único evento "resincronizar".
+    """
+    conn = get_db()
+    try:
+        with transaccion_lectura(conn) as cursor:
+            ultimo = ultimo_seq(cursor)
+            if desde is None:
+                return [], ultimo, False
+            if desde < horizonte(cursor) or desde > ultimo:
+                return [(ultimo, "resincronizar", {})], ultimo, False
+
+            cursor.row_factory = None
+            entradas = cursor.execute("""
+                SELECT seq, tabla, fila_id, operacion FROM cambios
+                WHERE seq > ? AND tabla IN ('libros', 'prestamos', 'resenas')
+                ORDER BY seq LIMIT ?
+            """, (desde, limite)).fetchall()
+            hay_mas = len(entradas) == limite
+            hasta = entradas[-1][0] if hay_mas else ultimo
+
+            # Última entrada de cada fila; el evento lleva el seq de esa entrada
+            ultimas = {}
+            for seq, tabla, fila_id, operacion in entradas:
+                ultimas[(tabla, fila_id)] = (seq, operacion)
+
+            filas = {}
+            for tabla, select in CONSULTAS_EVENTOS.items():
+                ids = [fila_id for (t, fila_id), (_, op) in ultimas.items() if t == tabla and op == "upsert"]
+                if ids:
+                    cursor.execute(f"{select} WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+                    filas.update(((tabla, fila["id"]), fila) for fila in leer_dicts(cursor))
+    finally:
+        conn.close()
+
+    eventos = []
+    for (tabla, fila_id), (seq, operacion) in ultimas.items():
+        evento = evento_de(tabla, operacion, fila_id, filas.get((tabla, fila_id)))
+        if evento is not None:
+            eventos.append((seq, *evento))
+    eventos.sort(key=lambda evento: evento[0])
+    return eventos, hasta, hay_mas
+
+
+def formatear(seq, tipo, datos):
+    return f"id: {seq}\nevent: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+class Suscriptor:
+    def __init__(self, max_pendientes, desde):
+        self.cola = asyncio.Queue(maxsize=max_pendientes)
+        # Los eventos de la cola son todos posteriores a este seq
+        self.desde = desde
+
+
+class Difusor:
+    def __init__(self, leer=leer_eventos, intervalo=INTERVALO, max_pendientes=MAX_PENDIENTES):
+        self.leer = leer
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self.suscriptores = set()
+        self.seq = None
+        self.descartados = 0
+        self._tarea = None
+
+    async def suscribir(self):
+        # Sin suscriptores nadie mantiene seq al día: lo que pasó mientras
+        # tanto no es de este cliente (para eso envía Last-Event-ID)
+        if self.seq is None or not self.suscriptores:
+            _, self.seq, _ = await run_in_threadpool(self.leer, None)
+        suscriptor = Suscriptor(self.max_pendientes, self.seq)
+        self.suscriptores.add(suscriptor)
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._sondear())
+        return suscriptor
+
+    def desuscribir(self, suscriptor):
+        self.suscriptores.discard(suscriptor)
+
+    def publicar(self, evento):
+        for suscriptor in list(self.suscriptores):
+            try:
+                suscriptor.cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                self.descartar(suscriptor)
+
+    def descartar(self, suscriptor):
+        # Se vacía la cola para dejar lugar a la marca que cierra su flujo
+        self.suscriptores.discard(suscriptor)
+        self.descartados += 1
+        while not suscriptor.cola.empty():
+            suscriptor.cola.get_nowait()
+        suscriptor.cola.put_nowait(DESCARTADO)
+        log.warning("Cliente de /eventos descartado por no leer a tiempo")
+
+    async def _sondear(self):
+        ultimo_ping = time.monotonic()
+        while self.suscriptores:
+            await asyncio.sleep(self.intervalo)
+            try:
+                hay_mas = True
+                while hay_mas and self.suscriptores:
+                    desde = self.seq
+                    eventos, hasta, hay_mas = await run_in_threadpool(self.leer, desde)
+                    if self.seq != desde:
+                        # Un suscriptor nuevo volvió a leer seq mientras tanto
+                        hay_mas = True
+                        continue
+                    # Sin await entre actualizar seq y repartir: un suscriptor
+                    # nuevo ve un seq coherente con lo que ya está en las colas
+                    self.seq = hasta
+                    for evento in eventos:
+                        self.publicar(evento)
+            except Exception:
+                log.exception("Error al leer el registro de cambios para /eventos")
+            if time.monotonic() - ultimo_ping >= INTERVALO_PING:
+                ultimo_ping = time.monotonic()
+                self.publicar(None)
+
+    async def flujo(self, ultimo_id=None):
+        """Generador del cuerpo SSE de un cliente."""
+        suscriptor = await self.suscribir()
+        try:
+            yield "retry: 3000\n\n"
+            # Lo que el cliente se perdió mientras estaba desconectado
+            desde = ultimo_id
+            while desde is not None and desde < suscriptor.desde:
+                eventos, desde, hay_mas = await run_in_threadpool(self.leer, desde)
+                for seq, tipo, datos in eventos:
+                    # Lo posterior ya está en la cola
+                    if seq <= suscriptor.desde or tipo == "resincronizar":
+                        yield formatear(seq, tipo, datos)
+                if not hay_mas:
+                    break
+            while True:
+                evento = await suscriptor.cola.get()
+                if evento is DESCARTADO:
+                    return
+                yield ": ping\n\n" if evento is None else formatear(*evento)
+        finally:
+            self.desuscribir(suscriptor)
+
+
+difusor = Difusor()
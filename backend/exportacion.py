@@ -0,0 +1,97 @@
+# ==================== EXPORTACIÓN ====================
+# Exportación en streaming de préstamos y reseñas a CSV o NDJSON.
+#
+# Las filas se leen del cursor en bloques con fetchmany y se envían a medida
+# que se serializan, así la memoria usada no depende de cuántas filas tenga
+# el historial. Con ?gzip=true la salida se comprime también en streaming y
+# se descarga como archivo .gz.
+
+import csv
+import io
+import zlib
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from database import get_db
+from serializacion import a_json
+
+TAMANO_BLOQUE = 1000
+
+TIPOS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def bloques_csv(cursor):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([columna[0] for columna in cursor.description])
+    while True:
+        filas = cursor.fetchmany(TAMANO_BLOQUE)
+        if not filas:
+            break
+        escritor.writerows(filas)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def bloques_ndjson(cursor):
+    columnas = [columna[0] for columna in cursor.description]
+    while True:
+        filas = cursor.fetchmany(TAMANO_BLOQUE)
+        if not filas:
+            break
+        yield b"".join(a_json(dict(zip(columnas, fila))) + b"\n" for fila in filas)
+
+
+def comprimir(bloques):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for bloque in bloques:
+        comprimido = compresor.compress(bloque)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def exportar(sql, params, formato, nombre, gzip=False):
+    if formato not in TIPOS:
+        raise HTTPException(status_code=400, detail="Formato no soportado (csv o ndjson)")
+
+    def generar():
+        conn = get_db()
+        try:
+            cursor = conn.cursor()
+            # Filas como tuplas: se evita crear un sqlite3.Row por fila
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            bloques = bloques_csv(cursor) if formato == "csv" else bloques_ndjson(cursor)
+            yield from comprimir(bloques) if gzip else bloques
+        finally:
+            conn.close()
+
+    archivo = f"{nombre}.{formato}"
+    tipo = TIPOS[formato]
+    if gzip:
+        archivo += ".gz"
+        tipo = "application/gzip"
+    return StreamingResponse(
+        generar(), media_type=tipo,
+        headers={"Content-Disposition": f'attachment; filename="{archivo}"'},
+    )
+
+
+def rango_fechas(columna, desde, hasta):
+    condiciones, params = [], []
+    if desde:
+        condiciones.append(f"{columna} >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append(f"{columna} <= ?")
+        params.append(hasta)
+    where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+    return where, params
@@ -0,0 +1,210 @@
+# ==================== GENERADOR DE DATOS ====================
+# Llena una base con datos sintéticos a escala de producción para medir la
+# API con volúmenes reales.
+#
+# Uso:
+#   python generar_datos.py --db grande.db --libros 1000000 --usuarios 200000 \
+#       --prestamos 5000000 --resenas 2000000
+#
+# La popularidad sigue una distribución de Zipf: pocos libros y usuarios
+# concentran la mayoría de los préstamos y reseñas, como en una biblioteca
+# real. Las inserciones se hacen con executemany en lotes grandes; los
+# triggers (FTS5, estadísticas) siguen activos, así la base queda coherente.
+
+import argparse
+import itertools
+import random
+import time
+from datetime import date, timedelta
+
+import cambios
+import recomendaciones
+from database import conectar
+from migraciones import aplicar_migraciones
+
+TAMANO_LOTE = 50_000
+# Exponente de Zipf: cuanto mayor, más concentrada la popularidad
+SESGO = 0.9
+
+NOMBRES = ["María", "Juan", "Ana", "Carlos", "Laura", "Pedro", "Sofía", "Diego",
+           "Valentina", "Mateo", "Camila", "Lucas", "Martina", "Santiago", "Lucía",
+           "Benjamín", "Julieta", "Tomás", "Florencia", "Joaquín"]
+APELLIDOS = ["González", "Pérez", "Martínez", "López", "Fernández", "Sánchez",
+             "Torres", "Ramírez", "Ruiz", "Silva", "Morales", "Herrera", "Díaz",
+             "Romero", "Álvarez", "Suárez", "Castro", "Giménez", "Rojas", "Acosta"]
+PAISES = ["Argentino", "Chilena", "Mexicano", "Colombiana", "Peruano", "Español",
+          "Uruguaya", "Británico", "Estadounidense", "Francesa"]
+PALABRAS = ["sombra", "río", "ciudad", "memoria", "viento", "noche", "jardín",
+            "espejo", "laberinto", "silencio", "fuego", "mar", "tiempo", "casa",
+            "camino", "luz", "invierno", "sueño", "tierra", "voces", "cólera",
+            "soledad", "ángel", "isla", "puerta", "guerra", "amor", "reloj"]
+CALLES = ["San Martín", "Belgrano", "Rivadavia", "Mitre", "Sarmiento", "Moreno",
+          "Córdoba", "Salta", "Junín", "Laprida"]
+
+
+def pesos_zipf(cantidad):
+    """Pesos acumulados de Zipf para usar con random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(1 / (rango ** SESGO) for rango in range(1, cantidad + 1)))
+
+
+def elegir_sesgado(ids, pesos_acumulados, k):
+    return random.choices(ids, cum_weights=pesos_acumulados, k=k)
+
+
+def fecha_aleatoria(desde, dias):
+    return desde + timedelta(days=random.randrange(dias))
+
+
+def insertar_en_lotes(conn, sql, filas, total, etiqueta):
+    inicio = time.perf_counter()
+    insertadas = 0
+    while True:
+        lote = list(itertools.islice(filas, TAMANO_LOTE))
+        if not lote:
+            break
+        conn.executemany(sql, lote)
+        conn.commit()
+        insertadas += len(lote)
+        print(f"\r  {etiqueta}: {insertadas:,}/{total:,}", end="", flush=True)
+    segundos = time.perf_counter() - inicio
+    print(f"\r  {etiqueta}: {insertadas:,} en {segundos:.1f} s ({insertadas / max(segundos, 1e-9):,.0f}/s)")
+
+
+def ids_de(conn, tabla):
+    return [fila[0] for fila in conn.execute(f"SELECT id FROM {tabla} ORDER BY id")]
+
+
+def generar(conn, args):
+    hoy = date.today()
+    primer_id_libro = conn.execute("SELECT COALESCE(MAX(id), 0) FROM libros").fetchone()[0] + 1
+    primer_id_usuario = conn.execute("SELECT COALESCE(MAX(id), 0) FROM usuarios").fetchone()[0] + 1
+
+    print("Generando categorías, autores, libros y usuarios...")
+    existentes = conn.execute("SELECT COUNT(*) FROM categorias").fetchone()[0]
+    faltantes = max(args.categorias - existentes, 0)
+    insertar_en_lotes(conn,
+        "INSERT INTO categorias (nombre, descripcion) VALUES (?, ?)",
+        ((f"Categoría {existentes + i + 1}", "Categoría generada") for i in range(faltantes)),
+        faltantes, "categorías")
+    insertar_en_lotes(conn,
+        "INSERT INTO autores (nombre, nacionalidad, fecha_nacimiento, biografia) VALUES (?, ?, ?, ?)",
+        ((f"{random.choice(NOMBRES)} {random.choice(APELLIDOS)} {i}", random.choice(PAISES),
+          fecha_aleatoria(date(1850, 1, 1), 150 * 365).isoformat(), None)
+         for i in range(args.autores)),
+        args.autores, "autores")
+
+    autores = ids_de(conn, "autores")
+    categorias = ids_de(conn, "categorias")
+    pesos_autores = pesos_zipf(len(autores))
+    insertar_en_lotes(conn,
+        "INSERT INTO libros (titulo, autor_id, categoria_id, isbn, año_publicacion, paginas, disponible) VALUES (?, ?, ?, ?, ?, ?, 1)",
+        ((" ".join(random.sample(PALABRAS, random.randint(2, 4))).capitalize(),
+          elegir_sesgado(autores, pesos_autores, 1)[0], random.choice(categorias),
+          f"979-{primer_id_libro + i:010d}", random.randint(1900, hoy.year), random.randint(60, 1200))
+         for i in range(args.libros)),
+        args.libros, "libros")
+
+    insertar_en_lotes(conn,
+        "INSERT INTO usuarios (nombre, email, telefono, direccion, fecha_registro) VALUES (?, ?, ?, ?, ?)",
+        ((f"{random.choice(NOMBRES)} {random.choice(APELLIDOS)}", f"usuario{primer_id_usuario + i}@ejemplo.com",
+          f"+54 381 {random.randint(4000000, 4999999)}", f"{random.choice(CALLES)} {random.randint(1, 3000)}",
+          fecha_aleatoria(hoy - timedelta(days=10 * 365), 10 * 365).isoformat())
+         for i in range(args.usuarios)),
+        args.usuarios, "usuarios")
+
+    libros = ids_de(conn, "libros")
+    usuarios = ids_de(conn, "usuarios")
+    # El orden de popularidad no coincide con el de los ids
+    random.shuffle(libros)
+    random.shuffle(usuarios)
+    pesos_libros = pesos_zipf(len(libros))
+    pesos_usuarios = pesos_zipf(len(usuarios))
+    ocupados = set(fila[0] for fila in conn.execute("SELECT libro_id FROM prestamos WHERE devuelto = 0"))
+
+    def prestamos():
+        restantes = args.prestamos
+        while restantes:
+            k = min(restantes, TAMANO_LOTE)
+            for libro_id, usuario_id in zip(elegir_sesgado(libros, pesos_libros, k),
+                                            elegir_sesgado(usuarios, pesos_usuarios, k)):
+                inicio = fecha_aleatoria(hoy - timedelta(days=args.anios * 365), args.anios * 365)
+                esperada = inicio + timedelta(days=14)
+                # Los préstamos recientes pueden seguir activos, uno por libro
+                activo = (hoy - inicio).days < 30 and random.random() < 0.5 and libro_id not in ocupados
+                if activo:
+                    ocupados.add(libro_id)
+                    yield (libro_id, usuario_id, inicio.isoformat(), esperada.isoformat(), None, 0)
+                else:
+                    devolucion = inicio + timedelta(days=random.randint(1, 30))
+                    yield (libro_id, usuario_id, inicio.isoformat(), esperada.isoformat(),
+                           min(devolucion, hoy).isoformat(), 1)
+            restantes -= k
+
+    print("Generando préstamos y reseñas...")
+    insertar_en_lotes(conn,
+        "INSERT INTO prestamos (libro_id, usuario_id, fecha_prestamo, fecha_devolucion_esperada, fecha_devolucion_real, devuelto) VALUES (?, ?, ?, ?, ?, ?)",
+        prestamos(), args.prestamos, "préstamos")
+    conn.execute("""
+        UPDATE libros SET disponible = 0
+        WHERE id IN (SELECT libro_id FROM prestamos WHERE devuelto = 0)
+    """)
+    conn.commit()
+
+    def resenas():
+        restantes = args.resenas
+        while restantes:
+            k = min(restantes, TAMANO_LOTE)
+            for libro_id, usuario_id, calificacion in zip(
+                    elegir_sesgado(libros, pesos_libros, k),
+                    elegir_sesgado(usuarios, pesos_usuarios, k),
+                    random.choices([1, 2, 3, 4, 5], weights=[5, 7, 18, 35, 35], k=k)):
+                yield (libro_id, usuario_id, calificacion,
+                       f"Reseña de {random.choice(PALABRAS)} y {random.choice(PALABRAS)}.",
+                       fecha_aleatoria(hoy - timedelta(days=args.anios * 365), args.anios * 365).isoformat())
+            restantes -= k
+
+    insertar_en_lotes(conn,
+        "INSERT INTO resenas (libro_id, usuario_id, calificacion, comentario, fecha) VALUES (?, ?, ?, ?, ?)",
+        resenas(), args.resenas, "reseñas")
+
+    # La carga no pasa por POST /prestamos: se calcula todo de una vez
+    print("Calculando recomendaciones...")
+    recomendaciones.reconstruir(conn)
+
+    # La carga masiva no es un cambio a sincronizar: los clientes vuelven a cargar todo
+    print("Descartando el registro de cambios de la carga...")
+    cambios.compactar(conn, retencion_dias=0)
+
+    print("Actualizando estadísticas del planificador (ANALYZE)...")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos para la biblioteca")
+    parser.add_argument("--db", help="base a llenar (por defecto BIBLIOTECA_DB)")
+    parser.add_argument("--libros", type=int, default=100_000)
+    parser.add_argument("--categorias", type=int, default=12, help="mínimo de categorías")
+    parser.add_argument("--autores", type=int, default=20_000)
+    parser.add_argument("--usuarios", type=int, default=20_000)
+    parser.add_argument("--prestamos", type=int, default=500_000)
+    parser.add_argument("--resenas", type=int, default=200_000)
+    parser.add_argument("--anios", type=int, default=5, help="antigüedad del historial")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    random.seed(args.semilla)
+    conn = conectar(args.db)
+    try:
+        aplicar_migraciones(conn)
+        # Solo durante la carga: un corte de energía puede perder el último lote
+        conn.execute("PRAGMA synchronous = OFF")
+        inicio = time.perf_counter()
+        generar(conn, args)
+        print(f"Listo en {time.perf_counter() - inicio:.1f} s")
+    finally:
+        conn.cerrar_definitivamente()
+
+
+if __name__ == "__main__":
+    main()
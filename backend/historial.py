@@ -0,0 +1,109 @@
+# ==================== HISTORIAL DE PRÉSTAMOS ====================
+# Los préstamos devueltos hace tiempo casi no se consultan, pero sin archivar
+# son la mayor parte de la tabla prestamos y de sus índices. archivar()
+# los mueve a prestamos_historial (mismas columnas y mismo id), así la tabla
+# caliente que tocan los préstamos, devoluciones y listados queda con los
+# activos y los devueltos recientes, y entra entera en la caché de páginas.
+#
+# Se mueve por lotes en orden de id. Los ids de cada lote se buscan fuera de
+# la transacción de escritura (en WAL leer no bloquea a nadie) y después se
+# copian y borran en una transacción corta. Después de cada lote se espera
+# otro tanto de lo que duró (PAUSA_ARCHIVO), así el archivado ocupa a lo
+# sumo la mitad del tiempo de escritura y un préstamo espera, en el peor
+# caso, un lote. Casi todo el costo es el commit: cada fila borrada ensucia
+# una página distinta en cada uno de los cuatro índices no parciales.
+#
+# Con BIBLIOTECA_HISTORIAL_DB el historial vive en otro archivo, adjuntado a
+# cada conexión como "historial" (ver database.configurar_conexion). SQLite
+# no confirma atómicamente dos archivos en modo WAL: la copia se confirma
+# primero y el borrado después, así un corte entre ambas deja el préstamo
+# repetido (y la próxima corrida lo vuelve a mover) en lugar de perderlo.
+#
+# Archivar no cambia los datos, solo dónde están: las entradas de borrado
+# que los triggers escriben en el registro de cambios se descartan en la
+# misma transacción, y ni /cambios ni /eventos anuncian miles de bajas.
+
+import json
+import time
+from datetime import date, timedelta
+
+from cambios import ultimo_seq
+from database import ESQUEMA_HISTORIAL, HISTORIAL_DB, transaccion_escritura
+
+DIAS_ARCHIVO = 180
+LOTE_ARCHIVO = 25
+# Pausa entre lotes, en proporción a lo que duró el último
+PAUSA_ARCHIVO = 1.0
+
+TABLA_HISTORIAL = f"{ESQUEMA_HISTORIAL}.prestamos_historial"
+COLUMNAS_PRESTAMO = ("id, libro_id, usuario_id, fecha_prestamo, fecha_devolucion_esperada, "
+                     "fecha_devolucion_real, devuelto")
+
+# Todos los préstamos, para FROM: los filtros de afuera llegan a cada parte
+PRESTAMOS_Y_HISTORIAL = (f"(SELECT {COLUMNAS_PRESTAMO} FROM prestamos "
+                         f"UNION ALL SELECT {COLUMNAS_PRESTAMO} FROM {TABLA_HISTORIAL})")
+
+SQL_CANDIDATOS = """
+    SELECT id FROM prestamos
+    WHERE id > ? AND devuelto = 1 AND fecha_devolucion_real < ?
+    ORDER BY id
+    LIMIT ?
+"""
+
+
+def _copiar(cursor, ids):
+    cursor.execute(f"""
+        INSERT OR REPLACE INTO {TABLA_HISTORIAL} ({COLUMNAS_PRESTAMO})
+        SELECT {COLUMNAS_PRESTAMO} FROM prestamos
+        WHERE id IN (SELECT value FROM json_each(?)) AND devuelto = 1
+    """, (ids,))
+
+
+def _quitar(cursor, ids):
+    seq = ultimo_seq(cursor)
+    cursor.execute(f"""
+        DELETE FROM prestamos
+        WHERE id IN (SELECT value FROM json_each(?)) AND devuelto = 1
+          AND id IN (SELECT id FROM {TABLA_HISTORIAL})
+    """, (ids,))
+    quitados = cursor.rowcount
+    cursor.execute("DELETE FROM cambios WHERE seq > ?", (seq,))
+    return quitados
+
+
+def _mover(cursor, ids):
+    _copiar(cursor, ids)
+    return _quitar(cursor, ids)
+
+
+def archivar(conn, dias=DIAS_ARCHIVO, lote=LOTE_ARCHIVO, pausa=PAUSA_ARCHIVO):
+    """Mueve al historial los préstamos devueltos hace más de `dias` días.
+
+    Devuelve (movidos, segundos, espera_max), donde espera_max es la
+    transacción de escritura más larga: lo que pudo demorar un préstamo.
+    """
+    corte = (date.today() - timedelta(days=dias)).isoformat()
+    inicio = time.perf_counter()
+    movidos, ultimo_id, espera_max = 0, 0, 0.0
+    while True:
+        ids = [fila[0] for fila in conn.execute(SQL_CANDIDATOS, (ultimo_id, corte, lote)).fetchall()]
+        if not ids:
+            break
+        ultimo_id = ids[-1]
+        lista = json.dumps(ids)
+        inicio_lote = time.perf_counter()
+        if HISTORIAL_DB:
+            transaccion_escritura(conn, lambda cursor: _copiar(cursor, lista))
+            espera_max = max(espera_max, time.perf_counter() - inicio_lote)
+            inicio_lote = time.perf_counter()
+            movidos += transaccion_escritura(conn, lambda cursor: _quitar(cursor, lista))
+        else:
+            movidos += transaccion_escritura(conn, lambda cursor: _mover(cursor, lista))
+        duracion = time.perf_counter() - inicio_lote
+        espera_max = max(espera_max, duracion)
+        time.sleep(duracion * pausa)
+    if movidos:
+        # Las estadísticas del planificador describían las tablas de antes
+        conn.execute("ANALYZE prestamos")
+        conn.execute(f"ANALYZE {TABLA_HISTORIAL}")
+    return movidos, time.perf_counter() - inicio, espera_max
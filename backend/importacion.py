@@ -0,0 +1,179 @@
+# ==================== IMPORTACIÓN MASIVA ====================
+# Carga de libros, autores y usuarios desde NDJSON o CSV.
+#
+# El cuerpo se procesa a medida que llega, en lotes de TAMANO_LOTE filas:
+# cada lote se valida con el modelo Pydantic del recurso y se inserta con
+# executemany en una sola transacción de ejecutar_escritura (con los
+# reintentos ante una base ocupada y la escritura agrupada, como cualquier
+# otra escritura). Si el lote choca con una restricción (ISBN o email
+# duplicado, clave foránea inexistente) se deshace y se reintenta fila por
+# fila para informar exactamente qué filas fallaron, sin abortar el resto
+# de la carga.
+
+import csv
+import json
+import sqlite3
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+from database import ejecutar_escritura
+
+TAMANO_LOTE = 1000
+# Errores que se devuelven en detalle; el resto solo se cuenta
+MAX_ERRORES = 1000
+
+
+def formato_de(request):
+    formato = request.query_params.get("formato")
+    if formato is None:
+        tipo = request.headers.get("content-type", "")
+        formato = "csv" if "csv" in tipo else "ndjson"
+    if formato not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato no soportado (csv o ndjson)")
+    return formato
+
+
+async def lineas(request):
+    resto = b""
+    async for trozo in request.stream():
+        resto += trozo
+        *completas, resto = resto.split(b"\n")
+        for linea in completas:
+            yield linea.decode("utf-8")
+    if resto:
+        yield resto.decode("utf-8")
+
+
+async def registros_ndjson(request):
+    numero = 0
+    async for linea in lineas(request):
+        if not linea.strip():
+            continue
+        numero += 1
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            yield numero, None, "JSON inválido"
+            continue
+        if not isinstance(fila, dict):
+            yield numero, None, "Se esperaba un objeto JSON"
+            continue
+        yield numero, fila, None
+
+
+async def registros_csv(request):
+    encabezado, pendiente, numero = None, "", 0
+    async for linea in lineas(request):
+        # Un campo entre comillas puede contener saltos de línea: se acumula
+        # hasta que las comillas queden balanceadas.
+        pendiente += linea + "\n"
+        if pendiente.count('"') % 2:
+            continue
+        valores = next(csv.reader([pendiente]), [])
+        pendiente = ""
+        if not valores:
+            continue
+        if encabezado is None:
+            encabezado = [v.strip() for v in valores]
+            continue
+        numero += 1
+        if len(valores) != len(encabezado):
+            yield numero, None, "Cantidad de columnas incorrecta"
+            continue
+        # En CSV una celda vacía equivale a una columna ausente: el modelo
+        # aplica su valor por defecto (None solo si el campo es Optional)
+        yield numero, {k: v for k, v in zip(encabezado, valores) if v != ""}, None
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.insertados = 0
+        self.total_errores = 0
+        self.errores = []
+
+    def error(self, numero, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"fila": numero, "error": mensaje})
+
+    def dict(self):
+        return {
+            "insertados": self.insertados,
+            "total_errores": self.total_errores,
+            "errores": sorted(self.errores, key=lambda e: e["fila"]),
+        }
+
+
+def describir_validacion(error):
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+def insertar_lote(lote, modelo, sql, columnas, mensaje_integridad, resultado):
+    validas = []
+    for numero, fila, error in lote:
+        if error:
+            resultado.error(numero, error)
+            continue
+        try:
+            objeto = modelo(**fila)
+        except ValidationError as e:
+            resultado.error(numero, describir_validacion(e))
+            continue
+        validas.append((numero, tuple(getattr(objeto, c) for c in columnas)))
+    if not validas:
+        return
+
+    # Cada operación devuelve lo que insertó en lugar de anotarlo en
+    # resultado: ante una base ocupada la transacción se reintenta entera.
+    def insertar_todas(cursor):
+        cursor.executemany(sql, [valores for _, valores in validas])
+
+    try:
+        ejecutar_escritura(insertar_todas)
+        resultado.insertados += len(validas)
+        return
+    except sqlite3.IntegrityError:
+        pass
+
+    # El lote tenía filas conflictivas: se insertan de a una en una única
+    # transacción; una restricción violada solo deshace su propia sentencia.
+    def insertar_de_a_una(cursor):
+        insertados, errores = 0, []
+        for numero, valores in validas:
+            try:
+                cursor.execute(sql, valores)
+                insertados += 1
+            except sqlite3.IntegrityError as e:
+                errores.append((numero, mensaje_integridad(e)))
+        return insertados, errores
+
+    insertados, errores = ejecutar_escritura(insertar_de_a_una)
+    resultado.insertados += insertados
+    for numero, mensaje in errores:
+        resultado.error(numero, mensaje)
+
+
+async def importar(request, modelo, tabla, columnas, mensaje_integridad):
+    formato = formato_de(request)
+    registros = registros_csv(request) if formato == "csv" else registros_ndjson(request)
+    sql = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' for _ in columnas)})"
+    resultado = ResultadoImportacion()
+
+    try:
+        lote = []
+        async for registro in registros:
+            lote.append(registro)
+            if len(lote) >= TAMANO_LOTE:
+                await run_in_threadpool(
+                    insertar_lote, lote, modelo, sql, columnas, mensaje_integridad, resultado)
+                lote = []
+        if lote:
+            await run_in_threadpool(
+                insertar_lote, lote, modelo, sql, columnas, mensaje_integridad, resultado)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El cuerpo debe estar codificado en UTF-8")
+    return resultado.dict()
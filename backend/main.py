@@ -1,15 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import os 
 import sqlite3
+from admision import MiddlewareAdmision
+from autocompletado import LIMITE_AUTOCOMPLETADO, LIMITE_MAXIMO_AUTOCOMPLETADO, autocompletado
+from cache import cache_respuestas
+from cambios import LIMITE_MAXIMO_CAMBIOS, LIMITE_POR_DEFECTO, leer_cambios, ultimo_seq
+from compresion import MiddlewareCompresion
+from consultas_lentas import consultas_lentas
+from database import bloqueo_inicializacion, get_db, ejecutar_escritura, transaccion_lectura
+from estaticos import ArchivosEstaticos, construir
+from eventos import difusor
+from exportacion import exportar, rango_fechas
+from historial import TABLA_HISTORIAL
+from importacion import importar
+from metricas import MiddlewareMetricas, registro
+from migraciones import aplicar_migraciones
+from paginacion import consulta_paginada, ENCABEZADO_CURSOR, LIMITE_MAXIMO
+from recomendaciones import VECINOS, registrar_prestamo
+from serializacion import RespuestaJSON, leer_dicts, parsear_campos
+from vencidos import CONDICION_VENCIDO, SQL_VENCIDOS, dias_de_atraso, fecha_de_corte
 
 app = FastAPI()
 
+# Límite de peticiones en curso por clase y 503 rápido ante una sobrecarga;
+# va dentro de CORS para que el navegador pueda leer el rechazo
+app.add_middleware(MiddlewareAdmision)
 # Configuración de CORS
 app.add_middleware(
     CORSMiddleware,
@@ -17,16 +37,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[ENCABEZADO_CURSOR, "Retry-After"],
 )
-# Montar archivos estáticos
+# gzip para JSON y texto; va dentro del de métricas para que cuente los bytes enviados
+app.add_middleware(MiddlewareCompresion)
+# Latencia, códigos de estado y bytes por ruta (ver GET /metrics)
+app.add_middleware(MiddlewareMetricas)
+# Montar archivos estáticos: versionados y precomprimidos en frontend/dist
 frontend_path = os.path.join(os.path.dirname(__file__), "../frontend")
+estaticos = None
 if os.path.exists(frontend_path):
-    app.mount("/static", StaticFiles(directory=frontend_path), name="static")
+    dist_path = os.path.join(frontend_path, "dist")
+    with bloqueo_inicializacion():
+        construir(frontend_path, dist_path)
+    estaticos = ArchivosEstaticos(directory=dist_path)
+    app.mount("/static", estaticos, name="static")
 
 # Ruta para servir el HTML principal
 @app.get("/app")
-async def serve_app():
-    return FileResponse(os.path.join(frontend_path, "index.html"))
+async def serve_app(request: Request):
+    if estaticos is None:
+        raise HTTPException(status_code=404, detail="Frontend no disponible")
+    return await estaticos.get_response("index.html", request.scope)
 
 # Ruta raíz redirige a /app
 @app.get("/")
@@ -87,525 +119,726 @@ class Resena(BaseModel):
 
 # ==================== BASE DE DATOS ====================
 
-def get_db():
-    conn = sqlite3.connect('biblioteca.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def init_db():
-    conn = sqlite3.connect('biblioteca.db')
-    cursor = conn.cursor()
+    # Con varios workers (uvicorn --workers N) cada proceso ejecuta esto al
+    # importar el módulo: bajo el bloqueo, solo el primero migra y carga los
+    # datos de ejemplo.
+    with bloqueo_inicializacion():
+        conn = get_db()
+        aplicar_migraciones(conn)
+        cursor = conn.cursor()
     
-    # Tabla Categorías
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS categorias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL UNIQUE,
-            descripcion TEXT NOT NULL
-        )
-    ''')
-    
-    # Tabla Autores
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS autores (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            nacionalidad TEXT NOT NULL,
-            fecha_nacimiento TEXT NOT NULL,
-            biografia TEXT
-        )
-    ''')
-    
-    # Tabla Libros
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS libros (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            titulo TEXT NOT NULL,
-            autor_id INTEGER NOT NULL,
-            categoria_id INTEGER NOT NULL,
-            isbn TEXT NOT NULL UNIQUE,
-            año_publicacion INTEGER NOT NULL,
-            paginas INTEGER NOT NULL,
-            disponible BOOLEAN DEFAULT 1,
-            FOREIGN KEY (autor_id) REFERENCES autores (id),
-            FOREIGN KEY (categoria_id) REFERENCES categorias (id)
-        )
-    ''')
-    
-    # Tabla Usuarios
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE,
-            telefono TEXT NOT NULL,
-            direccion TEXT NOT NULL,
-            fecha_registro TEXT NOT NULL
-        )
-    ''')
-    
-    # Tabla Préstamos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS prestamos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            libro_id INTEGER NOT NULL,
-            usuario_id INTEGER NOT NULL,
-            fecha_prestamo TEXT NOT NULL,
-            fecha_devolucion_esperada TEXT NOT NULL,
-            fecha_devolucion_real TEXT,
-            devuelto BOOLEAN DEFAULT 0,
-            FOREIGN KEY (libro_id) REFERENCES libros (id),
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-        )
-    ''')
-    
-    # Tabla Reseñas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS resenas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            libro_id INTEGER NOT NULL,
-            usuario_id INTEGER NOT NULL,
-            calificacion INTEGER NOT NULL CHECK(calificacion >= 1 AND calificacion <= 5),
-            comentario TEXT NOT NULL,
-            fecha TEXT NOT NULL,
-            FOREIGN KEY (libro_id) REFERENCES libros (id),
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-        )
-    ''')
-    
-    # Insertar datos de ejemplo
-    cursor.execute("SELECT COUNT(*) FROM categorias")
-    if cursor.fetchone()[0] == 0:
-        categorias_data = [
-            ('Ficción', 'Obras narrativas basadas en la imaginación'),
-            ('No Ficción', 'Obras basadas en hechos reales'),
-            ('Ciencia Ficción', 'Narrativa especulativa sobre tecnología y futuro'),
-            ('Fantasía', 'Mundos imaginarios con elementos mágicos'),
-            ('Romance', 'Historias centradas en relaciones amorosas'),
-            ('Misterio', 'Historias de suspense e investigación'),
-            ('Biografía', 'Historia de vida de personas reales'),
-            ('Poesía', 'Expresión artística en verso'),
-            ('Historia', 'Relatos de acontecimientos pasados'),
-            ('Filosofía', 'Reflexiones sobre existencia y conocimiento'),
-            ('Terror', 'Historias que provocan miedo'),
-            ('Aventura', 'Narrativas de exploración y acción')
-        ]
-        cursor.executemany('INSERT INTO categorias (nombre, descripcion) VALUES (?, ?)', categorias_data)
+        # Insertar datos de ejemplo
+        cursor.execute("SELECT COUNT(*) FROM categorias")
+        if cursor.fetchone()[0] == 0:
+            categorias_data = [
+                ('Ficción', 'Obras narrativas basadas en la imaginación'),
+                ('No Ficción', 'Obras basadas en hechos reales'),
+                ('Ciencia Ficción', 'Narrativa especulativa sobre tecnología y futuro'),
+                ('Fantasía', 'Mundos imaginarios con elementos mágicos'),
+                ('Romance', 'Historias centradas en relaciones amorosas'),
+                ('Misterio', 'Historias de suspense e investigación'),
+                ('Biografía', 'Historia de vida de personas reales'),
+                ('Poesía', 'Expresión artística en verso'),
+                ('Historia', 'Relatos de acontecimientos pasados'),
+                ('Filosofía', 'Reflexiones sobre existencia y conocimiento'),
+                ('Terror', 'Historias que provocan miedo'),
+                ('Aventura', 'Narrativas de exploración y acción')
+            ]
+            cursor.executemany('INSERT INTO categorias (nombre, descripcion) VALUES (?, ?)', categorias_data)
         
-        autores_data = [
-            ('Gabriel García Márquez', 'Colombiano', '1927-03-06', 'Premio Nobel de Literatura 1982'),
-            ('Jorge Luis Borges', 'Argentino', '1899-08-24', 'Maestro del cuento y la poesía'),
-            ('Isabel Allende', 'Chilena', '1942-08-02', 'Una de las autoras más leídas en español'),
-            ('Mario Vargas Llosa', 'Peruano', '1936-03-28', 'Premio Nobel de Literatura 2010'),
-            ('Pablo Neruda', 'Chileno', '1904-07-12', 'Premio Nobel de Literatura 1971'),
-            ('Julio Cortázar', 'Argentino', '1914-08-26', 'Maestro del cuento fantástico'),
-            ('Octavio Paz', 'Mexicano', '1914-03-31', 'Premio Nobel de Literatura 1990'),
-            ('Carlos Fuentes', 'Mexicano', '1928-11-11', 'Una de las figuras más importantes de la literatura mexicana'),
-            ('Roberto Bolaño', 'Chileno', '1953-04-28', 'Autor de "Los detectives salvajes"'),
-            ('Laura Esquivel', 'Mexicana', '1950-09-30', 'Autora de "Como agua para chocolate"'),
-            ('Miguel de Cervantes', 'Español', '1547-09-29', 'Autor de Don Quijote'),
-            ('Federico García Lorca', 'Español', '1898-06-05', 'Poeta y dramaturgo de la Generación del 27'),
-            ('J.K. Rowling', 'Británica', '1965-07-31', 'Creadora de Harry Potter'),
-            ('Stephen King', 'Estadounidense', '1947-09-21', 'Maestro del terror contemporáneo'),
-            ('Agatha Christie', 'Británica', '1890-09-15', 'Reina del misterio')
-        ]
-        cursor.executemany('INSERT INTO autores (nombre, nacionalidad, fecha_nacimiento, biografia) VALUES (?, ?, ?, ?)', autores_data)
+            autores_data = [
+                ('Gabriel García Márquez', 'Colombiano', '1927-03-06', 'Premio Nobel de Literatura 1982'),
+                ('Jorge Luis Borges', 'Argentino', '1899-08-24', 'Maestro del cuento y la poesía'),
+                ('Isabel Allende', 'Chilena', '1942-08-02', 'Una de las autoras más leídas en español'),
+                ('Mario Vargas Llosa', 'Peruano', '1936-03-28', 'Premio Nobel de Literatura 2010'),
+                ('Pablo Neruda', 'Chileno', '1904-07-12', 'Premio Nobel de Literatura 1971'),
+                ('Julio Cortázar', 'Argentino', '1914-08-26', 'Maestro del cuento fantástico'),
+                ('Octavio Paz', 'Mexicano', '1914-03-31', 'Premio Nobel de Literatura 1990'),
+                ('Carlos Fuentes', 'Mexicano', '1928-11-11', 'Una de las figuras más importantes de la literatura mexicana'),
+                ('Roberto Bolaño', 'Chileno', '1953-04-28', 'Autor de "Los detectives salvajes"'),
+                ('Laura Esquivel', 'Mexicana', '1950-09-30', 'Autora de "Como agua para chocolate"'),
+                ('Miguel de Cervantes', 'Español', '1547-09-29', 'Autor de Don Quijote'),
+                ('Federico García Lorca', 'Español', '1898-06-05', 'Poeta y dramaturgo de la Generación del 27'),
+                ('J.K. Rowling', 'Británica', '1965-07-31', 'Creadora de Harry Potter'),
+                ('Stephen King', 'Estadounidense', '1947-09-21', 'Maestro del terror contemporáneo'),
+                ('Agatha Christie', 'Británica', '1890-09-15', 'Reina del misterio')
+            ]
+            cursor.executemany('INSERT INTO autores (nombre, nacionalidad, fecha_nacimiento, biografia) VALUES (?, ?, ?, ?)', autores_data)
         
-        libros_data = [
-            ('Cien años de soledad', 1, 1, '978-0307474728', 1967, 417, 1),
-            ('El amor en los tiempos del cólera', 1, 5, '978-0307389732', 1985, 368, 1),
-            ('Ficciones', 2, 1, '978-0802130303', 1944, 174, 1),
-            ('El Aleph', 2, 1, '978-8420633473', 1949, 203, 1),
-            ('La casa de los espíritus', 3, 4, '978-1501117015', 1982, 433, 1),
-            ('La ciudad y los perros', 4, 1, '978-8420412146', 1963, 408, 1),
-            ('Conversación en La Catedral', 4, 1, '978-8420471358', 1969, 734, 1),
-            ('Veinte poemas de amor', 5, 8, '978-8437604695', 1924, 112, 1),
-            ('Rayuela', 6, 1, '978-8437604572', 1963, 600, 1),
-            ('Bestiario', 6, 1, '978-8420471341', 1951, 158, 1),
-            ('El laberinto de la soledad', 7, 10, '978-0802150424', 1950, 398, 1),
-            ('Como agua para chocolate', 10, 5, '978-0385721233', 1989, 245, 1),
-            ('Don Quijote de la Mancha', 11, 1, '978-8467033069', 1605, 863, 1),
-            ('Bodas de sangre', 12, 1, '978-8437604541', 1933, 96, 1),
-            ('Harry Potter y la piedra filosofal', 13, 4, '978-8498383447', 1997, 254, 1),
-            ('El resplandor', 14, 11, '978-0307743657', 1977, 447, 1),
-            ('Asesinato en el Orient Express', 15, 6, '978-0062693662', 1934, 256, 1)
-        ]
-        cursor.executemany('INSERT INTO libros (titulo, autor_id, categoria_id, isbn, año_publicacion, paginas, disponible) VALUES (?, ?, ?, ?, ?, ?, ?)', libros_data)
+            libros_data = [
+                ('Cien años de soledad', 1, 1, '978-0307474728', 1967, 417, 1),
+                ('El amor en los tiempos del cólera', 1, 5, '978-0307389732', 1985, 368, 1),
+                ('Ficciones', 2, 1, '978-0802130303', 1944, 174, 1),
+                ('El Aleph', 2, 1, '978-8420633473', 1949, 203, 1),
+                ('La casa de los espíritus', 3, 4, '978-1501117015', 1982, 433, 1),
+                ('La ciudad y los perros', 4, 1, '978-8420412146', 1963, 408, 1),
+                ('Conversación en La Catedral', 4, 1, '978-8420471358', 1969, 734, 1),
+                ('Veinte poemas de amor', 5, 8, '978-8437604695', 1924, 112, 1),
+                ('Rayuela', 6, 1, '978-8437604572', 1963, 600, 1),
+                ('Bestiario', 6, 1, '978-8420471341', 1951, 158, 1),
+                ('El laberinto de la soledad', 7, 10, '978-0802150424', 1950, 398, 1),
+                ('Como agua para chocolate', 10, 5, '978-0385721233', 1989, 245, 1),
+                ('Don Quijote de la Mancha', 11, 1, '978-8467033069', 1605, 863, 1),
+                ('Bodas de sangre', 12, 1, '978-8437604541', 1933, 96, 1),
+                ('Harry Potter y la piedra filosofal', 13, 4, '978-8498383447', 1997, 254, 1),
+                ('El resplandor', 14, 11, '978-0307743657', 1977, 447, 1),
+                ('Asesinato en el Orient Express', 15, 6, '978-0062693662', 1934, 256, 1)
+            ]
+            cursor.executemany('INSERT INTO libros (titulo, autor_id, categoria_id, isbn, año_publicacion, paginas, disponible) VALUES (?, ?, ?, ?, ?, ?, ?)', libros_data)
         
-        usuarios_data = [
-            ('María González', 'maria.gonzalez@email.com', '+54 381 4567890', 'San Martín 123, Tucumán', '2024-01-15'),
-            ('Juan Pérez', 'juan.perez@email.com', '+54 381 4567891', 'Av. Aconquija 456, Tucumán', '2024-02-20'),
-            ('Ana Martínez', 'ana.martinez@email.com', '+54 381 4567892', 'Congreso 789, Tucumán', '2024-03-10'),
-            ('Carlos López', 'carlos.lopez@email.com', '+54 381 4567893', 'Muñecas 321, Tucumán', '2024-03-25'),
-            ('Laura Fernández', 'laura.fernandez@email.com', '+54 381 4567894', 'Laprida 654, Tucumán', '2024-04-05'),
-            ('Pedro Sánchez', 'pedro.sanchez@email.com', '+54 381 4567895', '24 de Septiembre 987, Tucumán', '2024-04-18'),
-            ('Sofía Torres', 'sofia.torres@email.com', '+54 381 4567896', 'Mate de Luna 147, Tucumán', '2024-05-02'),
-            ('Diego Ramírez', 'diego.ramirez@email.com', '+54 381 4567897', 'Junín 258, Tucumán', '2024-05-15'),
-            ('Valentina Ruiz', 'valentina.ruiz@email.com', '+54 381 4567898', 'Córdoba 369, Tucumán', '2024-06-01'),
-            ('Mateo Silva', 'mateo.silva@email.com', '+54 381 4567899', 'Salta 741, Tucumán', '2024-06-20'),
-            ('Camila Morales', 'camila.morales@email.com', '+54 381 4567800', 'Mendoza 852, Tucumán', '2024-07-10'),
-            ('Lucas Herrera', 'lucas.herrera@email.com', '+54 381 4567801', 'Buenos Aires 963, Tucumán', '2024-08-05')
-        ]
-        cursor.executemany('INSERT INTO usuarios (nombre, email, telefono, direccion, fecha_registro) VALUES (?, ?, ?, ?, ?)', usuarios_data)
+            usuarios_data = [
+                ('María González', 'maria.gonzalez@email.com', '+54 381 4567890', 'San Martín 123, Tucumán', '2024-01-15'),
+                ('Juan Pérez', 'juan.perez@email.com', '+54 381 4567891', 'Av. Aconquija 456, Tucumán', '2024-02-20'),
+                ('Ana Martínez', 'ana.martinez@email.com', '+54 381 4567892', 'Congreso 789, Tucumán', '2024-03-10'),
+                ('Carlos López', 'carlos.lopez@email.com', '+54 381 4567893', 'Muñecas 321, Tucumán', '2024-03-25'),
+                ('Laura Fernández', 'laura.fernandez@email.com', '+54 381 4567894', 'Laprida 654, Tucumán', '2024-04-05'),
+                ('Pedro Sánchez', 'pedro.sanchez@email.com', '+54 381 4567895', '24 de Septiembre 987, Tucumán', '2024-04-18'),
+                ('Sofía Torres', 'sofia.torres@email.com', '+54 381 4567896', 'Mate de Luna 147, Tucumán', '2024-05-02'),
+                ('Diego Ramírez', 'diego.ramirez@email.com', '+54 381 4567897', 'Junín 258, Tucumán', '2024-05-15'),
+                ('Valentina Ruiz', 'valentina.ruiz@email.com', '+54 381 4567898', 'Córdoba 369, Tucumán', '2024-06-01'),
+                ('Mateo Silva', 'mateo.silva@email.com', '+54 381 4567899', 'Salta 741, Tucumán', '2024-06-20'),
+                ('Camila Morales', 'camila.morales@email.com', '+54 381 4567800', 'Mendoza 852, Tucumán', '2024-07-10'),
+                ('Lucas Herrera', 'lucas.herrera@email.com', '+54 381 4567801', 'Buenos Aires 963, Tucumán', '2024-08-05')
+            ]
+            cursor.executemany('INSERT INTO usuarios (nombre, email, telefono, direccion, fecha_registro) VALUES (?, ?, ?, ?, ?)', usuarios_data)
         
-        prestamos_data = [
-            (1, 1, '2024-10-15', '2024-10-29', '2024-10-28', 1),
-            (3, 2, '2024-10-20', '2024-11-03', '2024-11-02', 1),
-            (5, 3, '2024-10-25', '2024-11-08', None, 0),
-            (7, 4, '2024-10-28', '2024-11-11', None, 0),
-            (9, 5, '2024-11-01', '2024-11-15', None, 0),
-            (2, 6, '2024-09-10', '2024-09-24', '2024-09-23', 1),
-            (4, 7, '2024-09-15', '2024-09-29', '2024-09-28', 1),
-            (6, 8, '2024-10-05', '2024-10-19', '2024-10-18', 1),
-            (8, 9, '2024-10-10', '2024-10-24', '2024-10-23', 1),
-            (10, 10, '2024-10-12', '2024-10-26', '2024-10-25', 1),
-            (11, 11, '2024-10-18', '2024-11-01', None, 0),
-            (12, 12, '2024-10-22', '2024-11-05', None, 0),
-            (15, 3, '2024-11-05', '2024-11-19', None, 0),
-            (16, 7, '2024-11-07', '2024-11-21', None, 0)
-        ]
-        cursor.executemany('INSERT INTO prestamos (libro_id, usuario_id, fecha_prestamo, fecha_devolucion_esperada, fecha_devolucion_real, devuelto) VALUES (?, ?, ?, ?, ?, ?)', prestamos_data)
+            prestamos_data = [
+                (1, 1, '2024-10-15', '2024-10-29', '2024-10-28', 1),
+                (3, 2, '2024-10-20', '2024-11-03', '2024-11-02', 1),
+                (5, 3, '2024-10-25', '2024-11-08', None, 0),
+                (7, 4, '2024-10-28', '2024-11-11', None, 0),
+                (9, 5, '2024-11-01', '2024-11-15', None, 0),
+                (2, 6, '2024-09-10', '2024-09-24', '2024-09-23', 1),
+                (4, 7, '2024-09-15', '2024-09-29', '2024-09-28', 1),
+                (6, 8, '2024-10-05', '2024-10-19', '2024-10-18', 1),
+                (8, 9, '2024-10-10', '2024-10-24', '2024-10-23', 1),
+                (10, 10, '2024-10-12', '2024-10-26', '2024-10-25', 1),
+                (11, 11, '2024-10-18', '2024-11-01', None, 0),
+                (12, 12, '2024-10-22', '2024-11-05', None, 0),
+                (15, 3, '2024-11-05', '2024-11-19', None, 0),
+                (16, 7, '2024-11-07', '2024-11-21', None, 0)
+            ]
+            cursor.executemany('INSERT INTO prestamos (libro_id, usuario_id, fecha_prestamo, fecha_devolucion_esperada, fecha_devolucion_real, devuelto) VALUES (?, ?, ?, ?, ?, ?)', prestamos_data)
         
-        resenas_data = [
-            (1, 1, 5, 'Obra maestra de la literatura latinoamericana. Inolvidable.', '2024-10-29'),
-            (1, 2, 5, 'Una historia increíble que te atrapa desde el principio.', '2024-10-30'),
-            (3, 2, 4, 'Cuentos brillantes que desafían la realidad.', '2024-11-03'),
-            (5, 3, 5, 'Hermosa narrativa sobre familia y tradición.', '2024-11-04'),
-            (2, 6, 5, 'Una historia de amor épica y conmovedora.', '2024-09-24'),
-            (4, 7, 4, 'Borges en su máximo esplendor literario.', '2024-09-30'),
-            (6, 8, 4, 'Crítica social envuelta en una gran historia.', '2024-10-19'),
-            (8, 9, 5, 'Poemas que tocan el alma profundamente.', '2024-10-24'),
-            (10, 10, 4, 'Cuentos surrealistas fascinantes.', '2024-10-26'),
-            (9, 5, 5, 'Una obra experimental única e innovadora.', '2024-11-02'),
-            (12, 4, 5, 'Realismo mágico delicioso en cada página.', '2024-11-03'),
-            (15, 3, 5, 'El inicio de una saga maravillosa e inolvidable.', '2024-11-06')
-        ]
-        cursor.executemany('INSERT INTO resenas (libro_id, usuario_id, calificacion, comentario, fecha) VALUES (?, ?, ?, ?, ?)', resenas_data)
+            resenas_data = [
+                (1, 1, 5, 'Obra maestra de la literatura latinoamericana. Inolvidable.', '2024-10-29'),
+                (1, 2, 5, 'Una historia increíble que te atrapa desde el principio.', '2024-10-30'),
+                (3, 2, 4, 'Cuentos brillantes que desafían la realidad.', '2024-11-03'),
+                (5, 3, 5, 'Hermosa narrativa sobre familia y tradición.', '2024-11-04'),
+                (2, 6, 5, 'Una historia de amor épica y conmovedora.', '2024-09-24'),
+                (4, 7, 4, 'Borges en su máximo esplendor literario.', '2024-09-30'),
+                (6, 8, 4, 'Crítica social envuelta en una gran historia.', '2024-10-19'),
+                (8, 9, 5, 'Poemas que tocan el alma profundamente.', '2024-10-24'),
+                (10, 10, 4, 'Cuentos surrealistas fascinantes.', '2024-10-26'),
+                (9, 5, 5, 'Una obra experimental única e innovadora.', '2024-11-02'),
+                (12, 4, 5, 'Realismo mágico delicioso en cada página.', '2024-11-03'),
+                (15, 3, 5, 'El inicio de una saga maravillosa e inolvidable.', '2024-11-06')
+            ]
+            cursor.executemany('INSERT INTO resenas (libro_id, usuario_id, calificacion, comentario, fecha) VALUES (?, ?, ?, ?, ?)', resenas_data)
     
-    conn.commit()
-    conn.close()
+        conn.commit()
+        conn.close()
 
 init_db()
+# Cada worker vuelve a importar este módulo y carga sus propios índices
+autocompletado.cargar()
+
+# ==================== CONSULTAS DE LOS LISTADOS ====================
+# Compartidas por cada listado y por GET /bootstrap, que los arma todos juntos.
+
+SQL_CATEGORIAS = "SELECT * FROM categorias ORDER BY nombre"
+
+SQL_AUTORES = "SELECT * FROM autores"
+ORDEN_AUTORES = [("nombre", "nombre"), ("id", "id")]
+
+SQL_LIBROS = """
+    SELECT l.*, a.nombre as autor_nombre, c.nombre as categoria_nombre
+    FROM libros l
+    JOIN autores a ON l.autor_id = a.id
+    JOIN categorias c ON l.categoria_id = c.id
+"""
+ORDEN_LIBROS = [("l.titulo", "titulo"), ("l.id", "id")]
+
+SQL_USUARIOS = "SELECT * FROM usuarios"
+ORDEN_USUARIOS = [("nombre", "nombre"), ("id", "id")]
+
+SQL_PRESTAMOS = """
+    SELECT p.*, l.titulo as libro_titulo, u.nombre as usuario_nombre, a.nombre as autor_nombre
+    FROM prestamos p
+    JOIN libros l ON p.libro_id = l.id
+    JOIN usuarios u ON p.usuario_id = u.id
+    JOIN autores a ON l.autor_id = a.id
+"""
+ORDEN_PRESTAMOS = [("p.fecha_prestamo", "fecha_prestamo"), ("p.id", "id")]
+# Préstamos archivados (ver historial.py). CROSS JOIN fija el historial como
+# tabla externa, así se recorre por su índice de fecha y no se ordena entero
+# aunque las estadísticas del planificador estén desactualizadas.
+SQL_PRESTAMOS_HISTORIAL = f"""
+    SELECT p.*, l.titulo as libro_titulo, u.nombre as usuario_nombre, a.nombre as autor_nombre
+    FROM {TABLA_HISTORIAL} p
+    CROSS JOIN libros l ON p.libro_id = l.id
+    CROSS JOIN usuarios u ON p.usuario_id = u.id
+    CROSS JOIN autores a ON l.autor_id = a.id
+"""
+
+SQL_RESENAS = """
+    SELECT r.*, l.titulo as libro_titulo, u.nombre as usuario_nombre
+    FROM resenas r
+    JOIN libros l ON r.libro_id = l.id
+    JOIN usuarios u ON r.usuario_id = u.id
+"""
+ORDEN_RESENAS = [("r.fecha", "fecha"), ("r.id", "id")]
+
+# Para GET /cambios: el SELECT de cada listado y su columna de id
+CONSULTAS_CAMBIOS = {
+    "categorias": ("SELECT * FROM categorias", "id"),
+    "autores": (SQL_AUTORES, "id"),
+    "libros": (SQL_LIBROS, "l.id"),
+    "usuarios": (SQL_USUARIOS, "id"),
+    "prestamos": (SQL_PRESTAMOS, "p.id"),
+    "resenas": (SQL_RESENAS, "r.id"),
+}
+
+SQL_ESTADISTICAS = """
+    SELECT total_libros, total_autores, total_usuarios,
+           prestamos_activos, total_categorias, total_resenas
+    FROM estadisticas WHERE id = 1
+"""
 
 # ==================== ENDPOINTS CATEGORÍAS ====================
 
 @app.get("/categorias")
-def get_categorias():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM categorias ORDER BY nombre")
-    categorias = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return categorias
+def get_categorias(request: Request, campos: Optional[str] = Query(None, alias="fields")):
+    def consultar():
+        conn = get_db()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(SQL_CATEGORIAS)
+            categorias = leer_dicts(cursor, parsear_campos(campos))
+        finally:
+            conn.close()
+        return categorias, {}
+    return cache_respuestas.responder(request, "categorias", consultar)
 
 @app.post("/categorias")
 def create_categoria(categoria: Categoria):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+    def insertar(cursor):
         cursor.execute(
             "INSERT INTO categorias (nombre, descripcion) VALUES (?, ?)",
             (categoria.nombre, categoria.descripcion)
         )
-        conn.commit()
-        categoria_id = cursor.lastrowid
-        conn.close()
-        return {"id": categoria_id, **categoria.dict()}
+        return cursor.lastrowid
+    try:
+        categoria_id = ejecutar_escritura(insertar)
     except sqlite3.IntegrityError:
-        conn.close()
         raise HTTPException(status_code=400, detail="La categoría ya existe")
+    cache_respuestas.invalidar("categorias")
+    return {**categoria.dict(), "id": categoria_id}
 
 @app.put("/categorias/{categoria_id}")
 def update_categoria(categoria_id: int, categoria: Categoria):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE categorias SET nombre = ?, descripcion = ? WHERE id = ?",
-        (categoria.nombre, categoria.descripcion, categoria_id)
-    )
-    conn.commit()
-    conn.close()
-    if cursor.rowcount == 0:
+    def actualizar(cursor):
+        cursor.execute(
+            "UPDATE categorias SET nombre = ?, descripcion = ? WHERE id = ?",
+            (categoria.nombre, categoria.descripcion, categoria_id)
+        )
+        return cursor.rowcount
+    try:
+        actualizados = ejecutar_escritura(actualizar)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="La categoría ya existe")
+    if actualizados == 0:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
-    return {"id": categoria_id, **categoria.dict()}
+    cache_respuestas.invalidar("categorias", "libros")
+    return {**categoria.dict(), "id": categoria_id}
 
 @app.delete("/categorias/{categoria_id}")
 def delete_categoria(categoria_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM categorias WHERE id = ?", (categoria_id,))
-    conn.commit()
-    conn.close()
-    if cursor.rowcount == 0:
+    def eliminar(cursor):
+        cursor.execute("DELETE FROM categorias WHERE id = ?", (categoria_id,))
+        return cursor.rowcount
+    try:
+        eliminados = ejecutar_escritura(eliminar)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="La categoría tiene libros asociados")
+    if eliminados == 0:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    cache_respuestas.invalidar("categorias")
     return {"message": "Categoría eliminada correctamente"}
 
 # ==================== ENDPOINTS AUTORES ====================
 
 @app.get("/autores")
-def get_autores():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM autores ORDER BY nombre")
-    autores = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return autores
+def get_autores(
+    request: Request,
+    nacionalidad: Optional[str] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues: Optional[str] = Query(None, alias="cursor"),
+    campos: Optional[str] = Query(None, alias="fields"),
+):
+    def consultar():
+        conn = get_db()
+        try:
+            cursor = conn.cursor()
+            filas, siguiente = consulta_paginada(
+                cursor, SQL_AUTORES, orden=ORDEN_AUTORES,
+                filtros=[("nacionalidad = ?", nacionalidad)],
+                limite=limite, despues=despues, campos=parsear_campos(campos),
+            )
+        finally:
+            conn.close()
+        return filas, {ENCABEZADO_CURSOR: siguiente} if siguiente else {}
+    return cache_respuestas.responder(request, "autores", consultar)
 
 @app.post("/autores")
 def create_autor(autor: Autor):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO autores (nombre, nacionalidad, fecha_nacimiento, biografia) VALUES (?, ?, ?, ?)",
-        (autor.nombre, autor.nacionalidad, autor.fecha_nacimiento, autor.biografia)
+    def insertar(cursor):
+        cursor.execute(
+            "INSERT INTO autores (nombre, nacionalidad, fecha_nacimiento, biografia) VALUES (?, ?, ?, ?)",
+            (autor.nombre, autor.nacionalidad, autor.fecha_nacimiento, autor.biografia)
+        )
+        return cursor.lastrowid
+    autor_id = ejecutar_escritura(insertar)
+    cache_respuestas.invalidar("autores")
+    return {**autor.dict(), "id": autor_id}
+
+@app.post("/autores/bulk")
+async def importar_autores(request: Request):
+    resultado = await importar(
+        request, Autor, "autores",
+        ["nombre", "nacionalidad", "fecha_nacimiento", "biografia"],
+        lambda error: "Datos de autor inválidos",
     )
-    conn.commit()
-    autor_id = cursor.lastrowid
-    conn.close()
-    return {"id": autor_id, **autor.dict()}
+    cache_respuestas.invalidar("autores")
+    return resultado
 
 @app.put("/autores/{autor_id}")
 def update_autor(autor_id: int, autor: Autor):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE autores SET nombre = ?, nacionalidad = ?, fecha_nacimiento = ?, biografia = ? WHERE id = ?",
-        (autor.nombre, autor.nacionalidad, autor.fecha_nacimiento, autor.biografia, autor_id)
-    )
-    conn.commit()
-    conn.close()
-    if cursor.rowcount == 0:
+    def actualizar(cursor):
+        cursor.execute(
+            "UPDATE autores SET nombre = ?, nacionalidad = ?, fecha_nacimiento = ?, biografia = ? WHERE id = ?",
+            (autor.nombre, autor.nacionalidad, autor.fecha_nacimiento, autor.biografia, autor_id)
+        )
+        return cursor.rowcount
+    actualizados = ejecutar_escritura(actualizar)
+    if actualizados == 0:
         raise HTTPException(status_code=404, detail="Autor no encontrado")
-    return {"id": autor_id, **autor.dict()}
+    cache_respuestas.invalidar("autores", "libros")
+    return {**autor.dict(), "id": autor_id}
 
 @app.delete("/autores/{autor_id}")
 def delete_autor(autor_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM autores WHERE id = ?", (autor_id,))
-    conn.commit()
-    conn.close()
-    if cursor.rowcount == 0:
+    def eliminar(cursor):
+        cursor.execute("DELETE FROM autores WHERE id = ?", (autor_id,))
+        return cursor.rowcount
+    try:
+        eliminados = ejecutar_escritura(eliminar)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="El autor tiene libros asociados")
+    if eliminados == 0:
         raise HTTPException(status_code=404, detail="Autor no encontrado")
+    cache_respuestas.invalidar("autores")
     return {"message": "Autor eliminado correctamente"}
 
 # ==================== ENDPOINTS LIBROS ====================
 
+def mensaje_integridad_libro(error):
+    if "FOREIGN KEY" in str(error):
+        return "El autor o la categoría no existen"
+    return "El ISBN ya existe"
+
 @app.get("/libros")
-def get_libros():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT l.*, a.nombre as autor_nombre, c.nombre as categoria_nombre 
-        FROM libros l 
-        JOIN autores a ON l.autor_id = a.id 
-        JOIN categorias c ON l.categoria_id = c.id
-        ORDER BY l.titulo
-    """)
-    libros = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return libros
+def get_libros(
+    request: Request,
+    autor_id: Optional[int] = None,
+    categoria_id: Optional[int] = None,
+    disponible: Optional[bool] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues: Optional[str] = Query(None, alias="cursor"),
+    campos: Optional[str] = Query(None, alias="fields"),
+):
+    def consultar():
+        conn = get_db()
+        try:
+            cursor = conn.cursor()
+            filas, siguiente = consulta_paginada(
+                cursor, SQL_LIBROS, orden=ORDEN_LIBROS,
+                filtros=[
+                    ("l.autor_id = ?", autor_id),
+                    ("l.categoria_id = ?", categoria_id),
+                    ("l.disponible = ?", disponible),
+                ],
+                limite=limite, despues=despues, campos=parsear_campos(campos),
+            )
+        finally:
+            conn.close()
+        return filas, {ENCABEZADO_CURSOR: siguiente} if siguiente else {}
+    return cache_respuestas.responder(request, "libros", consultar)
 
 @app.post("/libros")
 def create_libro(libro: Libro):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+    def insertar(cursor):
         cursor.execute(
             "INSERT INTO libros (titulo, autor_id, categoria_id, isbn, año_publicacion, paginas, disponible) VALUES (?, ?, ?, ?, ?, ?, ?)",
             (libro.titulo, libro.autor_id, libro.categoria_id, libro.isbn, libro.año_publicacion, libro.paginas, libro.disponible)
         )
-        conn.commit()
-        libro_id = cursor.lastrowid
-        conn.close()
-        return {"id": libro_id, **libro.dict()}
-    except sqlite3.IntegrityError:
-        conn.close()
-        raise HTTPException(status_code=400, detail="El ISBN ya existe")
+        return cursor.lastrowid
+    try:
+        libro_id = ejecutar_escritura(insertar)
+    except sqlite3.IntegrityError as e:
+        raise HTTPException(status_code=400, detail=mensaje_integridad_libro(e))
+    cache_respuestas.invalidar("libros")
+    return {**libro.dict(), "id": libro_id}
+
+@app.post("/libros/bulk")
+async def importar_libros(request: Request):
+    resultado = await importar(
+        request, Libro, "libros",
+        ["titulo", "autor_id", "categoria_id", "isbn", "año_publicacion", "paginas", "disponible"],
+        mensaje_integridad_libro,
+    )
+    cache_respuestas.invalidar("libros")
+    return resultado
 
 @app.put("/libros/{libro_id}")
 def update_libro(libro_id: int, libro: Libro):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE libros SET titulo = ?, autor_id = ?, categoria_id = ?, isbn = ?, año_publicacion = ?, paginas = ?, disponible = ? WHERE id = ?",
-        (libro.titulo, libro.autor_id, libro.categoria_id, libro.isbn, libro.año_publicacion, libro.paginas, libro.disponible, libro_id)
-    )
-    conn.commit()
-    conn.close()
-    if cursor.rowcount == 0:
+    def actualizar(cursor):
+        cursor.execute(
+            "UPDATE libros SET titulo = ?, autor_id = ?, categoria_id = ?, isbn = ?, año_publicacion = ?, paginas = ?, disponible = ? WHERE id = ?",
+            (libro.titulo, libro.autor_id, libro.categoria_id, libro.isbn, libro.año_publicacion, libro.paginas, libro.disponible, libro_id)
+        )
+        return cursor.rowcount
+    try:
+        actualizados = ejecutar_escritura(actualizar)
+    except sqlite3.IntegrityError as e:
+        raise HTTPException(status_code=400, detail=mensaje_integridad_libro(e))
+    if actualizados == 0:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
-    return {"id": libro_id, **libro.dict()}
+    cache_respuestas.invalidar("libros")
+    return {**libro.dict(), "id": libro_id}
 
 @app.delete("/libros/{libro_id}")
 def delete_libro(libro_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM libros WHERE id = ?", (libro_id,))
-    conn.commit()
-    conn.close()
-    if cursor.rowcount == 0:
+    def eliminar(cursor):
+        # El historial no tiene claves foráneas (puede estar en otro archivo)
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {TABLA_HISTORIAL} WHERE libro_id = ?)", (libro_id,))
+        if cursor.fetchone()[0]:
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        cursor.execute("DELETE FROM libros WHERE id = ?", (libro_id,))
+        return cursor.rowcount
+    try:
+        eliminados = ejecutar_escritura(eliminar)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="El libro tiene préstamos o reseñas asociados")
+    if eliminados == 0:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
+    cache_respuestas.invalidar("libros")
     return {"message": "Libro eliminado correctamente"}
 
 # ==================== ENDPOINTS USUARIOS ====================
 
 @app.get("/usuarios")
-def get_usuarios():
+def get_usuarios(
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues: Optional[str] = Query(None, alias="cursor"),
+    campos: Optional[str] = Query(None, alias="fields"),
+):
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM usuarios ORDER BY nombre")
-    usuarios = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return usuarios
+    try:
+        cursor = conn.cursor()
+        filas, siguiente = consulta_paginada(
+            cursor, SQL_USUARIOS, orden=ORDEN_USUARIOS,
+            limite=limite, despues=despues, campos=parsear_campos(campos),
+        )
+    finally:
+        conn.close()
+    return RespuestaJSON(filas, headers={ENCABEZADO_CURSOR: siguiente} if siguiente else None)
 
 @app.post("/usuarios")
 def create_usuario(usuario: Usuario):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+    def insertar(cursor):
         cursor.execute(
             "INSERT INTO usuarios (nombre, email, telefono, direccion, fecha_registro) VALUES (?, ?, ?, ?, ?)",
             (usuario.nombre, usuario.email, usuario.telefono, usuario.direccion, usuario.fecha_registro)
         )
-        conn.commit()
-        usuario_id = cursor.lastrowid
-        conn.close()
-        return {"id": usuario_id, **usuario.dict()}
+        return cursor.lastrowid
+    try:
+        usuario_id = ejecutar_escritura(insertar)
     except sqlite3.IntegrityError:
-        conn.close()
         raise HTTPException(status_code=400, detail="El email ya está registrado")
+    return {**usuario.dict(), "id": usuario_id}
+
+@app.post("/usuarios/bulk")
+async def importar_usuarios(request: Request):
+    return await importar(
+        request, Usuario, "usuarios",
+        ["nombre", "email", "telefono", "direccion", "fecha_registro"],
+        lambda error: "El email ya está registrado",
+    )
 
 @app.put("/usuarios/{usuario_id}")
 def update_usuario(usuario_id: int, usuario: Usuario):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE usuarios SET nombre = ?, email = ?, telefono = ?, direccion = ?, fecha_registro = ? WHERE id = ?",
-        (usuario.nombre, usuario.email, usuario.telefono, usuario.direccion, usuario.fecha_registro, usuario_id)
-    )
-    conn.commit()
-    conn.close()
-    if cursor.rowcount == 0:
+    def actualizar(cursor):
+        cursor.execute(
+            "UPDATE usuarios SET nombre = ?, email = ?, telefono = ?, direccion = ?, fecha_registro = ? WHERE id = ?",
+            (usuario.nombre, usuario.email, usuario.telefono, usuario.direccion, usuario.fecha_registro, usuario_id)
+        )
+        return cursor.rowcount
+    try:
+        actualizados = ejecutar_escritura(actualizar)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="El email ya está registrado")
+    if actualizados == 0:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    return {"id": usuario_id, **usuario.dict()}
+    return {**usuario.dict(), "id": usuario_id}
 
 @app.delete("/usuarios/{usuario_id}")
 def delete_usuario(usuario_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM usuarios WHERE id = ?", (usuario_id,))
-    conn.commit()
-    conn.close()
-    if cursor.rowcount == 0:
+    def eliminar(cursor):
+        # El historial no tiene claves foráneas (puede estar en otro archivo)
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {TABLA_HISTORIAL} WHERE usuario_id = ?)", (usuario_id,))
+        if cursor.fetchone()[0]:
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        cursor.execute("DELETE FROM usuarios WHERE id = ?", (usuario_id,))
+        return cursor.rowcount
+    try:
+        eliminados = ejecutar_escritura(eliminar)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="El usuario tiene préstamos o reseñas asociados")
+    if eliminados == 0:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return {"message": "Usuario eliminado correctamente"}
 
 # ==================== ENDPOINTS PRÉSTAMOS ====================
 
 @app.get("/prestamos")
-def get_prestamos():
+def get_prestamos(
+    usuario_id: Optional[int] = None,
+    libro_id: Optional[int] = None,
+    devuelto: Optional[bool] = None,
+    incluir_historial: bool = False,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues: Optional[str] = Query(None, alias="cursor"),
+    campos: Optional[str] = Query(None, alias="fields"),
+):
+    # ?incluir_historial=true suma los préstamos archivados en el mismo orden
+    # y con el mismo cursor
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT p.*, l.titulo as libro_titulo, u.nombre as usuario_nombre, a.nombre as autor_nombre
+    try:
+        cursor = conn.cursor()
+        filas, siguiente = consulta_paginada(
+            cursor, SQL_PRESTAMOS, orden=ORDEN_PRESTAMOS,
+            filtros=[
+                ("p.usuario_id = ?", usuario_id),
+                ("p.libro_id = ?", libro_id),
+                ("p.devuelto = ?", devuelto),
+            ],
+            descendente=True, limite=limite, despues=despues, campos=parsear_campos(campos),
+            union=[SQL_PRESTAMOS_HISTORIAL] if incluir_historial else (),
+        )
+    finally:
+        conn.close()
+    return RespuestaJSON(filas, headers={ENCABEZADO_CURSOR: siguiente} if siguiente else None)
+
+@app.get("/prestamos/export")
+def exportar_prestamos(
+    formato: str = "csv",
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    gzip: bool = False,
+    incluir_historial: bool = False,
+):
+    where, params = rango_fechas("p.fecha_prestamo", desde, hasta)
+    sql = f"""
+        SELECT p.*, l.titulo as libro_titulo, u.nombre as usuario_nombre
         FROM prestamos p
         JOIN libros l ON p.libro_id = l.id
         JOIN usuarios u ON p.usuario_id = u.id
-        JOIN autores a ON l.autor_id = a.id
-        ORDER BY p.fecha_prestamo DESC
-    """)
-    prestamos = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return prestamos
+        {where}
+    """
+    if incluir_historial:
+        sql += f"""
+        UNION ALL
+        SELECT p.*, l.titulo as libro_titulo, u.nombre as usuario_nombre
+        FROM {TABLA_HISTORIAL} p
+        CROSS JOIN libros l ON p.libro_id = l.id
+        CROSS JOIN usuarios u ON p.usuario_id = u.id
+        {where}
+        ORDER BY fecha_prestamo, id
+        """
+        params = params * 2
+    else:
+        sql += "ORDER BY p.fecha_prestamo, p.id"
+    return exportar(sql, params, formato, "prestamos", gzip)
 
-@app.post("/prestamos")
-def create_prestamo(prestamo: Prestamo):
+def consultar_vencidos(filtros, fecha, limite, despues):
+    corte = fecha_de_corte(fecha)
     conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT disponible FROM libros WHERE id = ?", (prestamo.libro_id,))
-    libro = cursor.fetchone()
-    if not libro or not libro[0]:
+    try:
+        cursor = conn.cursor()
+        filas, siguiente = consulta_paginada(cursor, SQL_VENCIDOS,
+            orden=[("p.fecha_devolucion_esperada", "fecha_devolucion_esperada"), ("p.id", "id")],
+            filtros=[(CONDICION_VENCIDO, corte.isoformat()), *filtros],
+            limite=limite, despues=despues,
+        )
+        for fila in filas:
+            fila["dias_atraso"] = dias_de_atraso(fila["fecha_devolucion_esperada"], corte)
+    finally:
         conn.close()
-        raise HTTPException(status_code=400, detail="El libro no está disponible")
-    
-    cursor.execute(
-        "INSERT INTO prestamos (libro_id, usuario_id, fecha_prestamo, fecha_devolucion_esperada, fecha_devolucion_real, devuelto) VALUES (?, ?, ?, ?, ?, ?)",
-        (prestamo.libro_id, prestamo.usuario_id, prestamo.fecha_prestamo, prestamo.fecha_devolucion_esperada, prestamo.fecha_devolucion_real, prestamo.devuelto)
-    )
-    
-    cursor.execute("UPDATE libros SET disponible = 0 WHERE id = ?", (prestamo.libro_id,))
+    return RespuestaJSON(filas, headers={ENCABEZADO_CURSOR: siguiente} if siguiente else None)
+
+@app.get("/prestamos/vencidos")
+def get_prestamos_vencidos(
+    fecha: Optional[str] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues: Optional[str] = Query(None, alias="cursor"),
+):
+    # Los más atrasados primero; ?fecha=AAAA-MM-DD calcula el atraso a esa fecha
+    return consultar_vencidos([], fecha, limite, despues)
+
+@app.get("/prestamos/vencidos/usuario/{usuario_id}")
+def get_prestamos_vencidos_usuario(
+    usuario_id: int,
+    fecha: Optional[str] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues: Optional[str] = Query(None, alias="cursor"),
+):
+    return consultar_vencidos([("p.usuario_id = ?", usuario_id)], fecha, limite, despues)
+
+@app.get("/prestamos/vencidos/categoria/{categoria_id}")
+def get_prestamos_vencidos_categoria(
+    categoria_id: int,
+    fecha: Optional[str] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues: Optional[str] = Query(None, alias="cursor"),
+):
+    # El "+" impide usar idx_libros_categoria: conviene recorrer los vencidos
+    # en orden y descartar los de otras categorías que juntar todos los libros
+    # de la categoría y ordenar después.
+    return consultar_vencidos([("+l.categoria_id = ?", categoria_id)], fecha, limite, despues)
+
+@app.post("/prestamos")
+def create_prestamo(prestamo: Prestamo, tareas: BackgroundTasks):
+    def registrar(cursor):
+        # El libro se toma solo si sigue disponible: esta única sentencia
+        # decide qué préstamo gana cuando dos llegan a la vez.
+        cursor.execute(
+            "UPDATE libros SET disponible = 0 WHERE id = ? AND disponible = 1",
+            (prestamo.libro_id,)
+        )
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=400, detail="El libro no está disponible")
+        try:
+            cursor.execute(
+                "INSERT INTO prestamos (libro_id, usuario_id, fecha_prestamo, fecha_devolucion_esperada, fecha_devolucion_real, devuelto) VALUES (?, ?, ?, ?, ?, ?)",
+                (prestamo.libro_id, prestamo.usuario_id, prestamo.fecha_prestamo, prestamo.fecha_devolucion_esperada, prestamo.fecha_devolucion_real, prestamo.devuelto)
+            )
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=400, detail="El usuario no existe")
+        return cursor.lastrowid
     
-    conn.commit()
-    prestamo_id = cursor.lastrowid
-    conn.close()
-    return {"id": prestamo_id, **prestamo.dict()}
+    prestamo_id = ejecutar_escritura(registrar)
+    cache_respuestas.invalidar("libros")
+    # Las recomendaciones se actualizan fuera de la transacción del préstamo
+    tareas.add_task(registrar_prestamo, prestamo_id, prestamo.usuario_id, prestamo.libro_id)
+    return {**prestamo.dict(), "id": prestamo_id}
 
 @app.put("/prestamos/{prestamo_id}/devolver")
 def devolver_libro(prestamo_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT libro_id FROM prestamos WHERE id = ?", (prestamo_id,))
-    prestamo = cursor.fetchone()
-    if not prestamo:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Préstamo no encontrado")
-    
-    libro_id = prestamo[0]
     fecha_actual = datetime.now().strftime("%Y-%m-%d")
     
-    cursor.execute(
-        "UPDATE prestamos SET devuelto = 1, fecha_devolucion_real = ? WHERE id = ?",
-        (fecha_actual, prestamo_id)
-    )
-    
-    cursor.execute("UPDATE libros SET disponible = 1 WHERE id = ?", (libro_id,))
+    def devolver(cursor):
+        # Solo un préstamo activo puede devolverse; así una devolución repetida
+        # no libera un libro que ya volvió a prestarse.
+        cursor.execute(
+            "UPDATE prestamos SET devuelto = 1, fecha_devolucion_real = ? WHERE id = ? AND devuelto = 0",
+            (fecha_actual, prestamo_id)
+        )
+        if cursor.rowcount == 0:
+            # Un préstamo archivado ya fue devuelto
+            cursor.execute(
+                f"SELECT 1 FROM prestamos WHERE id = ? UNION ALL SELECT 1 FROM {TABLA_HISTORIAL} WHERE id = ?",
+                (prestamo_id, prestamo_id)
+            )
+            if cursor.fetchone() is None:
+                raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+            raise HTTPException(status_code=400, detail="El préstamo ya fue devuelto")
+        cursor.execute(
+            "UPDATE libros SET disponible = 1 WHERE id = (SELECT libro_id FROM prestamos WHERE id = ?)",
+            (prestamo_id,)
+        )
     
-    conn.commit()
-    conn.close()
+    ejecutar_escritura(devolver)
+    cache_respuestas.invalidar("libros")
     return {"message": "Libro devuelto correctamente"}
 
 @app.delete("/prestamos/{prestamo_id}")
 def delete_prestamo(prestamo_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT libro_id, devuelto FROM prestamos WHERE id = ?", (prestamo_id,))
-    prestamo = cursor.fetchone()
-    
-    if not prestamo:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Préstamo no encontrado")
-    
-    libro_id, devuelto = prestamo[0], prestamo[1]
-    
-    cursor.execute("DELETE FROM prestamos WHERE id = ?", (prestamo_id,))
-    
-    if not devuelto:
-        cursor.execute("UPDATE libros SET disponible = 1 WHERE id = ?", (libro_id,))
+    def eliminar(cursor):
+        cursor.execute("SELECT libro_id, devuelto FROM prestamos WHERE id = ?", (prestamo_id,))
+        prestamo = cursor.fetchone()
+        if not prestamo:
+            # Los archivados no tienen triggers: la baja se anota a mano en el registro
+            cursor.execute(f"DELETE FROM {TABLA_HISTORIAL} WHERE id = ?", (prestamo_id,))
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+            cursor.execute(
+                "INSERT INTO cambios (tabla, fila_id, operacion) VALUES ('prestamos', ?, 'delete')",
+                (prestamo_id,)
+            )
+            return
+        
+        libro_id, devuelto = prestamo[0], prestamo[1]
+        cursor.execute("DELETE FROM prestamos WHERE id = ?", (prestamo_id,))
+        if not devuelto:
+            cursor.execute("UPDATE libros SET disponible = 1 WHERE id = ?", (libro_id,))
     
-    conn.commit()
-    conn.close()
+    ejecutar_escritura(eliminar)
+    cache_respuestas.invalidar("libros")
     return {"message": "Préstamo eliminado correctamente"}
 
 # ==================== ENDPOINTS RESEÑAS ====================
 
 @app.get("/resenas")
-def get_resenas():
+def get_resenas(
+    libro_id: Optional[int] = None,
+    usuario_id: Optional[int] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues: Optional[str] = Query(None, alias="cursor"),
+    campos: Optional[str] = Query(None, alias="fields"),
+):
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
+    try:
+        cursor = conn.cursor()
+        filas, siguiente = consulta_paginada(
+            cursor, SQL_RESENAS, orden=ORDEN_RESENAS,
+            filtros=[
+                ("r.libro_id = ?", libro_id),
+                ("r.usuario_id = ?", usuario_id),
+            ],
+            descendente=True, limite=limite, despues=despues, campos=parsear_campos(campos),
+        )
+    finally:
+        conn.close()
+    return RespuestaJSON(filas, headers={ENCABEZADO_CURSOR: siguiente} if siguiente else None)
+
+@app.get("/resenas/export")
+def exportar_resenas(
+    formato: str = "csv",
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    gzip: bool = False,
+):
+    where, params = rango_fechas("r.fecha", desde, hasta)
+    return exportar(f"""
         SELECT r.*, l.titulo as libro_titulo, u.nombre as usuario_nombre
         FROM resenas r
         JOIN libros l ON r.libro_id = l.id
         JOIN usuarios u ON r.usuario_id = u.id
-        ORDER BY r.fecha DESC
-    """)
-    resenas = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return resenas
+        {where}
+        ORDER BY r.fecha, r.id
+    """, params, formato, "resenas", gzip)
 
 @app.get("/resenas/libro/{libro_id}")
 def get_resenas_libro(libro_id: int):
@@ -618,83 +851,288 @@ def get_resenas_libro(libro_id: int):
         WHERE r.libro_id = ?
         ORDER BY r.fecha DESC
     """, (libro_id,))
-    resenas = [dict(row) for row in cursor.fetchall()]
+    resenas = leer_dicts(cursor)
     conn.close()
-    return resenas
+    return RespuestaJSON(resenas)
 
 @app.post("/resenas")
 def create_resena(resena: Resena):
+    def insertar(cursor):
+        cursor.execute(
+            "INSERT INTO resenas (libro_id, usuario_id, calificacion, comentario, fecha) VALUES (?, ?, ?, ?, ?)",
+            (resena.libro_id, resena.usuario_id, resena.calificacion, resena.comentario, resena.fecha)
+        )
+        return cursor.lastrowid
+    try:
+        resena_id = ejecutar_escritura(insertar)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="El libro o el usuario no existen")
+    return {**resena.dict(), "id": resena_id}
+
+@app.put("/resenas/{resena_id}")
+def update_resena(resena_id: int, resena: Resena):
+    def actualizar(cursor):
+        cursor.execute(
+            "UPDATE resenas SET libro_id = ?, usuario_id = ?, calificacion = ?, comentario = ?, fecha = ? WHERE id = ?",
+            (resena.libro_id, resena.usuario_id, resena.calificacion, resena.comentario, resena.fecha, resena_id)
+        )
+        return cursor.rowcount
+    try:
+        actualizados = ejecutar_escritura(actualizar)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="El libro o el usuario no existen")
+    if actualizados == 0:
+        raise HTTPException(status_code=404, detail="Reseña no encontrada")
+    return {**resena.dict(), "id": resena_id}
+
+@app.delete("/resenas/{resena_id}")
+def delete_resena(resena_id: int):
+    def eliminar(cursor):
+        cursor.execute("DELETE FROM resenas WHERE id = ?", (resena_id,))
+        return cursor.rowcount
+    eliminados = ejecutar_escritura(eliminar)
+    if eliminados == 0:
+        raise HTTPException(status_code=404, detail="Reseña no encontrada")
+    return {"message": "Reseña eliminada correctamente"}
+
+# ==================== CALIFICACIONES ====================
+# Agregados por libro mantenidos por triggers en la misma transacción que
+# crea, modifica o elimina cada reseña (ver migraciones.py).
+
+def calificacion_de(fila):
+    return {
+        "libro_id": fila["libro_id"],
+        "cantidad": fila["cantidad"] or 0,
+        "suma": fila["suma"] or 0,
+        "promedio": round(fila["promedio"], 2) if fila["promedio"] is not None else None,
+        "histograma": {str(n): fila[f"estrellas_{n}"] or 0 for n in range(1, 6)},
+    }
+
+@app.get("/libros/top")
+def get_libros_top(
+    categoria_id: Optional[int] = None,
+    min_resenas: int = Query(1, ge=1),
+    limite: int = Query(20, ge=1, le=100),
+):
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO resenas (libro_id, usuario_id, calificacion, comentario, fecha) VALUES (?, ?, ?, ?, ?)",
-        (resena.libro_id, resena.usuario_id, resena.calificacion, resena.comentario, resena.fecha)
-    )
-    conn.commit()
-    resena_id = cursor.lastrowid
+    filtro_categoria = "c.categoria_id = ? AND " if categoria_id is not None else ""
+    params = ([categoria_id] if categoria_id is not None else []) + [min_resenas, limite]
+    # CROSS JOIN fija calificaciones como tabla externa: se recorre en orden de
+    # ranking y se corta en LIMIT. Con estadísticas de ANALYZE el planificador
+    # prefería recorrer libros y ordenar todo en un árbol temporal.
+    cursor.execute(f"""
+        SELECT c.*, l.titulo, a.nombre as autor_nombre
+        FROM calificaciones c
+        CROSS JOIN libros l ON c.libro_id = l.id
+        JOIN autores a ON l.autor_id = a.id
+        WHERE {filtro_categoria}c.cantidad >= ?
+        ORDER BY c.promedio DESC, c.cantidad DESC, c.libro_id
+        LIMIT ?
+    """, params)
+    libros = [
+        {**calificacion_de(row), "titulo": row["titulo"], "autor_nombre": row["autor_nombre"]}
+        for row in cursor.fetchall()
+    ]
     conn.close()
-    return {"id": resena_id, **resena.dict()}
+    return libros
 
-@app.put("/resenas/{resena_id}")
-def update_resena(resena_id: int, resena: Resena):
+@app.get("/libros/{libro_id}/rating")
+def get_rating_libro(libro_id: int):
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE resenas SET libro_id = ?, usuario_id = ?, calificacion = ?, comentario = ?, fecha = ? WHERE id = ?",
-        (resena.libro_id, resena.usuario_id, resena.calificacion, resena.comentario, resena.fecha, resena_id)
-    )
-    conn.commit()
+    cursor.execute("""
+        SELECT l.id as libro_id, c.cantidad, c.suma, c.promedio,
+               c.estrellas_1, c.estrellas_2, c.estrellas_3, c.estrellas_4, c.estrellas_5
+        FROM libros l
+        LEFT JOIN calificaciones c ON c.libro_id = l.id
+        WHERE l.id = ?
+    """, (libro_id,))
+    fila = cursor.fetchone()
     conn.close()
-    if cursor.rowcount == 0:
-        raise HTTPException(status_code=404, detail="Reseña no encontrada")
-    return {"id": resena_id, **resena.dict()}
+    if fila is None:
+        raise HTTPException(status_code=404, detail="Libro no encontrado")
+    return calificacion_de(fila)
 
-@app.delete("/resenas/{resena_id}")
-def delete_resena(resena_id: int):
+# ==================== RECOMENDACIONES ====================
+
+@app.get("/libros/{libro_id}/recomendaciones")
+def get_recomendaciones(
+    libro_id: int,
+    categoria_id: Optional[int] = None,
+    disponible: Optional[bool] = None,
+    limite: int = Query(10, ge=1, le=VECINOS),
+):
+    filtros = ""
+    params = [libro_id]
+    if categoria_id is not None:
+        filtros += " AND l.categoria_id = ?"
+        params.append(categoria_id)
+    if disponible is not None:
+        filtros += " AND l.disponible = ?"
+        params.append(int(disponible))
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM resenas WHERE id = ?", (resena_id,))
-    conn.commit()
+    # Los filtros se aplican sobre los VECINOS guardados del libro
+    cursor.execute(f"""
+        SELECT l.*, a.nombre as autor_nombre, c.nombre as categoria_nombre,
+               r.usuarios as usuarios_en_comun
+        FROM coprestamos r
+        CROSS JOIN libros l ON r.otro_id = l.id
+        JOIN autores a ON l.autor_id = a.id
+        JOIN categorias c ON l.categoria_id = c.id
+        WHERE r.libro_id = ?{filtros}
+        ORDER BY r.usuarios DESC, r.ultimo DESC, r.otro_id
+        LIMIT ?
+    """, params + [limite])
+    libros = leer_dicts(cursor)
+    if not libros:
+        cursor.execute("SELECT 1 FROM libros WHERE id = ?", (libro_id,))
+        if cursor.fetchone() is None:
+            conn.close()
+            raise HTTPException(status_code=404, detail="Libro no encontrado")
     conn.close()
-    if cursor.rowcount == 0:
-        raise HTTPException(status_code=404, detail="Reseña no encontrada")
-    return {"message": "Reseña eliminada correctamente"}
+    return libros
+
+# ==================== BÚSQUEDA ====================
+
+def consulta_fts(texto):
+    """Convierte el texto del usuario en una consulta FTS5 segura.
+
+    Cada palabra se busca como prefijo ("cole" encuentra "cólera") y todas
+    deben aparecer. Las comillas se descartan para no romper la sintaxis.
+    """
+    terminos = texto.replace('"', " ").split()
+    return " ".join(f'"{termino}"*' for termino in terminos)
+
+@app.get("/buscar")
+def buscar(q: str = Query(..., min_length=1), limite: int = Query(20, ge=1, le=100)):
+    consulta = consulta_fts(q)
+    if not consulta:
+        return []
+    conn = get_db()
+    cursor = conn.cursor()
+    # bm25 con más peso al título, luego autor, categoría e ISBN
+    cursor.execute("""
+        SELECT l.*, a.nombre as autor_nombre, c.nombre as categoria_nombre
+        FROM libros_fts f
+        JOIN libros l ON l.id = f.rowid
+        JOIN autores a ON l.autor_id = a.id
+        JOIN categorias c ON l.categoria_id = c.id
+        WHERE libros_fts MATCH ?
+        ORDER BY bm25(libros_fts, 10.0, 5.0, 2.0, 1.0)
+        LIMIT ?
+    """, (consulta, limite))
+    libros = leer_dicts(cursor)
+    conn.close()
+    return RespuestaJSON(libros)
+
+@app.get("/autocompletar")
+def autocompletar(
+    q: str = Query(..., min_length=1),
+    tipo: str = "libros",
+    limite: int = Query(LIMITE_AUTOCOMPLETADO, ge=1, le=LIMITE_MAXIMO_AUTOCOMPLETADO),
+):
+    # Prefijos de palabras en memoria (ver autocompletado.py), sin consultar las tablas
+    if tipo not in autocompletado.indices:
+        raise HTTPException(status_code=400, detail=f"Tipo inválido; disponibles: {', '.join(autocompletado.indices)}")
+    return RespuestaJSON(autocompletado.buscar(tipo, q, limite))
 
 # ==================== ESTADÍSTICAS ====================
 
 @app.get("/estadisticas")
 def get_estadisticas():
+    # Contadores mantenidos por triggers (ver migraciones.py): una sola lectura
+    # por clave primaria en lugar de un COUNT(*) por tabla.
     conn = get_db()
     cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM libros")
-    total_libros = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM autores")
-    total_autores = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM usuarios")
-    total_usuarios = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM prestamos WHERE devuelto = 0")
-    prestamos_activos = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM categorias")
-    total_categorias = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM resenas")
-    total_resenas = cursor.fetchone()[0]
-    
+    cursor.execute(SQL_ESTADISTICAS)
+    estadisticas = dict(cursor.fetchone())
     conn.close()
-    
-    return {
-        "total_libros": total_libros,
-        "total_autores": total_autores,
-        "total_usuarios": total_usuarios,
-        "prestamos_activos": prestamos_activos,
-        "total_categorias": total_categorias,
-        "total_resenas": total_resenas
-    }
+    return estadisticas
+
+# ==================== BOOTSTRAP ====================
+
+LISTADOS_BOOTSTRAP = (
+    ("autores", SQL_AUTORES, ORDEN_AUTORES, False),
+    ("libros", SQL_LIBROS, ORDEN_LIBROS, False),
+    ("usuarios", SQL_USUARIOS, ORDEN_USUARIOS, False),
+    ("prestamos", SQL_PRESTAMOS, ORDEN_PRESTAMOS, True),
+    ("resenas", SQL_RESENAS, ORDEN_RESENAS, True),
+)
+
+# Filas de la primera página de cada listado
+LIMITE_BOOTSTRAP = 100
+
+@app.get("/bootstrap")
+def get_bootstrap(limite: int = Query(LIMITE_BOOTSTRAP, ge=1, le=LIMITE_MAXIMO)):
+    # Todo lo que la interfaz carga al abrirse, en una respuesta y con una sola
+    # conexión. Las consultas comparten una transacción de lectura, así los
+    # listados y los contadores corresponden al mismo instante. "seq" es el
+    # cursor para seguir al día con GET /cambios. De cada listado va solo la
+    # primera página; "cursores" tiene el cursor de la siguiente para pedirla
+    # al listado individual (None si no hay más).
+    conn = get_db()
+    try:
+        with transaccion_lectura(conn) as cursor:
+            datos = {"seq": ultimo_seq(cursor), "cursores": {}}
+            cursor.execute(SQL_CATEGORIAS)
+            datos["categorias"] = leer_dicts(cursor)
+            for nombre, sql, orden, descendente in LISTADOS_BOOTSTRAP:
+                datos[nombre], datos["cursores"][nombre] = consulta_paginada(
+                    cursor, sql, orden=orden, descendente=descendente, limite=limite)
+            cursor.execute(SQL_ESTADISTICAS)
+            datos["estadisticas"] = leer_dicts(cursor)[0]
+    finally:
+        conn.close()
+    return RespuestaJSON(datos)
+
+# ==================== CAMBIOS ====================
+
+@app.get("/cambios")
+def get_cambios(
+    desde: int = Query(..., ge=0),
+    limite: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO_CAMBIOS),
+):
+    conn = get_db()
+    try:
+        with transaccion_lectura(conn) as cursor:
+            datos = leer_cambios(cursor, desde, limite, CONSULTAS_CAMBIOS)
+            if datos["cambios"]:
+                cursor.execute(SQL_ESTADISTICAS)
+                datos["estadisticas"] = leer_dicts(cursor)[0]
+    finally:
+        conn.close()
+    return RespuestaJSON(datos)
+
+# ==================== EVENTOS ====================
+
+@app.get("/eventos")
+async def get_eventos(request: Request):
+    # EventSource reenvía el id del último evento recibido al reconectar
+    try:
+        ultimo_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        ultimo_id = None
+    return StreamingResponse(
+        difusor.flujo(ultimo_id), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ==================== MÉTRICAS ====================
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/slow-queries")
+def get_consultas_lentas():
+    return consultas_lentas.listar()
+
+@app.delete("/debug/slow-queries")
+def limpiar_consultas_lentas():
+    consultas_lentas.limpiar()
+    return {"message": "Registro de consultas lentas vaciado"}
 
 @app.get("/")
 def root():
@@ -0,0 +1,148 @@
+# ==================== MANTENIMIENTO ====================
+# Tareas de mantenimiento y reparación que se ejecutan a mano o desde cron.
+#
+# Uso:
+#   python mantenimiento.py reconstruir-estadisticas
+#   python mantenimiento.py reconstruir-calificaciones
+#   python mantenimiento.py avisos-vencidos --salida avisos.csv
+#   python mantenimiento.py compactar-cambios --dias 7
+#   python mantenimiento.py reconstruir-recomendaciones
+#   python mantenimiento.py archivar-prestamos --dias 180
+
+import argparse
+import csv
+import json
+import sys
+from datetime import date
+
+import cambios
+import historial
+import recomendaciones
+from database import conectar
+from migraciones import (
+    aplicar_migraciones, SQL_RECONSTRUIR_CALIFICACIONES, SQL_RECONSTRUIR_ESTADISTICAS,
+)
+from vencidos import resumen_vencidos
+
+
+def reconstruir_estadisticas(conn):
+    """Recalcula los contadores de /estadisticas a partir de las tablas.
+
+    Los triggers los mantienen exactos; esto solo hace falta si alguien
+    modificó la base con los triggers desactivados o restauró una copia.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(SQL_RECONSTRUIR_ESTADISTICAS)
+    conn.commit()
+    return dict(conn.execute("SELECT * FROM estadisticas WHERE id = 1").fetchone())
+
+
+def cmd_reconstruir_estadisticas(conn, args):
+    for clave, valor in reconstruir_estadisticas(conn).items():
+        if clave != "id":
+            print(f"{clave}: {valor}")
+
+
+def reconstruir_calificaciones(conn):
+    """Recalcula los agregados de calificaciones de todos los libros."""
+    conn.execute("BEGIN IMMEDIATE")
+    for sentencia in SQL_RECONSTRUIR_CALIFICACIONES:
+        conn.execute(sentencia)
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM calificaciones").fetchone()[0]
+
+
+def cmd_reconstruir_calificaciones(conn, args):
+    print(f"libros con calificaciones: {reconstruir_calificaciones(conn)}")
+
+
+def cmd_avisos_vencidos(conn, args):
+    """Un registro por usuario con préstamos vencidos, listo para enviar avisos.
+
+    Se calcula con una sola consulta agrupada sobre el índice parcial de
+    préstamos activos, no con una consulta por usuario.
+    """
+    corte = args.fecha or date.today()
+    salida = open(args.salida, "w", newline="", encoding="utf-8") if args.salida else sys.stdout
+    try:
+        escritor = None
+        usuarios = 0
+        for resumen in resumen_vencidos(conn, corte):
+            if args.formato == "ndjson":
+                salida.write(json.dumps(resumen, ensure_ascii=False) + "\n")
+            else:
+                if escritor is None:
+                    escritor = csv.DictWriter(salida, fieldnames=list(resumen))
+                    escritor.writeheader()
+                escritor.writerow(resumen)
+            usuarios += 1
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+    print(f"{usuarios} usuarios con préstamos vencidos al {corte.isoformat()}", file=sys.stderr)
+
+
+def cmd_compactar_cambios(conn, args):
+    resultado = cambios.compactar(conn, args.dias)
+    print(f"entradas reemplazadas: {resultado['reemplazadas']}")
+    print(f"entradas de más de {args.dias} días: {resultado['vencidas']}")
+
+
+def cmd_reconstruir_recomendaciones(conn, args):
+    pares, segundos = recomendaciones.reconstruir(conn, args.ventana, args.vecinos)
+    metodo = "NumPy" if recomendaciones.np is not None else "SQL"
+    print(f"pares guardados: {pares} ({metodo}, {segundos:.1f} s)")
+
+
+def cmd_archivar_prestamos(conn, args):
+    movidos, segundos, espera_max = historial.archivar(conn, args.dias, args.lote, args.pausa)
+    print(f"préstamos archivados: {movidos} en {historial.TABLA_HISTORIAL} ({segundos:.1f} s)")
+    print(f"transacción más larga: {espera_max * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tareas de mantenimiento de la biblioteca")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser(
+        "reconstruir-estadisticas", help="recalcula los contadores de /estadisticas"
+    ).set_defaults(func=cmd_reconstruir_estadisticas)
+    sub.add_parser(
+        "reconstruir-calificaciones", help="recalcula los agregados de calificaciones por libro"
+    ).set_defaults(func=cmd_reconstruir_calificaciones)
+    avisos = sub.add_parser("avisos-vencidos", help="resumen de préstamos vencidos por usuario")
+    avisos.add_argument("--fecha", type=date.fromisoformat, help="fecha de corte AAAA-MM-DD (por defecto hoy)")
+    avisos.add_argument("--formato", choices=("csv", "ndjson"), default="csv")
+    avisos.add_argument("--salida", help="archivo de salida (por defecto la salida estándar)")
+    avisos.set_defaults(func=cmd_avisos_vencidos)
+    compactacion = sub.add_parser("compactar-cambios", help="acota el registro de cambios de GET /cambios")
+    compactacion.add_argument("--dias", type=int, default=cambios.RETENCION_DIAS,
+                              help="retención; los clientes más atrasados deben volver a cargar todo")
+    compactacion.set_defaults(func=cmd_compactar_cambios)
+    reconstruccion = sub.add_parser(
+        "reconstruir-recomendaciones", help="recalcula los préstamos en común de /libros/{id}/recomendaciones"
+    )
+    reconstruccion.add_argument("--ventana", type=int, default=recomendaciones.VENTANA,
+                                help="libros anteriores de cada usuario con los que se forma un par")
+    reconstruccion.add_argument("--vecinos", type=int, default=recomendaciones.VECINOS,
+                                help="pares guardados por libro")
+    reconstruccion.set_defaults(func=cmd_reconstruir_recomendaciones)
+    archivo = sub.add_parser("archivar-prestamos", help="mueve los préstamos devueltos viejos al historial")
+    archivo.add_argument("--dias", type=int, default=historial.DIAS_ARCHIVO,
+                         help="se archivan los devueltos hace más de estos días")
+    archivo.add_argument("--lote", type=int, default=historial.LOTE_ARCHIVO,
+                         help="préstamos movidos por transacción")
+    archivo.add_argument("--pausa", type=float, default=historial.PAUSA_ARCHIVO,
+                         help="pausa entre lotes, como múltiplo de lo que duró el lote")
+    archivo.set_defaults(func=cmd_archivar_prestamos)
+
+    args = parser.parse_args(argv)
+    conn = conectar()
+    try:
+        aplicar_migraciones(conn)
+        args.func(conn, args)
+    finally:
+        conn.cerrar_definitivamente()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# ==================== MÉTRICAS ====================
+# Métricas de la API en formato de texto de Prometheus (GET /metrics).
+#
+# Cada hilo acumula sus propias series en un diccionario local, así registrar
+# una observación no toma ningún lock: solo un bisect y dos sumas. Al pedir
+# /metrics se suman los diccionarios de todos los hilos. Los hilos que
+# terminaron (el threadpool de AnyIO descarta los inactivos) se pliegan en un
+# acumulado común para que la lista no crezca sin límite.
+
+import bisect
+import re
+import threading
+import time
+from functools import lru_cache
+
+# Límites superiores (en segundos) de los buckets de los histogramas
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# nombre -> (tipo, ayuda, nombres de etiquetas)
+METRICAS = {
+    "biblioteca_http_duracion_segundos": (
+        "histogram", "Latencia de las peticiones HTTP por ruta", ("metodo", "ruta")),
+    "biblioteca_http_respuestas_total": (
+        "counter", "Respuestas HTTP por ruta y código de estado", ("metodo", "ruta", "estado")),
+    "biblioteca_http_respuesta_bytes_total": (
+        "counter", "Bytes enviados en el cuerpo de las respuestas", ("metodo", "ruta")),
+    "biblioteca_db_consulta_segundos": (
+        "histogram", "Tiempo de ejecución de las sentencias SQL (incluye fetch)", ("operacion", "tabla")),
+    "biblioteca_db_filas_total": (
+        "counter", "Filas devueltas por las consultas", ("operacion", "tabla")),
+    "biblioteca_db_espera_bloqueo_segundos": (
+        "histogram", "Espera hasta obtener el bloqueo de escritura (BEGIN IMMEDIATE)", ()),
+    "biblioteca_admision_limite": (
+        "gauge", "Peticiones en curso admitidas a la vez", ("clase",)),
+    "biblioteca_admision_activas": (
+        "gauge", "Peticiones en curso", ("clase",)),
+    "biblioteca_admision_en_cola": (
+        "gauge", "Peticiones esperando lugar", ("clase",)),
+    "biblioteca_admision_espera_segundos": (
+        "histogram", "Espera en la cola de admisión de las peticiones aceptadas", ("clase",)),
+    "biblioteca_admision_rechazos_total": (
+        "counter", "Peticiones rechazadas con 503", ("clase", "motivo")),
+}
+
+
+class Registro:
+    def __init__(self):
+        self._local = threading.local()
+        self._almacenes = []  # (hilo, series)
+        self._retirados = {}
+        self._medidores = {}
+        self._lock = threading.Lock()
+
+    def _series(self):
+        try:
+            return self._local.series
+        except AttributeError:
+            series = self._local.series = {}
+            with self._lock:
+                self._almacenes.append((threading.current_thread(), series))
+            return series
+
+    def observar(self, nombre, etiquetas, valor):
+        series = self._series()
+        clave = (nombre, etiquetas)
+        serie = series.get(clave)
+        if serie is None:
+            # Un contador por bucket, más el bucket +Inf, la suma y la cantidad
+            serie = series[clave] = [0] * (len(BUCKETS) + 3)
+        serie[bisect.bisect_left(BUCKETS, valor)] += 1
+        serie[-2] += valor
+        serie[-1] += 1
+
+    def incrementar(self, nombre, etiquetas, valor=1):
+        series = self._series()
+        clave = (nombre, etiquetas)
+        series[clave] = series.get(clave, 0) + valor
+
+    def medidor(self, nombre, leer):
+        """Gauge cuyo valor se lee al exportar: `leer()` devuelve una lista
+        de (etiquetas, valor)."""
+        self._medidores[nombre] = leer
+
+    @staticmethod
+    def _sumar(destino, series):
+        # list() copia el diccionario de forma atómica aunque su hilo siga escribiendo
+        for clave, serie in list(series.items()):
+            if isinstance(serie, list):
+                acumulada = destino.setdefault(clave, [0] * len(serie))
+                for i, valor in enumerate(serie):
+                    acumulada[i] += valor
+            else:
+                destino[clave] = destino.get(clave, 0) + serie
+
+    def combinar(self):
+        with self._lock:
+            vivos = []
+            for hilo, series in self._almacenes:
+                if hilo.is_alive():
+                    vivos.append((hilo, series))
+                else:
+                    self._sumar(self._retirados, series)
+            self._almacenes = vivos
+            total = {}
+            self._sumar(total, self._retirados)
+            for _, series in vivos:
+                self._sumar(total, series)
+        return total
+
+    def exportar(self):
+        """Todas las series en formato de texto de Prometheus."""
+        por_nombre = {}
+        for (nombre, etiquetas), serie in self.combinar().items():
+            por_nombre.setdefault(nombre, []).append((etiquetas, serie))
+        for nombre, leer in list(self._medidores.items()):
+            por_nombre[nombre] = leer()
+
+        lineas = []
+        for nombre, (tipo, ayuda, nombres_etiquetas) in METRICAS.items():
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, serie in sorted(por_nombre.get(nombre, ())):
+                base = [f'{k}="{escapar(v)}"' for k, v in zip(nombres_etiquetas, etiquetas)]
+                if tipo in ("counter", "gauge"):
+                    lineas.append(f"{nombre}{formatear_etiquetas(base)} {serie}")
+                    continue
+                acumulado = 0
+                for limite, cantidad in zip(BUCKETS + ("+Inf",), serie):
+                    acumulado += cantidad
+                    le = f'le="{limite}"'
+                    lineas.append(f"{nombre}_bucket{formatear_etiquetas(base + [le])} {acumulado}")
+                lineas.append(f"{nombre}_sum{formatear_etiquetas(base)} {serie[-2]}")
+                lineas.append(f"{nombre}_count{formatear_etiquetas(base)} {serie[-1]}")
+        return "\n".join(lineas) + "\n"
+
+
+def escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def formatear_etiquetas(pares):
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+registro = Registro()
+
+
+# ==================== CONSULTAS ====================
+
+OPERACIONES_CON_TABLA = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE"}
+PATRON_TABLA = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def clasificar_sql(sql):
+    """(operacion, tabla principal) de una sentencia, para las etiquetas."""
+    palabras = sql.split(None, 1)
+    operacion = palabras[0].upper() if palabras else ""
+    # En DDL (CREATE TRIGGER ... UPDATE OF ...) la "tabla" no tendría sentido
+    tabla = PATRON_TABLA.search(sql) if operacion in OPERACIONES_CON_TABLA else None
+    return operacion, tabla.group(1) if tabla else ""
+
+
+def observar_consulta(sql, segundos, filas=0):
+    etiquetas = clasificar_sql(sql)
+    registro.observar("biblioteca_db_consulta_segundos", etiquetas, segundos)
+    if filas:
+        registro.incrementar("biblioteca_db_filas_total", etiquetas, filas)
+
+
+def observar_espera_bloqueo(segundos):
+    registro.observar("biblioteca_db_espera_bloqueo_segundos", (), segundos)
+
+
+# ==================== HTTP ====================
+
+class MiddlewareMetricas:
+    """Middleware ASGI que mide cada petición por plantilla de ruta.
+
+    La plantilla (por ejemplo /prestamos/{prestamo_id}/devolver) se obtiene
+    del endpoint que el router dejó en el scope; las rutas inexistentes se
+    agrupan como "sin_ruta" para no crear una serie por cada URL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._plantillas = None
+
+    def plantilla(self, scope):
+        if self._plantillas is None:
+            self._plantillas = {
+                getattr(ruta, "endpoint", None) or getattr(ruta, "app", None): ruta.path
+                for ruta in scope["app"].routes
+            }
+        return self._plantillas.get(scope.get("endpoint"), "sin_ruta")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        estado = [500, 0]  # código, bytes del cuerpo
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            elif mensaje["type"] == "http.response.body":
+                estado[1] += len(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            etiquetas = (scope["method"], self.plantilla(scope))
+            registro.observar("biblioteca_http_duracion_segundos", etiquetas, time.perf_counter() - inicio)
+            registro.incrementar("biblioteca_http_respuestas_total", etiquetas + (str(estado[0]),))
+            registro.incrementar("biblioteca_http_respuesta_bytes_total", etiquetas, estado[1])
@@ -0,0 +1,692 @@
+# ==================== MIGRACIONES ====================
+# Esquema versionado con PRAGMA user_version.
+#
+# Cada migración es una lista de sentencias SQL que se aplica en su propia
+# transacción junto con el nuevo número de versión, así una base existente
+# (biblioteca.db) evoluciona en el lugar sin perder datos. Para cambiar el
+# esquema se AGREGA una migración al final de MIGRACIONES; nunca se editan
+# las ya publicadas.
+#
+# Uso:
+#   python migraciones.py              aplica las migraciones pendientes
+#   python migraciones.py --verificar  además comprueba los planes de consulta
+
+import re
+import sys
+
+# Recalcula la fila de estadísticas desde cero (migración 6 y reparaciones)
+SQL_RECONSTRUIR_ESTADISTICAS = '''
+    INSERT OR REPLACE INTO estadisticas (
+        id, total_libros, total_autores, total_usuarios,
+        prestamos_activos, total_categorias, total_resenas
+    )
+    SELECT 1,
+        (SELECT COUNT(*) FROM libros),
+        (SELECT COUNT(*) FROM autores),
+        (SELECT COUNT(*) FROM usuarios),
+        (SELECT COUNT(*) FROM prestamos WHERE devuelto = 0),
+        (SELECT COUNT(*) FROM categorias),
+        (SELECT COUNT(*) FROM resenas)
+'''
+
+# Recalcula los agregados de calificaciones por libro (migración 7 y reparaciones)
+SQL_RECONSTRUIR_CALIFICACIONES = [
+    "DELETE FROM calificaciones",
+    '''
+    INSERT INTO calificaciones (
+        libro_id, categoria_id, cantidad, suma, promedio,
+        estrellas_1, estrellas_2, estrellas_3, estrellas_4, estrellas_5
+    )
+    SELECT r.libro_id, l.categoria_id, COUNT(*), SUM(r.calificacion), AVG(r.calificacion),
+        SUM(r.calificacion = 1), SUM(r.calificacion = 2), SUM(r.calificacion = 3),
+        SUM(r.calificacion = 4), SUM(r.calificacion = 5)
+    FROM resenas r
+    JOIN libros l ON r.libro_id = l.id
+    GROUP BY r.libro_id
+    ''',
+]
+
+
+def sql_reconstruir_coprestamos(ventana, vecinos, origen="prestamos"):
+    """Sentencias que recalculan coprestamos desde cero (migración 11 y reparaciones).
+
+    Cada usuario aporta un par por cada libro y los `ventana` libros distintos
+    que empezó a leer justo antes. De cada libro se guardan los `vecinos`
+    pares con más usuarios en común. `origen` es la tabla o subconsulta de
+    préstamos (con el historial archivado, ver historial.py).
+    """
+    return [
+        "DELETE FROM coprestamos",
+        # Libros distintos de cada usuario, numerados por su primer préstamo
+        "DROP TABLE IF EXISTS temp.lecturas",
+        f"""
+        CREATE TEMP TABLE lecturas AS
+        SELECT usuario_id, libro_id, MIN(id) AS primero,
+            ROW_NUMBER() OVER (PARTITION BY usuario_id ORDER BY MIN(id)) AS orden
+        FROM {origen}
+        GROUP BY usuario_id, libro_id
+        """,
+        "CREATE INDEX temp.idx_lecturas ON lecturas (usuario_id, orden)",
+        f"""
+        INSERT INTO coprestamos (libro_id, otro_id, usuarios, ultimo)
+        SELECT libro_id, otro_id, usuarios, ultimo FROM (
+            SELECT libro_id, otro_id, COUNT(*) AS usuarios, MAX(primero) AS ultimo,
+                ROW_NUMBER() OVER (
+                    PARTITION BY libro_id ORDER BY COUNT(*) DESC, MAX(primero) DESC, otro_id
+                ) AS puesto
+            FROM (
+                SELECT a.libro_id, b.libro_id AS otro_id, a.primero FROM lecturas a
+                JOIN lecturas b ON b.usuario_id = a.usuario_id
+                    AND b.orden BETWEEN a.orden - {ventana} AND a.orden - 1
+                UNION ALL
+                SELECT b.libro_id, a.libro_id, a.primero FROM lecturas a
+                JOIN lecturas b ON b.usuario_id = a.usuario_id
+                    AND b.orden BETWEEN a.orden - {ventana} AND a.orden - 1
+            )
+            GROUP BY libro_id, otro_id
+        )
+        WHERE puesto <= {vecinos}
+        ORDER BY libro_id, otro_id
+        """,
+        "DROP TABLE temp.lecturas",
+    ]
+
+
+def sql_crear_historial(esquema="main"):
+    """Tabla de préstamos archivados (migración 12, o la del archivo aparte
+    de BIBLIOTECA_HISTORIAL_DB). Mismas columnas y en el mismo orden que
+    prestamos, para combinarlas con UNION ALL. Sin claves foráneas: no
+    pueden apuntar a otro archivo."""
+    return [
+        f'''
+        CREATE TABLE IF NOT EXISTS {esquema}.prestamos_historial (
+            id INTEGER PRIMARY KEY,
+            libro_id INTEGER NOT NULL,
+            usuario_id INTEGER NOT NULL,
+            fecha_prestamo TEXT NOT NULL,
+            fecha_devolucion_esperada TEXT NOT NULL,
+            fecha_devolucion_real TEXT,
+            devuelto BOOLEAN DEFAULT 0
+        )
+        ''',
+        f"CREATE INDEX IF NOT EXISTS {esquema}.idx_historial_fecha ON prestamos_historial (fecha_prestamo)",
+        f"CREATE INDEX IF NOT EXISTS {esquema}.idx_historial_usuario_libro ON prestamos_historial (usuario_id, libro_id)",
+        f"CREATE INDEX IF NOT EXISTS {esquema}.idx_historial_libro ON prestamos_historial (libro_id)",
+    ]
+
+
+def _sumar_calificacion(fila):
+    """Sentencias de trigger que suman la reseña `fila` (NEW) a su libro."""
+    return f'''
+            INSERT OR IGNORE INTO calificaciones (libro_id, categoria_id)
+            SELECT id, categoria_id FROM libros WHERE id = {fila}.libro_id;
+            UPDATE calificaciones SET
+                cantidad = cantidad + 1,
+                suma = suma + {fila}.calificacion,
+                promedio = (suma + {fila}.calificacion) * 1.0 / (cantidad + 1),
+                estrellas_1 = estrellas_1 + ({fila}.calificacion = 1),
+                estrellas_2 = estrellas_2 + ({fila}.calificacion = 2),
+                estrellas_3 = estrellas_3 + ({fila}.calificacion = 3),
+                estrellas_4 = estrellas_4 + ({fila}.calificacion = 4),
+                estrellas_5 = estrellas_5 + ({fila}.calificacion = 5)
+            WHERE libro_id = {fila}.libro_id;
+    '''
+
+
+def _restar_calificacion(fila):
+    """Sentencias de trigger que quitan la reseña `fila` (OLD) de su libro."""
+    return f'''
+            UPDATE calificaciones SET
+                cantidad = cantidad - 1,
+                suma = suma - {fila}.calificacion,
+                promedio = CASE WHEN cantidad > 1
+                    THEN (suma - {fila}.calificacion) * 1.0 / (cantidad - 1) END,
+                estrellas_1 = estrellas_1 - ({fila}.calificacion = 1),
+                estrellas_2 = estrellas_2 - ({fila}.calificacion = 2),
+                estrellas_3 = estrellas_3 - ({fila}.calificacion = 3),
+                estrellas_4 = estrellas_4 - ({fila}.calificacion = 4),
+                estrellas_5 = estrellas_5 - ({fila}.calificacion = 5)
+            WHERE libro_id = {fila}.libro_id;
+            DELETE FROM calificaciones WHERE libro_id = {fila}.libro_id AND cantidad = 0;
+    '''
+
+
+def _triggers_contador(tabla, columna):
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {tabla}_estadisticas_insert AFTER INSERT ON {tabla} BEGIN
+            UPDATE estadisticas SET {columna} = {columna} + 1 WHERE id = 1;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {tabla}_estadisticas_delete AFTER DELETE ON {tabla} BEGIN
+            UPDATE estadisticas SET {columna} = {columna} - 1 WHERE id = 1;
+        END
+        ''',
+    ]
+
+
+def _triggers_version_cache(tabla, recursos):
+    lista = ", ".join(f"'{recurso}'" for recurso in recursos)
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {tabla}_version_cache_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+            UPDATE versiones_cache SET version = version + 1 WHERE recurso IN ({lista});
+        END
+        '''
+        for evento in ("INSERT", "UPDATE", "DELETE")
+    ]
+
+
+TABLAS_REGISTRADAS = ("categorias", "autores", "libros", "usuarios", "prestamos", "resenas")
+
+
+def _triggers_cambios(tabla):
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {tabla}_cambios_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+            INSERT INTO cambios (tabla, fila_id, operacion) VALUES ('{tabla}', {fila}.id, '{operacion}');
+        END
+        '''
+        for evento, fila, operacion in (
+            ("INSERT", "NEW", "upsert"), ("UPDATE", "NEW", "upsert"), ("DELETE", "OLD", "delete"),
+        )
+    ]
+
+
+def _trigger_cambios_derivados(nombre, tabla, columnas, consultas):
+    """Registra como modificadas las filas de otros listados que muestran una
+    columna de `tabla` (por ejemplo el título del libro en cada préstamo)."""
+    condicion = " OR ".join(f"OLD.{columna} IS NOT NEW.{columna}" for columna in columnas)
+    inserciones = "\n            ".join(
+        f"INSERT INTO cambios (tabla, fila_id, operacion) SELECT '{destino}', id, 'upsert' FROM ({select});"
+        for destino, select in consultas
+    )
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS {nombre} AFTER UPDATE OF {", ".join(columnas)} ON {tabla}
+        WHEN {condicion} BEGIN
+            {inserciones}
+        END
+        '''
+
+
+MIGRACIONES = [
+    ("Esquema inicial: 6 tablas", [
+        '''
+        CREATE TABLE IF NOT EXISTS categorias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL UNIQUE,
+            descripcion TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS autores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            nacionalidad TEXT NOT NULL,
+            fecha_nacimiento TEXT NOT NULL,
+            biografia TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS libros (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            autor_id INTEGER NOT NULL,
+            categoria_id INTEGER NOT NULL,
+            isbn TEXT NOT NULL UNIQUE,
+            año_publicacion INTEGER NOT NULL,
+            paginas INTEGER NOT NULL,
+            disponible BOOLEAN DEFAULT 1,
+            FOREIGN KEY (autor_id) REFERENCES autores (id),
+            FOREIGN KEY (categoria_id) REFERENCES categorias (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            email TEXT NOT NULL UNIQUE,
+            telefono TEXT NOT NULL,
+            direccion TEXT NOT NULL,
+            fecha_registro TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS prestamos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            libro_id INTEGER NOT NULL,
+            usuario_id INTEGER NOT NULL,
+            fecha_prestamo TEXT NOT NULL,
+            fecha_devolucion_esperada TEXT NOT NULL,
+            fecha_devolucion_real TEXT,
+            devuelto BOOLEAN DEFAULT 0,
+            FOREIGN KEY (libro_id) REFERENCES libros (id),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS resenas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            libro_id INTEGER NOT NULL,
+            usuario_id INTEGER NOT NULL,
+            calificacion INTEGER NOT NULL CHECK(calificacion >= 1 AND calificacion <= 5),
+            comentario TEXT NOT NULL,
+            fecha TEXT NOT NULL,
+            FOREIGN KEY (libro_id) REFERENCES libros (id),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+        ''',
+    ]),
+
+    ("Índice de búsqueda FTS5 del catálogo", [
+        # rowid = libros.id; remove_diacritics permite buscar sin acentos
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS libros_fts USING fts5(
+            titulo, autor, categoria, isbn,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS libros_fts_insert AFTER INSERT ON libros BEGIN
+            INSERT INTO libros_fts (rowid, titulo, autor, categoria, isbn)
+            SELECT NEW.id, NEW.titulo,
+                   (SELECT nombre FROM autores WHERE id = NEW.autor_id),
+                   (SELECT nombre FROM categorias WHERE id = NEW.categoria_id),
+                   NEW.isbn;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS libros_fts_update
+        AFTER UPDATE OF titulo, autor_id, categoria_id, isbn ON libros BEGIN
+            DELETE FROM libros_fts WHERE rowid = OLD.id;
+            INSERT INTO libros_fts (rowid, titulo, autor, categoria, isbn)
+            SELECT NEW.id, NEW.titulo,
+                   (SELECT nombre FROM autores WHERE id = NEW.autor_id),
+                   (SELECT nombre FROM categorias WHERE id = NEW.categoria_id),
+                   NEW.isbn;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS libros_fts_delete AFTER DELETE ON libros BEGIN
+            DELETE FROM libros_fts WHERE rowid = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS autores_fts_update AFTER UPDATE OF nombre ON autores BEGIN
+            UPDATE libros_fts SET autor = NEW.nombre
+            WHERE rowid IN (SELECT id FROM libros WHERE autor_id = NEW.id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS categorias_fts_update AFTER UPDATE OF nombre ON categorias BEGIN
+            UPDATE libros_fts SET categoria = NEW.nombre
+            WHERE rowid IN (SELECT id FROM libros WHERE categoria_id = NEW.id);
+        END
+        ''',
+        # Cargar el índice con los libros que ya existían
+        '''
+        INSERT INTO libros_fts (rowid, titulo, autor, categoria, isbn)
+        SELECT l.id, l.titulo, a.nombre, c.nombre, l.isbn
+        FROM libros l
+        LEFT JOIN autores a ON l.autor_id = a.id
+        LEFT JOIN categorias c ON l.categoria_id = c.id
+        WHERE NOT EXISTS (SELECT 1 FROM libros_fts)
+        ''',
+    ]),
+
+    ("Índices de orden para la paginación", [
+        "CREATE INDEX IF NOT EXISTS idx_libros_titulo ON libros (titulo)",
+        "CREATE INDEX IF NOT EXISTS idx_autores_nombre ON autores (nombre)",
+        "CREATE INDEX IF NOT EXISTS idx_usuarios_nombre ON usuarios (nombre)",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_fecha ON prestamos (fecha_prestamo)",
+        "CREATE INDEX IF NOT EXISTS idx_resenas_fecha ON resenas (fecha)",
+    ]),
+
+    ("Índices de claves foráneas", [
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_libro ON prestamos (libro_id)",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_usuario ON prestamos (usuario_id)",
+        "CREATE INDEX IF NOT EXISTS idx_resenas_libro_fecha ON resenas (libro_id, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_resenas_usuario ON resenas (usuario_id)",
+        "CREATE INDEX IF NOT EXISTS idx_libros_autor ON libros (autor_id)",
+        "CREATE INDEX IF NOT EXISTS idx_libros_categoria ON libros (categoria_id)",
+    ]),
+
+    ("Índice parcial de préstamos activos", [
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_activos ON prestamos (libro_id) WHERE devuelto = 0",
+    ]),
+
+    ("Contadores de estadísticas mantenidos por triggers", [
+        '''
+        CREATE TABLE IF NOT EXISTS estadisticas (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_libros INTEGER NOT NULL,
+            total_autores INTEGER NOT NULL,
+            total_usuarios INTEGER NOT NULL,
+            prestamos_activos INTEGER NOT NULL,
+            total_categorias INTEGER NOT NULL,
+            total_resenas INTEGER NOT NULL
+        )
+        ''',
+        SQL_RECONSTRUIR_ESTADISTICAS,
+        *_triggers_contador("libros", "total_libros"),
+        *_triggers_contador("autores", "total_autores"),
+        *_triggers_contador("usuarios", "total_usuarios"),
+        *_triggers_contador("categorias", "total_categorias"),
+        *_triggers_contador("resenas", "total_resenas"),
+        # Préstamos activos: cuentan solo los que tienen devuelto = 0
+        '''
+        CREATE TRIGGER IF NOT EXISTS prestamos_estadisticas_insert AFTER INSERT ON prestamos BEGIN
+            UPDATE estadisticas
+            SET prestamos_activos = prestamos_activos + (CASE WHEN NEW.devuelto = 0 THEN 1 ELSE 0 END)
+            WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS prestamos_estadisticas_update AFTER UPDATE OF devuelto ON prestamos BEGIN
+            UPDATE estadisticas
+            SET prestamos_activos = prestamos_activos
+                + (CASE WHEN NEW.devuelto = 0 THEN 1 ELSE 0 END)
+                - (CASE WHEN OLD.devuelto = 0 THEN 1 ELSE 0 END)
+            WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS prestamos_estadisticas_delete AFTER DELETE ON prestamos BEGIN
+            UPDATE estadisticas
+            SET prestamos_activos = prestamos_activos - (CASE WHEN OLD.devuelto = 0 THEN 1 ELSE 0 END)
+            WHERE id = 1;
+        END
+        ''',
+    ]),
+
+    # Agregados por libro para GET /libros/{id}/rating y /libros/top: leerlos
+    # cuesta lo mismo sin importar cuántas reseñas tenga el libro. categoria_id
+    # se copia de libros para que el ranking por categoría use un índice.
+    ("Calificaciones por libro mantenidas por triggers", [
+        '''
+        CREATE TABLE IF NOT EXISTS calificaciones (
+            libro_id INTEGER PRIMARY KEY,
+            categoria_id INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            suma INTEGER NOT NULL DEFAULT 0,
+            promedio REAL,
+            estrellas_1 INTEGER NOT NULL DEFAULT 0,
+            estrellas_2 INTEGER NOT NULL DEFAULT 0,
+            estrellas_3 INTEGER NOT NULL DEFAULT 0,
+            estrellas_4 INTEGER NOT NULL DEFAULT 0,
+            estrellas_5 INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_calificaciones_ranking ON calificaciones (promedio DESC, cantidad DESC, libro_id)",
+        "CREATE INDEX IF NOT EXISTS idx_calificaciones_categoria ON calificaciones (categoria_id, promedio DESC, cantidad DESC, libro_id)",
+        *SQL_RECONSTRUIR_CALIFICACIONES,
+        f'''
+        CREATE TRIGGER IF NOT EXISTS resenas_calificaciones_insert AFTER INSERT ON resenas BEGIN
+            {_sumar_calificacion("NEW")}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS resenas_calificaciones_update
+        AFTER UPDATE OF libro_id, calificacion ON resenas BEGIN
+            {_restar_calificacion("OLD")}
+            {_sumar_calificacion("NEW")}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS resenas_calificaciones_delete AFTER DELETE ON resenas BEGIN
+            {_restar_calificacion("OLD")}
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS libros_calificaciones_categoria
+        AFTER UPDATE OF categoria_id ON libros BEGIN
+            UPDATE calificaciones SET categoria_id = NEW.categoria_id WHERE libro_id = NEW.id;
+        END
+        ''',
+    ]),
+
+    # Solo contienen préstamos activos: no crecen con el historial
+    ("Índices parciales de préstamos vencidos", [
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_vencimiento ON prestamos (fecha_devolucion_esperada) WHERE devuelto = 0",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_vencimiento_usuario ON prestamos (usuario_id, fecha_devolucion_esperada) WHERE devuelto = 0",
+    ]),
+
+    # Versión de cada recurso cacheado, compartida por todos los procesos: con
+    # varios workers, la invalidación en memoria de uno no llega a los demás,
+    # así que cache.py compara su entrada con esta versión. Los listados de
+    # libros incluyen nombres de autor y categoría, por eso esos cambios
+    # también cambian la versión de libros.
+    ("Versiones de recursos para la caché entre procesos", [
+        '''
+        CREATE TABLE IF NOT EXISTS versiones_cache (
+            recurso TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO versiones_cache (recurso) VALUES ('categorias'), ('autores'), ('libros')",
+        *_triggers_version_cache("categorias", ("categorias", "libros")),
+        *_triggers_version_cache("autores", ("autores", "libros")),
+        *_triggers_version_cache("libros", ("libros",)),
+    ]),
+
+    # Registro de cambios para GET /cambios: cada alta, modificación o baja de
+    # las seis tablas agrega una fila con un número de secuencia creciente
+    # (AUTOINCREMENT: no se reutiliza aunque se compacte). Los listados
+    # incluyen columnas de otras tablas (nombre del autor, título del libro,
+    # nombre del usuario), así que cambiar una de esas columnas también marca
+    # las filas que la muestran.
+    ("Registro de cambios para sincronización incremental", [
+        '''
+        CREATE TABLE IF NOT EXISTS cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            fila_id INTEGER NOT NULL,
+            operacion TEXT NOT NULL CHECK (operacion IN ('upsert', 'delete')),
+            fecha TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Los clientes con un cursor anterior al horizonte deben resincronizar
+        '''
+        CREATE TABLE IF NOT EXISTS cambios_horizonte (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        )
+        ''',
+        "INSERT OR IGNORE INTO cambios_horizonte (id, seq) VALUES (1, 0)",
+        *[trigger for tabla in TABLAS_REGISTRADAS for trigger in _triggers_cambios(tabla)],
+        _trigger_cambios_derivados("categorias_cambios_libros", "categorias", ("nombre",), [
+            ("libros", "SELECT id FROM libros WHERE categoria_id = NEW.id"),
+        ]),
+        _trigger_cambios_derivados("autores_cambios_derivados", "autores", ("nombre",), [
+            ("libros", "SELECT id FROM libros WHERE autor_id = NEW.id"),
+            ("prestamos", "SELECT p.id FROM prestamos p JOIN libros l ON p.libro_id = l.id WHERE l.autor_id = NEW.id"),
+        ]),
+        _trigger_cambios_derivados("libros_cambios_derivados", "libros", ("titulo", "autor_id"), [
+            ("prestamos", "SELECT id FROM prestamos WHERE libro_id = NEW.id"),
+            ("resenas", "SELECT id FROM resenas WHERE libro_id = NEW.id"),
+        ]),
+        _trigger_cambios_derivados("usuarios_cambios_derivados", "usuarios", ("nombre",), [
+            ("prestamos", "SELECT id FROM prestamos WHERE usuario_id = NEW.id"),
+            ("resenas", "SELECT id FROM resenas WHERE usuario_id = NEW.id"),
+        ]),
+    ]),
+
+    # "Quienes pidieron este libro también pidieron": de cada libro, los
+    # libros que más usuarios leyeron cerca de él en su historial. Se guardan
+    # solo los mejores de cada libro (ver recomendaciones.py). `ultimo` es el
+    # préstamo que sumó el par por última vez y desempata a favor de lo reciente.
+    ("Préstamos en común entre libros para recomendaciones", [
+        '''
+        CREATE TABLE IF NOT EXISTS coprestamos (
+            libro_id INTEGER NOT NULL,
+            otro_id INTEGER NOT NULL,
+            usuarios INTEGER NOT NULL,
+            ultimo INTEGER NOT NULL,
+            PRIMARY KEY (libro_id, otro_id)
+        ) WITHOUT ROWID
+        ''',
+        # Primer préstamo de un libro por un usuario y sus libros anteriores
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_usuario_libro ON prestamos (usuario_id, libro_id)",
+        *sql_reconstruir_coprestamos(ventana=20, vecinos=50),
+    ]),
+
+    # Préstamos devueltos hace tiempo, movidos fuera de la tabla caliente por
+    # historial.archivar(). Conservan su id: AUTOINCREMENT no lo reutiliza.
+    ("Historial de préstamos archivados", sql_crear_historial()),
+]
+
+VERSION_ACTUAL = len(MIGRACIONES)
+
+
+def version_esquema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migraciones(conn):
+    """Aplica las migraciones pendientes y devuelve la versión resultante.
+
+    Cada migración toma el bloqueo de escritura (BEGIN IMMEDIATE) y vuelve a
+    leer la versión, así dos procesos que arrancan a la vez no la aplican dos
+    veces.
+    """
+    while version_esquema(conn) < VERSION_ACTUAL:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = version_esquema(conn)
+            if version >= VERSION_ACTUAL:
+                conn.rollback()
+                break
+            _, sentencias = MIGRACIONES[version]
+            for sentencia in sentencias:
+                conn.execute(sentencia)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return version_esquema(conn)
+
+
+# ==================== PLANES DE CONSULTA ====================
+# Consultas de los caminos calientes que no deben volver a recorrer tablas
+# completas. verificar_planes() falla si alguna usa un SCAN sin índice o
+# necesita ordenar en un árbol temporal.
+
+CONSULTAS_VIGILADAS = {
+    "listado de préstamos": ("""
+        SELECT p.*, l.titulo, u.nombre, a.nombre
+        FROM prestamos p
+        JOIN libros l ON p.libro_id = l.id
+        JOIN usuarios u ON p.usuario_id = u.id
+        JOIN autores a ON l.autor_id = a.id
+        ORDER BY p.fecha_prestamo DESC, p.id DESC
+        LIMIT 50
+    """, ()),
+    "listado de préstamos con historial": ("""
+        SELECT p.*, l.titulo, u.nombre FROM prestamos p
+        JOIN libros l ON p.libro_id = l.id
+        JOIN usuarios u ON p.usuario_id = u.id
+        UNION ALL
+        SELECT p.*, l.titulo, u.nombre FROM prestamos_historial p
+        CROSS JOIN libros l ON p.libro_id = l.id
+        CROSS JOIN usuarios u ON p.usuario_id = u.id
+        ORDER BY fecha_prestamo DESC, id DESC
+        LIMIT 50
+    """, ()),
+    "préstamos de un usuario": (
+        "SELECT * FROM prestamos WHERE usuario_id = ?", (1,)),
+    "préstamos de un libro": (
+        "SELECT * FROM prestamos WHERE libro_id = ?", (1,)),
+    "reseñas de un libro": ("""
+        SELECT r.*, u.nombre
+        FROM resenas r
+        JOIN usuarios u ON r.usuario_id = u.id
+        WHERE r.libro_id = ?
+        ORDER BY r.fecha DESC
+    """, (1,)),
+    "listado de libros": ("""
+        SELECT l.*, a.nombre, c.nombre
+        FROM libros l
+        JOIN autores a ON l.autor_id = a.id
+        JOIN categorias c ON l.categoria_id = c.id
+        ORDER BY l.titulo, l.id
+        LIMIT 50
+    """, ()),
+    "préstamos activos": (
+        "SELECT COUNT(*) FROM prestamos WHERE devuelto = 0", ()),
+    # CROSS JOIN como en GET /libros/top: recorrer el índice de ranking
+    "libros mejor calificados": ("""
+        SELECT c.*, l.titulo FROM calificaciones c
+        CROSS JOIN libros l ON c.libro_id = l.id
+        WHERE c.cantidad >= ?
+        ORDER BY c.promedio DESC, c.cantidad DESC, c.libro_id
+        LIMIT 20
+    """, (5,)),
+    "libros mejor calificados de una categoría": ("""
+        SELECT c.*, l.titulo FROM calificaciones c
+        CROSS JOIN libros l ON c.libro_id = l.id
+        WHERE c.categoria_id = ? AND c.cantidad >= ?
+        ORDER BY c.promedio DESC, c.cantidad DESC, c.libro_id
+        LIMIT 20
+    """, (1, 5)),
+    "préstamos vencidos": ("""
+        SELECT p.*, l.titulo, u.nombre FROM prestamos p
+        JOIN libros l ON p.libro_id = l.id
+        JOIN usuarios u ON p.usuario_id = u.id
+        WHERE p.devuelto = 0 AND p.fecha_devolucion_esperada < ?
+        ORDER BY p.fecha_devolucion_esperada, p.id
+        LIMIT 50
+    """, ("2024-11-15",)),
+    "préstamos vencidos de un usuario": ("""
+        SELECT p.* FROM prestamos p
+        WHERE p.devuelto = 0 AND p.fecha_devolucion_esperada < ? AND p.usuario_id = ?
+        ORDER BY p.fecha_devolucion_esperada, p.id
+        LIMIT 50
+    """, ("2024-11-15", 1)),
+    "préstamos vencidos de una categoría": ("""
+        SELECT p.* FROM prestamos p
+        JOIN libros l ON p.libro_id = l.id
+        WHERE p.devuelto = 0 AND p.fecha_devolucion_esperada < ? AND +l.categoria_id = ?
+        ORDER BY p.fecha_devolucion_esperada, p.id
+        LIMIT 50
+    """, ("2024-11-15", 1)),
+    "cambios desde un cursor": (
+        "SELECT seq, tabla, fila_id, operacion FROM cambios WHERE seq > ? ORDER BY seq LIMIT 1000", (0,)),
+}
+
+_SCAN_COMPLETO = re.compile(r"^SCAN \w+$")
+
+
+def problemas_de_plan(conn, sql, params=()):
+    problemas = []
+    for fila in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        detalle = fila[3]
+        if _SCAN_COMPLETO.match(detalle) or "USE TEMP B-TREE FOR ORDER BY" in detalle:
+            problemas.append(detalle)
+    return problemas
+
+
+def verificar_planes(conn):
+    """Devuelve {consulta: [pasos problemáticos]} para las consultas vigiladas."""
+    resultado = {}
+    for nombre, (sql, params) in CONSULTAS_VIGILADAS.items():
+        problemas = problemas_de_plan(conn, sql, params)
+        if problemas:
+            resultado[nombre] = problemas
+    return resultado
+
+
+if __name__ == "__main__":
+    from database import conectar
+
+    conn = conectar()
+    print(f"Esquema en versión {aplicar_migraciones(conn)}")
+    if "--verificar" in sys.argv:
+        fallas = verificar_planes(conn)
+        for nombre, problemas in fallas.items():
+            print(f"FALLA {nombre}: {'; '.join(problemas)}")
+        if fallas:
+            sys.exit(1)
+        print(f"{len(CONSULTAS_VIGILADAS)} planes de consulta verificados")
+    conn.cerrar_definitivamente()
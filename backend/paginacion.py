@@ -0,0 +1,93 @@
+# ==================== PAGINACIÓN POR CURSOR ====================
+# Paginación keyset: en lugar de OFFSET, cada página continúa a partir de los
+# valores de orden de la última fila entregada, por lo que el costo de una
+# página no depende de qué tan lejos se haya avanzado.
+#
+# El cursor es opaco para el cliente: los valores de orden de la última fila
+# codificados en JSON + base64. Se devuelve en el encabezado
+# X-Siguiente-Cursor y se envía de vuelta como ?cursor=...
+
+import base64
+import json
+
+from fastapi import HTTPException
+
+from serializacion import proyectar
+
+ENCABEZADO_CURSOR = "X-Siguiente-Cursor"
+LIMITE_MAXIMO = 1000
+
+
+def codificar_cursor(valores):
+    datos = json.dumps(valores, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip("=")
+
+
+def decodificar_cursor(token, cantidad):
+    try:
+        relleno = "=" * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(valores, list) or len(valores) != cantidad:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return valores
+
+
+def consulta_paginada(cursor, select, orden, filtros=(), descendente=False,
+                      limite=None, despues=None, campos=None, union=()):
+    """Ejecuta `select` agregando filtros, condición de cursor, orden y límite.
+
+    - `orden`: lista de (columna SQL, clave en la fila), el último debe ser único.
+    - `filtros`: lista de (condición SQL con un "?", valor); los filtros con
+      valor None se ignoran.
+    - `campos`: columnas a devolver (ver serializacion.parsear_campos); el
+      cursor se arma igual aunque las columnas de orden no estén entre ellas.
+    - `union`: otros SELECT con las mismas columnas (el historial de
+      préstamos). Cada uno recibe los mismos filtros y condición de cursor y
+      se combinan con UNION ALL ordenado por las claves, que deben ser
+      nombres de columnas del resultado. Con un índice por el orden en cada
+      tabla, SQLite las recorre a la vez y se detiene al llegar al límite.
+
+    Devuelve (filas, siguiente_cursor), con las filas como dicts listos para
+    serializar. siguiente_cursor es None en la última página o cuando no se
+    pidió límite.
+    """
+    condiciones, valores = [], []
+    for condicion, valor in filtros:
+        if valor is not None:
+            condiciones.append(condicion)
+            valores.append(valor)
+
+    columnas = ", ".join(columna for columna, _ in orden)
+    if despues:
+        marcadores = ", ".join("?" for _ in orden)
+        operador = "<" if descendente else ">"
+        condiciones.append(f"({columnas}) {operador} ({marcadores})")
+        valores.extend(decodificar_cursor(despues, len(orden)))
+
+    donde = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+    direccion = " DESC" if descendente else ""
+    if union:
+        sql = " UNION ALL ".join(parte + donde for parte in (select, *union))
+        sql += " ORDER BY " + ", ".join(clave + direccion for _, clave in orden)
+        valores = valores * (len(union) + 1)
+    else:
+        sql = select + donde
+        sql += " ORDER BY " + ", ".join(columna + direccion for columna, _ in orden)
+    if limite:
+        # Se pide una fila de más para saber si existe una página siguiente
+        sql += " LIMIT ?"
+        valores.append(limite + 1)
+
+    cursor.row_factory = None
+    cursor.execute(sql, valores)
+    filas = cursor.fetchall()
+    columnas = [columna[0] for columna in cursor.description]
+
+    siguiente = None
+    if limite and len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = codificar_cursor([ultima[columnas.index(clave)] for _, clave in orden])
+    return proyectar(columnas, filas, campos), siguiente
@@ -0,0 +1,166 @@
+# ==================== RECOMENDACIONES ====================
+# "Quienes pidieron este libro también pidieron", a partir del historial de
+# préstamos.
+#
+# Para cada usuario, sus libros distintos se ordenan por el primer préstamo
+# de cada uno, y cada libro forma un par con los VENTANA anteriores. La
+# tabla coprestamos cuenta cuántos usuarios tienen cada par. Sin la ventana,
+# un lector con miles de libros aportaría millones de pares sin relación
+# entre sí. De cada libro se guardan solo los VECINOS pares más frecuentes,
+# así que GET /libros/{id}/recomendaciones es una lectura de a lo sumo
+# VECINOS filas, sin importar cuántos préstamos haya.
+#
+# Cada préstamo nuevo suma sus pares después de confirmado, en una
+# transacción aparte y ya enviada la respuesta (registrar_prestamo): el
+# préstamo no espera ni retiene el bloqueo de escritura por esto. Si el
+# proceso cae en el medio, ese préstamo no suma sus pares. Un par que quedó
+# fuera de los VECINOS de un libro pierde su cuenta, y si vuelve a aparecer
+# empieza de nuevo en 1. Los préstamos eliminados no se restan.
+# reconstruir() recalcula todo exacto desde el historial, con NumPy si está
+# instalado y si no con SQL. Los préstamos archivados (ver historial.py)
+# siguen contando: todas las consultas leen prestamos y prestamos_historial
+# juntos.
+
+import time
+
+try:
+    import numpy as np
+except ImportError:  # dependencia opcional: sin ella se reconstruye con SQL
+    np = None
+
+from database import ejecutar_escritura, get_db, transaccion_lectura
+from historial import PRESTAMOS_Y_HISTORIAL
+from migraciones import sql_reconstruir_coprestamos
+
+VENTANA = 20
+VECINOS = 50
+
+SQL_SUMAR_PAR = """
+    INSERT INTO coprestamos (libro_id, otro_id, usuarios, ultimo) VALUES (?, ?, 1, ?)
+    ON CONFLICT (libro_id, otro_id) DO UPDATE SET usuarios = usuarios + 1, ultimo = excluded.ultimo
+"""
+
+SQL_RECORTAR = """
+    DELETE FROM coprestamos WHERE libro_id = ? AND otro_id NOT IN (
+        SELECT otro_id FROM coprestamos WHERE libro_id = ?
+        ORDER BY usuarios DESC, ultimo DESC, otro_id
+        LIMIT ?
+    )
+"""
+
+
+def registrar_prestamo(prestamo_id, usuario_id, libro_id, ventana=VENTANA, vecinos=VECINOS):
+    """Suma a coprestamos los pares de un préstamo ya confirmado."""
+    conn = get_db()
+    try:
+        # Las lecturas, las más caras para quien pidió muchos libros, van
+        # fuera del bloqueo de escritura
+        with transaccion_lectura(conn) as cursor:
+            # Solo cuenta la primera vez que el usuario pide el libro
+            cursor.execute(
+                f"SELECT 1 FROM {PRESTAMOS_Y_HISTORIAL} WHERE usuario_id = ? AND libro_id = ? AND id < ? LIMIT 1",
+                (usuario_id, libro_id, prestamo_id),
+            )
+            if cursor.fetchone() is not None:
+                return
+            cursor.execute(f"""
+                SELECT libro_id FROM {PRESTAMOS_Y_HISTORIAL}
+                WHERE usuario_id = ? AND id < ?
+                GROUP BY libro_id
+                ORDER BY MIN(id) DESC
+                LIMIT ?
+            """, (usuario_id, prestamo_id, ventana))
+            anteriores = [fila[0] for fila in cursor.fetchall()]
+    finally:
+        conn.close()
+    if not anteriores:
+        return
+
+    def sumar(cursor):
+        cursor.executemany(SQL_SUMAR_PAR, [
+            par for otro_id in anteriores
+            for par in ((libro_id, otro_id, prestamo_id), (otro_id, libro_id, prestamo_id))
+        ])
+        cursor.executemany(SQL_RECORTAR, [(id_, id_, vecinos) for id_ in [libro_id, *anteriores]])
+    ejecutar_escritura(sumar)
+
+
+def _bits(valores):
+    return int(valores.max()).bit_length()
+
+
+def pares_numpy(conn, ventana, vecinos):
+    """Filas (libro_id, otro_id, usuarios, ultimo) de coprestamos, en orden de clave."""
+    lecturas = np.array(conn.execute(f"""
+        SELECT usuario_id, libro_id, MIN(id) FROM {PRESTAMOS_Y_HISTORIAL}
+        GROUP BY usuario_id, libro_id
+    """).fetchall(), dtype=np.int64).reshape(-1, 3)
+    usuarios, libros, primeros = lecturas[np.lexsort((lecturas[:, 2], lecturas[:, 0]))].T
+
+    # Cada libro con el que está `d` lugares antes en la lista del mismo usuario
+    a, b, cuando = [], [], []
+    for d in range(1, ventana + 1):
+        mismo_usuario = usuarios[d:] == usuarios[:-d]
+        a.append(libros[d:][mismo_usuario])
+        b.append(libros[:-d][mismo_usuario])
+        cuando.append(primeros[d:][mismo_usuario])
+    libro = np.concatenate(a + b)
+    otro = np.concatenate(b + a)
+    cuando = np.concatenate(cuando * 2)
+    if libro.size == 0:
+        return []
+
+    # Agrupar por par. Con la clave y `cuando` en un solo entero, np.sort
+    # sobre los valores es varias veces más rápido que argsort + reordenar
+    base = int(otro.max()) + 1
+    clave = libro * base + otro
+    bits_cuando = _bits(cuando)
+    if _bits(clave) + bits_cuando <= 63:
+        empaquetado = np.sort((clave << bits_cuando) | cuando)
+        clave, cuando = empaquetado >> bits_cuando, empaquetado & ((1 << bits_cuando) - 1)
+    else:
+        orden = np.argsort(clave)
+        clave, cuando = clave[orden], cuando[orden]
+    inicios = np.flatnonzero(np.r_[True, clave[1:] != clave[:-1]])
+    cuenta = np.diff(np.r_[inicios, clave.size])
+    ultimo = np.maximum.reduceat(cuando, inicios)
+    libro, otro = np.divmod(clave[inicios], base)
+
+    # Puesto de cada par dentro de su libro: más usuarios, más reciente y
+    # menor otro_id, que ya viene en orden y el ordenamiento estable conserva
+    bits_cuenta, bits_ultimo = _bits(cuenta), _bits(ultimo)
+    if _bits(libro) + bits_cuenta + bits_ultimo <= 63:
+        criterio = ((libro << (bits_cuenta + bits_ultimo))
+                    | ((int(cuenta.max()) - cuenta) << bits_ultimo) | (int(ultimo.max()) - ultimo))
+        ranking = np.argsort(criterio, kind="stable")
+    else:
+        ranking = np.lexsort((otro, -ultimo, -cuenta, libro))
+    inicio_libro = np.flatnonzero(np.r_[True, libro[ranking][1:] != libro[ranking][:-1]])
+    puesto = np.arange(ranking.size) - np.repeat(inicio_libro, np.diff(np.r_[inicio_libro, ranking.size]))
+    elegidos = np.zeros(ranking.size, dtype=bool)
+    elegidos[ranking[puesto < vecinos]] = True
+    return zip(libro[elegidos].tolist(), otro[elegidos].tolist(),
+               cuenta[elegidos].tolist(), ultimo[elegidos].tolist())
+
+
+def reconstruir(conn, ventana=VENTANA, vecinos=VECINOS):
+    """Recalcula coprestamos desde el historial y devuelve (pares, segundos)."""
+    inicio = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if np is not None:
+            # Las filas salen ordenadas por clave: se insertan al final del árbol
+            filas = pares_numpy(conn, ventana, vecinos)
+            conn.execute("DELETE FROM coprestamos")
+            conn.executemany(
+                "INSERT INTO coprestamos (libro_id, otro_id, usuarios, ultimo) VALUES (?, ?, ?, ?)", filas
+            )
+        else:
+            for sentencia in sql_reconstruir_coprestamos(ventana, vecinos, PRESTAMOS_Y_HISTORIAL):
+                conn.execute(sentencia)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    pares = conn.execute("SELECT COUNT(*) FROM coprestamos").fetchone()[0]
+    return pares, time.perf_counter() - inicio
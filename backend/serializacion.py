@@ -0,0 +1,74 @@
+# ==================== SERIALIZACIÓN JSON ====================
+# Camino rápido de filas de SQLite a cuerpo JSON para los listados.
+#
+# Por defecto cada fila pasaba por sqlite3.Row -> dict -> jsonable_encoder ->
+# json.dumps. Aquí las filas se leen como tuplas (sin crear un sqlite3.Row por
+# fila), se arman los dicts en un solo paso con los nombres de columna y la
+# respuesta se devuelve ya serializada, por lo que FastAPI no vuelve a
+# recorrerla con jsonable_encoder. Si orjson está instalado se usa para
+# serializar; si no, json de la biblioteca estándar con el mismo formato.
+#
+# Los listados aceptan ?fields=id,titulo: solo esas columnas pasan a los dicts
+# y al JSON.
+
+import json
+from operator import itemgetter
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+
+def a_json(datos):
+    if orjson is not None:
+        return orjson.dumps(datos)
+    return json.dumps(datos, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class RespuestaJSON(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return a_json(content)
+
+
+def parsear_campos(texto):
+    """?fields=id,titulo -> ("id", "titulo"); sin valor -> None (todas las columnas)."""
+    if not texto:
+        return None
+    campos = tuple(dict.fromkeys(campo.strip() for campo in texto.split(",") if campo.strip()))
+    return campos or None
+
+
+def proyectar(columnas, filas, campos=None):
+    """Tuplas -> dicts con todas las columnas o solo las de `campos`."""
+    if campos is None:
+        return [dict(zip(columnas, fila)) for fila in filas]
+    desconocidos = [campo for campo in campos if campo not in columnas]
+    if desconocidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(columnas)}",
+        )
+    indices = [columnas.index(campo) for campo in campos]
+    if len(indices) == 1:
+        # itemgetter con un solo índice devuelve el valor, no una tupla
+        campo, indice = campos[0], indices[0]
+        return [{campo: fila[indice]} for fila in filas]
+    obtener = itemgetter(*indices)
+    return [dict(zip(campos, obtener(fila))) for fila in filas]
+
+
+def filas_como_dicts(cursor, filas, campos=None):
+    """Convierte tuplas (cursor con row_factory = None) en dicts por columna."""
+    return proyectar([columna[0] for columna in cursor.description], filas, campos)
+
+
+def leer_dicts(cursor, campos=None):
+    """fetchall() del cursor como lista de dicts, sin pasar por sqlite3.Row."""
+    cursor.row_factory = None
+    return filas_como_dicts(cursor, cursor.fetchall(), campos)
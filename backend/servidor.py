@@ -0,0 +1,64 @@
+# ==================== SERVIDOR CON VARIOS WORKERS ====================
+# Arranque de la API con varios procesos de uvicorn sobre la misma base.
+#
+# Uso:
+#   python servidor.py --host 0.0.0.0 --port 8000 --workers 4
+#
+# Antes de crear los workers, el proceso principal importa main.py, lo que
+# aplica las migraciones y carga los datos de ejemplo una sola vez. Cada
+# worker vuelve a importar main.py y encuentra la base ya inicializada;
+# bloqueo_inicializacion() cubre además el caso de arrancar con
+# "uvicorn --workers N" directamente. Cada worker tiene su propio pool de
+# conexiones en modo WAL: las lecturas no se bloquean entre procesos y las
+# escrituras se serializan con BEGIN IMMEDIATE y busy_timeout.
+#
+# El socket se crea aquí y no con "uvicorn --workers": uvicorn lo crea sin
+# protocolo explícito (proto 0) y asyncio solo activa TCP_NODELAY en sockets
+# con proto IPPROTO_TCP. Sin TCP_NODELAY, la escritura en dos partes de cada
+# respuesta (encabezados y cuerpo) choca con el ACK retardado del cliente y
+# suma unos 40 ms por petición.
+
+import argparse
+import os
+import socket
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from database import pool
+
+
+def crear_socket(host, puerto):
+    familia = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(familia, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, puerto))
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API de Biblioteca con varios workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    # Inicialización previa al fork; las conexiones del proceso principal no
+    # se usan más y no deben quedar abiertas mientras atienden los workers.
+    import main  # noqa: F401
+    pool.cerrar()
+
+    config = uvicorn.Config("main:app", host=args.host, port=args.port,
+                            workers=args.workers, log_level=args.log_level)
+    servidor = uvicorn.Server(config)
+    sock = crear_socket(args.host, args.port)
+    if args.workers > 1:
+        Multiprocess(config, target=servidor.run, sockets=[sock]).run()
+    else:
+        servidor.run(sockets=[sock])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from eventos import Difusor
+
+
+class RegistroFalso:
+    """Reemplaza a leer_eventos: una lista de (seq, tipo, datos) en memoria."""
+
+    def __init__(self):
+        self.eventos = []
+
+    @property
+    def ultimo(self):
+        return self.eventos[-1][0] if self.eventos else 0
+
+    def agregar(self, tipo):
+        self.eventos.append((self.ultimo + 1, tipo, {}))
+
+    def __call__(self, desde, limite=1000):
+        if desde is None:
+            return [], self.ultimo, False
+        return [e for e in self.eventos if e[0] > desde], self.ultimo, False
+
+
+class TestReconexion(unittest.IsolatedAsyncioTestCase):
+    async def test_cliente_nuevo_no_recibe_lo_anterior_a_conectarse(self):
+        registro = RegistroFalso()
+        difusor = Difusor(leer=registro, intervalo=0.01)
+
+        primero = await difusor.suscribir()
+        registro.agregar("prestamo")
+        self.assertEqual((await asyncio.wait_for(primero.cola.get(), 1))[1], "prestamo")
+        difusor.desuscribir(primero)
+        await asyncio.wait_for(difusor._tarea, 1)
+
+        # Cambios mientras no hay nadie conectado
+        registro.agregar("devolucion")
+        registro.agregar("disponibilidad")
+
+        segundo = await difusor.suscribir()
+        self.assertEqual(segundo.desde, registro.ultimo)
+        registro.agregar("resena")
+        self.assertEqual((await asyncio.wait_for(segundo.cola.get(), 1))[1], "resena")
+        self.assertTrue(segundo.cola.empty())
+        difusor.desuscribir(segundo)
+        await asyncio.wait_for(difusor._tarea, 1)
+
+    async def test_reconexion_mientras_la_tarea_sigue_viva(self):
+        registro = RegistroFalso()
+        difusor = Difusor(leer=registro, intervalo=0.05)
+
+        primero = await difusor.suscribir()
+        difusor.desuscribir(primero)
+        # La tarea todavía duerme: el cliente nuevo llega antes de que termine
+        registro.agregar("devolucion")
+        segundo = await difusor.suscribir()
+        registro.agregar("resena")
+        self.assertEqual((await asyncio.wait_for(segundo.cola.get(), 1))[1], "resena")
+        self.assertTrue(segundo.cola.empty())
+        difusor.desuscribir(segundo)
+        await asyncio.wait_for(difusor._tarea, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
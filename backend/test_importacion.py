@@ -0,0 +1,52 @@
+import unittest
+from typing import Optional
+
+from pydantic import BaseModel
+
+from importacion import registros_csv
+
+
+class PeticionFalsa:
+    """Lo que registros_csv usa de la petición: el cuerpo en trozos."""
+
+    def __init__(self, *trozos):
+        self.trozos = trozos
+
+    async def stream(self):
+        for trozo in self.trozos:
+            yield trozo
+
+
+class Libro(BaseModel):
+    titulo: str
+    paginas: Optional[int] = None
+    disponible: bool = True
+
+
+async def leer(peticion):
+    return [registro async for registro in registros_csv(peticion)]
+
+
+class TestRegistrosCsv(unittest.IsolatedAsyncioTestCase):
+    async def test_celda_vacia_toma_el_valor_por_defecto(self):
+        registros = await leer(PeticionFalsa(b"titulo,paginas,disponible\nFicciones,,\nEl Aleph,203,0\n"))
+        self.assertEqual(registros, [
+            (1, {"titulo": "Ficciones"}, None),
+            (2, {"titulo": "El Aleph", "paginas": "203", "disponible": "0"}, None),
+        ])
+        ficciones = Libro(**registros[0][1])
+        self.assertIs(ficciones.disponible, True)
+        self.assertIsNone(ficciones.paginas)
+        self.assertIs(Libro(**registros[1][1]).disponible, False)
+
+    async def test_campo_entre_comillas_con_salto_de_linea(self):
+        registros = await leer(PeticionFalsa(b'titulo,disponible\n"Uno\ny dos', b'",1\n'))
+        self.assertEqual(registros, [(1, {"titulo": "Uno\ny dos", "disponible": "1"}, None)])
+
+    async def test_cantidad_de_columnas_incorrecta(self):
+        registros = await leer(PeticionFalsa(b"titulo,disponible\nSolo uno\n"))
+        self.assertEqual(registros, [(1, None, "Cantidad de columnas incorrecta")])
+
+
+if __name__ == "__main__":
+    unittest.main()
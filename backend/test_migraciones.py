@@ -0,0 +1,25 @@
+import os
+import tempfile
+import unittest
+
+from database import conectar
+from migraciones import CONSULTAS_VIGILADAS, VERSION_ACTUAL, aplicar_migraciones, verificar_planes
+
+
+class TestPlanesDeConsulta(unittest.TestCase):
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.conn = conectar(os.path.join(self.directorio.name, "biblioteca.db"))
+
+    def tearDown(self):
+        self.conn.cerrar_definitivamente()
+        self.directorio.cleanup()
+
+    def test_consultas_vigiladas_sin_recorridos_ni_ordenamientos(self):
+        self.assertEqual(aplicar_migraciones(self.conn), VERSION_ACTUAL)
+        self.assertTrue(CONSULTAS_VIGILADAS)
+        self.assertEqual(verificar_planes(self.conn), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
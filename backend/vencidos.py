@@ -0,0 +1,68 @@
+# ==================== PRÉSTAMOS VENCIDOS ====================
+# Préstamos activos cuya fecha de devolución esperada ya pasó.
+#
+# Las fechas se guardan como TEXT en formato ISO (AAAA-MM-DD), que se ordena
+# igual que las fechas, así "vencido" es una comparación de texto que puede
+# usar el índice parcial idx_prestamos_vencimiento (solo préstamos con
+# devuelto = 0). El costo depende de cuántos préstamos están activos, no del
+# tamaño del historial.
+
+from datetime import date
+
+from fastapi import HTTPException
+
+# Condición para consulta_paginada: "devuelto = 0" tiene que ir literal (no
+# como parámetro) para que SQLite pueda usar los índices parciales.
+CONDICION_VENCIDO = "p.devuelto = 0 AND p.fecha_devolucion_esperada < ?"
+
+SQL_VENCIDOS = """
+    SELECT p.*, l.titulo as libro_titulo, l.categoria_id,
+           u.nombre as usuario_nombre, u.email as usuario_email
+    FROM prestamos p
+    JOIN libros l ON p.libro_id = l.id
+    JOIN usuarios u ON p.usuario_id = u.id
+"""
+
+# Resumen por usuario para los avisos, en una sola pasada sobre el índice parcial
+SQL_RESUMEN_VENCIDOS = """
+    SELECT u.id as usuario_id, u.nombre, u.email,
+           COUNT(*) as prestamos_vencidos,
+           MIN(p.fecha_devolucion_esperada) as vencimiento_mas_antiguo,
+           CAST(julianday(?) - julianday(MIN(p.fecha_devolucion_esperada)) AS INTEGER) as max_dias_atraso,
+           group_concat(l.titulo, '; ') as libros
+    FROM prestamos p
+    JOIN usuarios u ON p.usuario_id = u.id
+    JOIN libros l ON p.libro_id = l.id
+    WHERE p.devuelto = 0 AND p.fecha_devolucion_esperada < ?
+    GROUP BY u.id
+    ORDER BY max_dias_atraso DESC, u.id
+"""
+
+
+def fecha_de_corte(fecha=None):
+    """La fecha a la que se calcula el atraso (hoy si no se indica)."""
+    if fecha is None:
+        return date.today()
+    try:
+        return date.fromisoformat(fecha)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida (se espera AAAA-MM-DD)")
+
+
+def dias_de_atraso(fecha_esperada, corte):
+    try:
+        return (corte - date.fromisoformat(fecha_esperada)).days
+    except (TypeError, ValueError):
+        return None
+
+
+def resumen_vencidos(conn, corte):
+    """Genera un resumen por usuario con préstamos vencidos a la fecha `corte`."""
+    cursor = conn.cursor()
+    cursor.execute(SQL_RESUMEN_VENCIDOS, (corte.isoformat(), corte.isoformat()))
+    while True:
+        filas = cursor.fetchmany(1000)
+        if not filas:
+            break
+        for fila in filas:
+            yield dict(fila)
@@ -10,6 +10,11 @@ let prestamos = [];
 let categorias = [];
 let resenas = [];
 let currentFilter = 'all';
+// Último número de secuencia aplicado (ver GET /cambios)
+let ultimoCambio = 0;
+// Cursor de la página siguiente de cada listado; null si ya se cargó todo
+let cursores = {};
+const LIMITE_PAGINA = 100;
 
 // Inicialización
 document.addEventListener('DOMContentLoaded', () => {
@@ -17,7 +22,8 @@ document.addEventListener('DOMContentLoaded', () => {
     initMobileMenu();
     initSearch();
     initFilterTabs();
-    loadAllData();
+    initAutocompletado();
+    loadAllData().then(escucharEventos);
     setDefaultDates();
 });
 
@@ -53,16 +59,18 @@ function initMobileMenu() {
 
 // ==================== BÚSQUEDA ====================
 
+let searchLibrosTimer = null;
+
 function initSearch() {
+    // La búsqueda de libros se resuelve en el servidor (/buscar, índice FTS5)
     document.getElementById('searchLibros').addEventListener('input', (e) => {
-        const term = e.target.value.toLowerCase();
-        const filtered = libros.filter(libro => 
-            libro.titulo.toLowerCase().includes(term) ||
-            libro.autor_nombre.toLowerCase().includes(term) ||
-            libro.categoria_nombre.toLowerCase().includes(term) ||
-            libro.isbn.toLowerCase().includes(term)
-        );
-        renderLibros(filtered);
+        const term = e.target.value.trim();
+        clearTimeout(searchLibrosTimer);
+        if (!term) {
+            renderLibros(libros);
+            return;
+        }
+        searchLibrosTimer = setTimeout(() => buscarLibros(term), 200);
     });
     
     document.getElementById('searchAutores').addEventListener('input', (e) => {
@@ -84,6 +92,20 @@ function initSearch() {
     });
 }
 
+async function buscarLibros(term) {
+    try {
+        const response = await fetch(`${API_URL}/buscar?q=${encodeURIComponent(term)}&limite=100`);
+        const resultados = await response.json();
+        // Ignorar respuestas de búsquedas que ya fueron reemplazadas
+        if (document.getElementById('searchLibros').value.trim() === term) {
+            renderLibros(resultados);
+        }
+    } catch (error) {
+        showToast('Error al buscar libros', 'error');
+        console.error(error);
+    }
+}
+
 // ==================== FILTROS ====================
 
 function initFilterTabs() {
@@ -112,102 +134,180 @@ function filterPrestamos() {
 
 // ==================== CARGAR DATOS ====================
 
+// Carga inicial: la primera página de cada listado en una sola petición
+// (GET /bootstrap); el resto se pide con "Cargar más"
 async function loadAllData() {
-    await Promise.all([
-        loadCategorias(),
-        loadAutores(),
-        loadLibros(),
-        loadUsuarios(),
-        loadPrestamos(),
-        loadResenas()
-    ]);
-    updateStats();
-}
-
-async function loadCategorias() {
     try {
-        const response = await fetch(`${API_URL}/categorias`);
-        categorias = await response.json();
-        renderCategorias(categorias);
-        populateCategoriaSelects();
+        const response = await fetch(`${API_URL}/bootstrap?limite=${LIMITE_PAGINA}`);
+        const datos = await response.json();
+        ultimoCambio = datos.seq;
+        cursores = datos.cursores;
+        for (const [tabla, listado] of Object.entries(LISTADOS)) {
+            listado.asignar(datos[tabla]);
+            mostrarCargarMas(tabla);
+        }
+        renderStats(datos.estadisticas);
     } catch (error) {
-        showToast('Error al cargar categorías', 'error');
+        showToast('Error al cargar los datos', 'error');
         console.error(error);
     }
 }
 
-async function loadAutores() {
-    try {
-        const response = await fetch(`${API_URL}/autores`);
-        autores = await response.json();
-        renderAutores(autores);
-        populateAutorSelects();
-    } catch (error) {
-        showToast('Error al cargar autores', 'error');
-        console.error(error);
-    }
+function mostrarCargarMas(tabla) {
+    const boton = document.getElementById(`cargarMas-${tabla}`);
+    if (boton) boton.hidden = !cursores[tabla];
 }
 
-async function loadLibros() {
+// Página siguiente de un listado, a continuación de lo ya cargado
+async function cargarMas(tabla) {
+    const listado = LISTADOS[tabla];
+    if (!cursores[tabla]) return;
     try {
-        const response = await fetch(`${API_URL}/libros`);
-        libros = await response.json();
-        renderLibros(libros);
-        populateLibroSelects();
+        const response = await fetch(
+            `${API_URL}/${tabla}?limite=${LIMITE_PAGINA}&cursor=${encodeURIComponent(cursores[tabla])}`);
+        const filas = await response.json();
+        cursores[tabla] = response.headers.get('X-Siguiente-Cursor');
+        // Una fila que ya llegó por /cambios no se repite
+        const cargados = new Set(listado.obtener().map(fila => fila.id));
+        listado.asignar(listado.obtener().concat(filas.filter(fila => !cargados.has(fila.id))));
+        mostrarCargarMas(tabla);
     } catch (error) {
-        showToast('Error al cargar libros', 'error');
+        showToast('Error al cargar más resultados', 'error');
         console.error(error);
     }
 }
 
-async function loadUsuarios() {
-    try {
-        const response = await fetch(`${API_URL}/usuarios`);
-        usuarios = await response.json();
-        renderUsuarios(usuarios);
-        populateUsuarioSelects();
-    } catch (error) {
-        showToast('Error al cargar usuarios', 'error');
-        console.error(error);
+// ==================== SINCRONIZACIÓN ====================
+// Después de un cambio solo se piden las filas modificadas desde el último
+// número de secuencia, en lugar de recargar listados completos.
+
+const LISTADOS = {
+    categorias: {
+        obtener: () => categorias,
+        asignar: filas => { categorias = filas; renderCategorias(filas); populateCategoriaSelects(); },
+        orden: ['nombre']
+    },
+    autores: {
+        obtener: () => autores,
+        asignar: filas => { autores = filas; renderAutores(filas); populateAutorSelects(); },
+        orden: ['nombre', 'id']
+    },
+    libros: {
+        obtener: () => libros,
+        asignar: filas => { libros = filas; renderLibros(filas); populateLibroSelects(); },
+        orden: ['titulo', 'id']
+    },
+    usuarios: {
+        obtener: () => usuarios,
+        asignar: filas => { usuarios = filas; renderUsuarios(filas); populateUsuarioSelects(); },
+        orden: ['nombre', 'id']
+    },
+    prestamos: {
+        obtener: () => prestamos,
+        asignar: filas => { prestamos = filas; filterPrestamos(); },
+        orden: ['fecha_prestamo', 'id'],
+        descendente: true
+    },
+    resenas: {
+        obtener: () => resenas,
+        asignar: filas => { resenas = filas; renderResenas(filas); },
+        orden: ['fecha', 'id'],
+        descendente: true
+    }
+};
+
+function compararFilas(a, b, claves, descendente) {
+    for (const clave of claves) {
+        if (a[clave] < b[clave]) return descendente ? 1 : -1;
+        if (a[clave] > b[clave]) return descendente ? -1 : 1;
     }
+    return 0;
 }
 
-async function loadPrestamos() {
-    try {
-        const response = await fetch(`${API_URL}/prestamos`);
-        prestamos = await response.json();
-        filterPrestamos();
-    } catch (error) {
-        showToast('Error al cargar préstamos', 'error');
-        console.error(error);
+function aplicarCambios(tabla, cambios) {
+    const listado = LISTADOS[tabla];
+    if (!listado) return;
+    const reemplazados = new Set([...cambios.delete, ...cambios.upsert.map(fila => fila.id)]);
+    const actuales = listado.obtener();
+    let nuevas = cambios.upsert;
+    // Con páginas sin cargar, las filas que ordenan después de la última
+    // cargada llegan con "Cargar más"
+    const ultima = actuales[actuales.length - 1];
+    if (cursores[tabla] && ultima) {
+        nuevas = nuevas.filter(fila => compararFilas(fila, ultima, listado.orden, listado.descendente) < 0);
     }
+    const filas = actuales.filter(fila => !reemplazados.has(fila.id)).concat(nuevas);
+    filas.sort((a, b) => compararFilas(a, b, listado.orden, listado.descendente));
+    listado.asignar(filas);
+}
+
+// Las llamadas se encadenan: una edición y un evento en vivo no piden el
+// mismo cursor dos veces ni aplican respuestas fuera de orden
+let sincronizacion = Promise.resolve();
+
+function sincronizar() {
+    sincronizacion = sincronizacion.then(sincronizarAhora);
+    return sincronizacion;
 }
 
-async function loadResenas() {
+async function sincronizarAhora() {
     try {
-        const response = await fetch(`${API_URL}/resenas`);
-        resenas = await response.json();
-        renderResenas(resenas);
+        let hayMas = true;
+        while (hayMas) {
+            const response = await fetch(`${API_URL}/cambios?desde=${ultimoCambio}`);
+            if (response.status === 410) {
+                // El servidor ya compactó esos cambios: se vuelve a cargar todo
+                await loadAllData();
+                return;
+            }
+            const datos = await response.json();
+            for (const [tabla, cambios] of Object.entries(datos.cambios)) {
+                aplicarCambios(tabla, cambios);
+            }
+            if (datos.estadisticas) renderStats(datos.estadisticas);
+            ultimoCambio = datos.hasta;
+            hayMas = datos.hay_mas;
+        }
     } catch (error) {
-        showToast('Error al cargar reseñas', 'error');
+        showToast('Error al sincronizar los cambios', 'error');
         console.error(error);
     }
 }
 
-async function updateStats() {
-    try {
-        const response = await fetch(`${API_URL}/estadisticas`);
-        const stats = await response.json();
-        
-        document.getElementById('totalLibros').textContent = stats.total_libros;
-        document.getElementById('totalAutores').textContent = stats.total_autores;
-        document.getElementById('totalUsuarios').textContent = stats.total_usuarios;
-        document.getElementById('prestamosActivos').textContent = stats.prestamos_activos;
-        document.getElementById('totalCategorias').textContent = stats.total_categorias;
-        document.getElementById('totalResenas').textContent = stats.total_resenas;
-    } catch (error) {
-        console.error('Error al actualizar estadísticas:', error);
+// ==================== EVENTOS EN VIVO ====================
+// GET /eventos avisa de préstamos, devoluciones, reseñas y cambios de
+// disponibilidad hechos desde otras terminales. Los eventos solo disparan una
+// sincronización: /cambios trae las filas completas y las estadísticas.
+
+const TIPOS_EVENTOS = ['disponibilidad', 'prestamo', 'devolucion', 'prestamo_eliminado', 'resena'];
+let eventoPendiente = null;
+
+function escucharEventos() {
+    if (!window.EventSource) return;
+    const fuente = new EventSource(`${API_URL}/eventos`);
+    for (const tipo of TIPOS_EVENTOS) {
+        fuente.addEventListener(tipo, programarSincronizacion);
     }
+    // El servidor ya no tiene los cambios desde nuestro cursor
+    fuente.addEventListener('resincronizar', () => { sincronizacion = sincronizacion.then(loadAllData); });
+}
+
+// Una ráfaga de eventos (p. ej. una importación) produce una sola petición
+function programarSincronizacion() {
+    if (eventoPendiente) return;
+    eventoPendiente = setTimeout(() => {
+        eventoPendiente = null;
+        sincronizar();
+    }, 200);
+}
+
+function renderStats(stats) {
+    document.getElementById('totalLibros').textContent = stats.total_libros;
+    document.getElementById('totalAutores').textContent = stats.total_autores;
+    document.getElementById('totalUsuarios').textContent = stats.total_usuarios;
+    document.getElementById('prestamosActivos').textContent = stats.prestamos_activos;
+    document.getElementById('totalCategorias').textContent = stats.total_categorias;
+    document.getElementById('totalResenas').textContent = stats.total_resenas;
 }
 
 // ==================== RENDERIZAR LIBROS ====================
@@ -496,8 +596,7 @@ document.getElementById('formLibro').addEventListener('submit', async (e) => {
         if (response.ok) {
             showToast(`Libro ${id ? 'actualizado' : 'creado'} correctamente`, 'success');
             closeModal('modalLibro');
-            await loadLibros();
-            updateStats();
+            await sincronizar();
         } else {
             const error = await response.json();
             showToast(error.detail || 'Error al guardar el libro', 'error');
@@ -534,8 +633,7 @@ document.getElementById('formAutor').addEventListener('submit', async (e) => {
         if (response.ok) {
             showToast(`Autor ${id ? 'actualizado' : 'creado'} correctamente`, 'success');
             closeModal('modalAutor');
-            await loadAutores();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al guardar el autor', 'error');
         }
@@ -572,8 +670,7 @@ document.getElementById('formUsuario').addEventListener('submit', async (e) => {
         if (response.ok) {
             showToast(`Usuario ${id ? 'actualizado' : 'creado'} correctamente`, 'success');
             closeModal('modalUsuario');
-            await loadUsuarios();
-            updateStats();
+            await sincronizar();
         } else {
             const error = await response.json();
             showToast(error.detail || 'Error al guardar el usuario', 'error');
@@ -607,9 +704,7 @@ document.getElementById('formPrestamo').addEventListener('submit', async (e) =>
         if (response.ok) {
             showToast('Préstamo registrado correctamente', 'success');
             closeModal('modalPrestamo');
-            await loadPrestamos();
-            await loadLibros();
-            updateStats();
+            await sincronizar();
         } else {
             const error = await response.json();
             showToast(error.detail || 'Error al registrar el préstamo', 'error');
@@ -644,8 +739,7 @@ document.getElementById('formCategoria').addEventListener('submit', async (e) =>
         if (response.ok) {
             showToast(`Categoría ${id ? 'actualizada' : 'creada'} correctamente`, 'success');
             closeModal('modalCategoria');
-            await loadCategorias();
-            updateStats();
+            await sincronizar();
         } else {
             const error = await response.json();
             showToast(error.detail || 'Error al guardar la categoría', 'error');
@@ -683,8 +777,7 @@ document.getElementById('formResena').addEventListener('submit', async (e) => {
         if (response.ok) {
             showToast(`Reseña ${id ? 'actualizada' : 'creada'} correctamente`, 'success');
             closeModal('modalResena');
-            await loadResenas();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al guardar la reseña', 'error');
         }
@@ -779,8 +872,7 @@ async function deleteLibro(id) {
         
         if (response.ok) {
             showToast('Libro eliminado correctamente', 'success');
-            await loadLibros();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al eliminar el libro', 'error');
         }
@@ -798,8 +890,7 @@ async function deleteAutor(id) {
         
         if (response.ok) {
             showToast('Autor eliminado correctamente', 'success');
-            await loadAutores();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al eliminar el autor', 'error');
         }
@@ -817,8 +908,7 @@ async function deleteUsuario(id) {
         
         if (response.ok) {
             showToast('Usuario eliminado correctamente', 'success');
-            await loadUsuarios();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al eliminar el usuario', 'error');
         }
@@ -836,9 +926,7 @@ async function deletePrestamo(id) {
         
         if (response.ok) {
             showToast('Préstamo eliminado correctamente', 'success');
-            await loadPrestamos();
-            await loadLibros();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al eliminar el préstamo', 'error');
         }
@@ -856,8 +944,7 @@ async function deleteCategoria(id) {
         
         if (response.ok) {
             showToast('Categoría eliminada correctamente', 'success');
-            await loadCategorias();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al eliminar la categoría', 'error');
         }
@@ -875,8 +962,7 @@ async function deleteResena(id) {
         
         if (response.ok) {
             showToast('Reseña eliminada correctamente', 'success');
-            await loadResenas();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al eliminar la reseña', 'error');
         }
@@ -894,9 +980,7 @@ async function devolverLibro(id) {
         
         if (response.ok) {
             showToast('Libro devuelto correctamente', 'success');
-            await loadPrestamos();
-            await loadLibros();
-            updateStats();
+            await sincronizar();
         } else {
             showToast('Error al devolver el libro', 'error');
         }
@@ -946,6 +1030,47 @@ function populateUsuarioSelects() {
     selectResena.innerHTML = optionsHTML;
 }
 
+// ==================== AUTOCOMPLETADO ====================
+// Los buscadores del formulario de préstamo piden sugerencias a
+// GET /autocompletar y dejan en el select solo esas opciones.
+
+function initAutocompletado() {
+    conectarAutocompletado('prestamoLibroBuscar', 'prestamoLibro', 'libros', populateLibroSelects,
+        libro => `${libro.titulo}${libro.disponible ? '' : ' (prestado)'}`);
+    conectarAutocompletado('prestamoUsuarioBuscar', 'prestamoUsuario', 'usuarios', populateUsuarioSelects,
+        usuario => `${usuario.nombre} - ${usuario.email}`);
+}
+
+function conectarAutocompletado(inputId, selectId, tipo, restaurar, etiqueta) {
+    const input = document.getElementById(inputId);
+    const select = document.getElementById(selectId);
+    let espera = null;
+    let ultimaConsulta = 0;
+
+    input.addEventListener('input', () => {
+        clearTimeout(espera);
+        const q = input.value.trim();
+        const numero = ++ultimaConsulta;
+        if (!q) {
+            restaurar();
+            return;
+        }
+        espera = setTimeout(async () => {
+            try {
+                const response = await fetch(`${API_URL}/autocompletar?tipo=${tipo}&q=${encodeURIComponent(q)}`);
+                const sugerencias = await response.json();
+                // Una respuesta que llega tarde no pisa la de una consulta posterior
+                if (numero !== ultimaConsulta) return;
+                select.innerHTML = sugerencias.length
+                    ? sugerencias.map(fila => `<option value="${fila.id}">${etiqueta(fila)}</option>`).join('')
+                    : '<option value="">Sin resultados</option>';
+            } catch (error) {
+                console.error(error);
+            }
+        }, 100);
+    });
+}
+
 // ==================== MODALES ====================
 
 function openModal(modalId) {